@@ -0,0 +1,68 @@
+'''
+Measures the memory used per entity, with tracemalloc:
+    - data components (no process)
+    - entities
+    - components in a queue
+    - monitors and timestamped monitors
+    - queues
+'''
+import tracemalloc
+import salabim as sim
+
+
+def memory_per(label, make, n):
+    env = sim.Environment(trace=False)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = make(env, n)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    print('{:40s} {:10.1f} bytes'.format(label, size / n))
+    return objects
+
+
+def data_components(env, n):
+    return [sim.Component(name='c') for _ in range(n)]
+
+
+def entities(env, n):
+    return [sim.Entity() for _ in range(n)]
+
+
+def queued_entities(env, n):
+    q = sim.Queue('q', monitor=False)
+    entities = [sim.Entity() for _ in range(n)]
+    for e in entities:
+        e.enter(q)
+    return q, entities
+
+
+def queued_components(env, n):
+    q = sim.Queue('q', monitor=False)
+    components = [sim.Component(name='c') for _ in range(n)]
+    for c in components:
+        c.enter(q)
+    return q, components
+
+
+def monitors(env, n):
+    return [sim.Monitor(name='m') for _ in range(n)]
+
+
+def timestamped_monitors(env, n):
+    return [sim.MonitorTimestamp(name='mt') for _ in range(n)]
+
+
+def queues(env, n):
+    return [sim.Queue(name='q') for _ in range(n)]
+
+
+n = 100000
+memory_per('data component', data_components, n)
+memory_per('component in a queue', queued_components, n)
+memory_per('entity', entities, n)
+memory_per('entity in a queue', queued_entities, n)
+memory_per('monitor', monitors, n // 10)
+memory_per('timestamped monitor', timestamped_monitors, n // 10)
+memory_per('queue (with 2 monitors)', queues, n // 10)
@@ -6,9 +6,10 @@ see www.salabim.org for more information, the documentation, updates and license
 from __future__ import print_function  # compatibility with Python 2.x
 from __future__ import division  # compatibility with Python 2.x
 
-__version__ = '2.3.3.1'
+__version__ = '2.3.4'
 
 import heapq
+import bisect
 import random
 import time
 import math
@@ -23,6 +24,13 @@ import itertools
 import io
 import pickle
 import logging
+import threading
+import types
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
 
 Pythonista = (sys.platform == 'ios')
 Windows = (sys.platform.startswith('win'))
@@ -44,6 +52,11 @@ if Pythonista:
 inf = float('inf')
 nan = float('nan')
 
+try:
+    _empty_mapping = types.MappingProxyType({})  # read only, shared placeholder for dicts that are created when required
+except AttributeError:  # Python < 3.3
+    _empty_mapping = {}
+
 
 class ItemFile(object):
     '''
@@ -199,6 +212,255 @@ class ItemFile(object):
                 yield result
 
 
+class TDigest(object):
+    '''
+    t-digest, a mergeable sketch of a (weighted) distribution, to estimate percentiles in bounded memory
+
+    Parameters
+    ----------
+    compression : int
+        the number of centroids kept is in the order of compression (default 100) |n|
+        a higher compression gives more accurate percentiles, at the cost of memory and time
+
+    Note
+    ----
+    Monitors maintain a t-digest if they are created with sketch=True. |n|
+    The estimates are most accurate for percentiles near 0 and 100.
+    The minimum and the maximum are exact.
+    '''
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self._means = []
+        self._weights = []
+        self._buffer = []
+        self._buffer_size = max(5 * int(compression), 20)
+        self._weight = 0
+        self._minimum = inf
+        self._maximum = -inf
+
+    def __repr__(self):
+        return objectclass_to_str(self) + ' (compression=' + str(self.compression) + ')'
+
+    def add(self, x, weight=1):
+        '''
+        adds a value to the t-digest
+
+        Parameters
+        ----------
+        x : float
+            value to be added
+
+        weight : float
+            weight of the value (default 1) |n|
+            values with a weight <= 0 are ignored
+        '''
+        if weight <= 0:
+            return
+        self._buffer.append((x, weight))
+        self._weight += weight
+        if x < self._minimum:
+            self._minimum = x
+        if x > self._maximum:
+            self._maximum = x
+        if len(self._buffer) >= self._buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        '''
+        merges another t-digest into this t-digest
+
+        Parameters
+        ----------
+        other : TDigest
+            t-digest to be merged (is not changed)
+
+        Returns
+        -------
+        t-digest (self) : TDigest
+        '''
+        self._buffer.extend(zip(other._means, other._weights))
+        self._buffer.extend(other._buffer)
+        self._weight += other._weight
+        self._minimum = min(self._minimum, other._minimum)
+        self._maximum = max(self._maximum, other._maximum)
+        self._compress()
+        return self
+
+    def copy(self):
+        '''
+        Returns
+        -------
+        copy of the t-digest : TDigest
+        '''
+        result = TDigest(self.compression)
+        result._means = self._means[:]
+        result._weights = self._weights[:]
+        result._buffer = self._buffer[:]
+        result._weight = self._weight
+        result._minimum = self._minimum
+        result._maximum = self._maximum
+        return result
+
+    def _compress(self):
+        # merges the buffer into the centroids. A centroid may grow as long as it spans at most 1 unit of
+        # k = compression / (2 * pi) * asin(2 * q - 1), so centroids near the tails stay small.
+        if not self._buffer:
+            return
+        points = sorted(itertools.chain(zip(self._means, self._weights), self._buffer))
+        self._buffer = []
+        means = []
+        weights = []
+        total = self._weight
+        factor = 2 * math.pi / self.compression
+        qsofar = 0
+        qlimit = self._q_limit(0, factor)
+        mean, weight = points[0]
+        for x, w in itertools.islice(points, 1, None):
+            if qsofar + (weight + w) / total <= qlimit:
+                weight += w
+                mean += (x - mean) * w / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                qsofar += weight / total
+                qlimit = self._q_limit(qsofar, factor)
+                mean, weight = x, w
+        means.append(mean)
+        weights.append(weight)
+        self._means = means
+        self._weights = weights
+
+    def _q_limit(self, q, factor):
+        k = math.asin(max(-1, min(2 * q - 1, 1))) / factor + 1
+        if k * factor >= math.pi / 2:
+            return 1
+        return (math.sin(k * factor) + 1) / 2
+
+    def percentile(self, q):
+        '''
+        estimated q-th percentile
+
+        Parameters
+        ----------
+        q : float
+            percentage of the distribution |n|
+            values <0 are treated a 0 |n|
+            values >100 are treated as 100
+
+        Returns
+        -------
+        estimated q-th percentile : float |n|
+        nan if no values have been added
+        '''
+        self._compress()
+        if not self._weight:
+            return nan
+        q = max(0, min(q, 100))
+        threshold = self._weight * q / 100
+        cum_prev, x_prev = 0, self._minimum
+        cum = 0
+        for mean, weight in zip(self._means, self._weights):
+            cum_center = cum + weight / 2
+            if threshold <= cum_center:
+                return interpolate(threshold, cum_prev, cum_center, x_prev, mean)
+            cum_prev, x_prev = cum_center, mean
+            cum += weight
+        return interpolate(threshold, cum_prev, self._weight, x_prev, self._maximum)
+
+    def median(self):
+        '''
+        Returns
+        -------
+        estimated median : float
+        '''
+        return self.percentile(50)
+
+    def weight(self):
+        '''
+        Returns
+        -------
+        total weight of the values added : float
+        '''
+        return self._weight
+
+    def minimum(self):
+        '''
+        Returns
+        -------
+        minimum of the values added : float
+        '''
+        return self._minimum if self._weight else nan
+
+    def maximum(self):
+        '''
+        Returns
+        -------
+        maximum of the values added : float
+        '''
+        return self._maximum if self._weight else nan
+
+
+class _RunningStatistics(object):
+    '''
+    running statistics of (weighted) values, in O(1) memory
+
+    The weighted mean and the weighted sum of squared deviations are updated with
+    Welford's method, which is numerically stable for long runs.
+    '''
+    __slots__ = ('number_of_entries', 'weight', '_mean', '_m2', '_minimum', '_maximum')
+
+    def __init__(self):
+        self.number_of_entries = 0
+        self.weight = 0
+        self._mean = 0
+        self._m2 = 0
+        self._minimum = inf
+        self._maximum = -inf
+
+    def tally(self, x, weight=1):
+        self.number_of_entries += 1
+        if x < self._minimum:
+            self._minimum = x
+        if x > self._maximum:
+            self._maximum = x
+        if weight:
+            self.weight += weight
+            delta = x - self._mean
+            self._mean += delta * weight / self.weight
+            self._m2 += weight * delta * (x - self._mean)
+
+    def merge(self, other):
+        # combines the statistics of other into self (Chan's method)
+        self.number_of_entries += other.number_of_entries
+        self._minimum = min(self._minimum, other._minimum)
+        self._maximum = max(self._maximum, other._maximum)
+        weight = self.weight + other.weight
+        if weight:
+            delta = other._mean - self._mean
+            self._m2 += other._m2 + delta * delta * self.weight * other.weight / weight
+            self._mean += delta * other.weight / weight
+            self.weight = weight
+
+    def copy(self):
+        result = _RunningStatistics()
+        for slot in _RunningStatistics.__slots__:
+            setattr(result, slot, getattr(self, slot))
+        return result
+
+    def mean(self):
+        return self._mean if self.weight else nan
+
+    def std(self):
+        return math.sqrt(max(0, self._m2 / self.weight)) if self.weight else nan
+
+    def minimum(self):
+        return self._minimum if self.number_of_entries else nan
+
+    def maximum(self):
+        return self._maximum if self.number_of_entries else nan
+
+
 class Monitor(object):
     '''
     Monitor object
@@ -252,18 +514,32 @@ class Monitor(object):
     env : Environment
         environment where the monitor is defined |n|
         if omitted, default_env will be used
-    '''
 
-    cached_xweight = {(ex0, force_numeric): (0, 0) for ex0 in (False, True) for force_numeric in (False, True)}
+    store : bool
+        if True (default), all tallied values are stored |n|
+        if False, only running statistics (number of entries, weight, mean, standard deviation,
+        minimum and maximum) are maintained, in constant memory. In that case percentiles
+        (unless sketch is specified), histograms and the tallied values themselves are not available.
+
+    sketch : bool or int
+        if False (default), percentiles are calculated from the stored values |n|
+        if True, a t-digest (see TDigest) is maintained, so percentiles and the median are estimated
+        in bounded memory, without sorting the tallied values, even if these are not stored. |n|
+        if an int, a t-digest with that compression is maintained (True means 100)
+    '''
 
     def __init__(self, name=None, monitor=True, type=None, merge=None, weighted=False, weight_legend='weight',
-        env=None, *args, **kwargs):
+        env=None, store=True, sketch=False, *args, **kwargs):
         if env is None:
-            self.env = g.default_env
+            self.env = default_env()
         else:
             self.env = env
         _set_name(name, self.env._nameserializeMonitor, self)
         self._timestamp = False
+        self._store = store
+        self._mutations = 0  # incremented on every change, to invalidate the cache
+        self._cache_state = None
+        self._compression = (100 if sketch is True else sketch) or None
         self.weighted = weighted
         self.weight_legend = weight_legend
         if merge is None:
@@ -291,11 +567,32 @@ class Monitor(object):
             if type is not None:
                 if type_to_typecode_off(type)[0] != self.xtypecode:
                     raise SalabimError('type does not match the type of the monitors in the merge list')
-            if self.xtypecode:
-                self._x = array.array(self.xtypecode, itertools.chain(*[m._x for m in merge]))
+            if store and all(m._store for m in merge):
+                if self.xtypecode:
+                    self._x = array.array(self.xtypecode, itertools.chain(*[m._x for m in merge]))
+                else:
+                    self._x = list(itertools.chain(*[m._x for m in merge]))
+                if self.weighted:
+                    self._weight = array.array('d', itertools.chain(*[m._weight for m in merge]))
             else:
-                self._x = list(itertools.chain(*[m._x for m in merge]))
-            self._weight = array.array('float', itertools.chain(*[m._weight for m in merge]))
+                self._store = False
+                self._statistics = (_RunningStatistics(), _RunningStatistics())
+                for m in merge:
+                    if m._store:
+                        for vx, vweight in zip(*m.xweight()):
+                            self._tally_statistics(vx, vweight)
+                    else:
+                        for ex0 in (False, True):
+                            self._statistics[ex0].merge(m._statistics[ex0])
+            self._sketches = self._new_sketches()
+            if self._sketches is not None:
+                for m in merge:
+                    if m._sketches is None:
+                        for vx, vweight in zip(*m.xweight()):
+                            self._tally_sketches(vx, vweight)
+                    else:
+                        for ex0 in (False, True):
+                            self._sketches[ex0].merge(m._sketches[ex0])
             self._monitor = monitor
         self.setup(*args, **kwargs)
 
@@ -387,15 +684,18 @@ class Monitor(object):
 
         if monitor is None:
             monitor = self._monitor
-        if self.xtypecode:
-            self._x = array.array(self.xtypecode)
+        if self._store:
+            if self.xtypecode:
+                self._x = array.array(self.xtypecode)
+            else:
+                self._x = []
+            if self.weighted:
+                self._weight = array.array('d')
         else:
-            self._x = []
-        if self.weighted:
-            self._weight = array.array('d')
+            self._statistics = (_RunningStatistics(), _RunningStatistics())  # all values and non zero values
+        self._sketches = self._new_sketches()
+        self._mutations += 1
         self.monitor(monitor)
-        Monitor.cached_xweight = {(ex0, force_numeric): (0, 0)
-            for ex0 in (False, True) for force_numeric in (False, True)}  # invalidate the cache
 
     def monitor(self, value=None):
         '''
@@ -414,7 +714,7 @@ class Monitor(object):
         '''
         if value is not None:
             self._monitor = value
-        return self.monitor
+        return self._monitor
 
     def tally(self, x, weight=1):
         '''
@@ -424,12 +724,84 @@ class Monitor(object):
             value to be tallied
         '''
         if self._monitor:
-            self._x.append(x)
             if self.weighted:
-                self._weight.append(1 if weight is None else weight)
+                if weight is None:
+                    weight = 1
             else:
                 if weight != 1:
                     raise SalabimError('incorrect weight for non weighted monitor')
+            if self._store:
+                self._x.append(x)
+                if self.weighted:
+                    self._weight.append(weight)
+                self._mutations += 1
+                if self._sketches is None:
+                    return
+            if not self.xtypecode:
+                x = _numeric(x)
+            if not self._store:
+                self._tally_statistics(x, weight)
+            if self._sketches is not None:
+                self._tally_sketches(x, weight)
+
+    def _tally_statistics(self, x, weight):
+        self._statistics[False].tally(x, weight)
+        if x != 0:
+            self._statistics[True].tally(x, weight)
+
+    def _tally_sketches(self, x, weight):
+        self._sketches[False].add(x, weight)
+        if x != 0:
+            self._sketches[True].add(x, weight)
+
+    def _new_sketches(self):
+        # t-digests of all values and of the non zero values (None if no sketch)
+        if self._compression is None:
+            return None
+        return (TDigest(self._compression), TDigest(self._compression))
+
+    def _running_statistics(self, ex0):
+        return self._statistics[ex0]
+
+    def _state(self):
+        # changes whenever the results of the monitor might change
+        return self._mutations
+
+    def _cached(self, function, *args):
+        # returns function(*args), which is calculated only once as long as the monitor doesn't change
+        state = self._state()
+        if state != self._cache_state:
+            self._cache = {}
+            self._cache_state = state
+        key = (function.__name__,) + args
+        if key not in self._cache:
+            self._cache[key] = function(*args)
+        return self._cache[key]
+
+    def _running_sketch(self, ex0):
+        return self._sketches[ex0]
+
+    def sketch(self, ex0=False):
+        '''
+        t-digest of the tallied values
+
+        Parameters
+        ----------
+        ex0 : bool
+            if False (default), include zeroes. if True, exclude zeroes
+
+        Returns
+        -------
+        copy of the t-digest : TDigest |n|
+        None if the monitor has no sketch
+
+        Note
+        ----
+        The t-digest can be merged with the t-digests of other monitors, e.g. of other replications.
+        '''
+        if self._sketches is None:
+            return None
+        return self._running_sketch(ex0).copy()
 
     def name(self, value=None):
         '''
@@ -488,6 +860,18 @@ class Monitor(object):
         ----
         For weighted monitors, the weighted mean is returned
         '''
+        if not self._store:
+            return self._running_statistics(ex0).mean()
+        return self._cached(self._calculate_mean, ex0)
+
+    def _calculate_mean(self, ex0):
+        arrays = self._xweight_numpy(ex0)
+        if arrays is not None:
+            x, weight = arrays
+            sumweight = weight.sum()
+            if sumweight:
+                return float(x.dot(weight) / sumweight)
+            return nan
         if self.weighted:
             x, weight = self.xweight(ex0=ex0)
             sumweight = sum(weight)
@@ -519,6 +903,19 @@ class Monitor(object):
         ----
         For weighted monitors, the weighted standard deviation is returned
         '''
+        if not self._store:
+            return self._running_statistics(ex0).std()
+        return self._cached(self._calculate_std, ex0)
+
+    def _calculate_std(self, ex0):
+        arrays = self._xweight_numpy(ex0)
+        if arrays is not None:
+            x, weight = arrays
+            sumweight = weight.sum()
+            if sumweight:
+                deviation = x - x.dot(weight) / sumweight
+                return math.sqrt((deviation * deviation).dot(weight) / sumweight)
+            return nan
         if self.weighted:
             x, weight = self.xweight(ex0=ex0)
             sumweight = sum(weight)
@@ -537,6 +934,70 @@ class Monitor(object):
             else:
                 return nan
 
+    def batch_means(self, number_of_batches=20, ex0=False):
+        '''
+        means of consecutive batches of tallied values
+
+        Parameters
+        ----------
+        number_of_batches : int
+            number of batches (default 20) |n|
+            the tallied values are divided into (nearly) equally sized batches
+
+        ex0 : bool
+            if False (default), include zeroes. if True, exclude zeroes
+
+        Returns
+        -------
+        means of the batches : list
+
+        Note
+        ----
+        For weighted monitors, the weighted means are returned |n|
+        Batch means are used to estimate the precision of the mean of a single (long) run.
+        Values tallied during the warmup period should be discarded by resetting the monitor at the end of the warmup.
+        '''
+        x, weight = self.xweight(ex0=ex0)
+        if not self.weighted:
+            weight = [1] * len(x)
+        result = []
+        n = len(x)
+        number_of_batches = min(number_of_batches, n)
+        for i in range(number_of_batches):
+            lo = i * n // number_of_batches
+            hi = (i + 1) * n // number_of_batches
+            sumweight = sum(weight[lo:hi])
+            if sumweight:
+                result.append(sum(vx * vweight for vx, vweight in zip(x[lo:hi], weight[lo:hi])) / sumweight)
+        return result
+
+    def half_width(self, confidence=0.95, number_of_batches=20, ex0=False):
+        '''
+        half width of the confidence interval of the mean, based on batch means
+
+        Parameters
+        ----------
+        confidence : float
+            confidence level (default 0.95)
+
+        number_of_batches : int
+            number of batches (default 20)
+
+        ex0 : bool
+            if False (default), include zeroes. if True, exclude zeroes
+
+        Returns
+        -------
+        half width of the confidence interval : float |n|
+        nan if there are less than 2 batches
+
+        Note
+        ----
+        The confidence interval is mean() +/- half_width(). |n|
+        The batch means are assumed to be (nearly) independent, which requires sufficiently large batches.
+        '''
+        return _half_width(self.batch_means(number_of_batches=number_of_batches, ex0=ex0), confidence)
+
     def minimum(self, ex0=False):
         '''
         minimum of tallied values
@@ -550,6 +1011,14 @@ class Monitor(object):
         -------
         minimum : float
         '''
+        if not self._store:
+            return self._running_statistics(ex0).minimum()
+        return self._cached(self._calculate_minimum, ex0)
+
+    def _calculate_minimum(self, ex0):
+        arrays = self._xweight_numpy(ex0)
+        if arrays is not None:
+            return arrays[0].min().item() if len(arrays[0]) else nan
         x = self.x(ex0=ex0)
         if x:
             return min(x)
@@ -569,7 +1038,14 @@ class Monitor(object):
         -------
         maximum : float
         '''
+        if not self._store:
+            return self._running_statistics(ex0).maximum()
+        return self._cached(self._calculate_maximum, ex0)
 
+    def _calculate_maximum(self, ex0):
+        arrays = self._xweight_numpy(ex0)
+        if arrays is not None:
+            return arrays[0].max().item() if len(arrays[0]) else nan
         x = self.x(ex0=ex0)
         if x:
             return max(x)
@@ -617,27 +1093,27 @@ class Monitor(object):
 
         Note
         ----
-        For weighted monitors, the weighted percentile is returned
+        For weighted monitors, the weighted percentile is returned |n|
+        If the monitor has a sketch, the percentile is estimated with the t-digest. |n|
+        Otherwise, if the tallied values are not stored (store=False), nan is returned
         '''
-
+        if self._sketches is not None:
+            return self._running_sketch(ex0).percentile(q)
+        if not self._store:
+            return nan
         q = max(0, min(q, 100))
-        x, weight = self.xweight(ex0=ex0)
-        if len(x) == 1:
-            return x[0]
-        sumweight = sum(weight)
-        if not sumweight:
+        x_sorted, cumweight = self._cached(self._sorted, ex0)
+        n = len(x_sorted)
+        if n == 1:
+            return x_sorted[0]
+        if not n or not cumweight[-1]:
             return nan
-        xweight = sorted(zip(x, weight), key=lambda v: v[0])
-        x_sorted, weight_sorted = zip(*xweight)
-        weight_sorted = [0] + list(weight_sorted)
-        threshold = sumweight * q / 100
-        vcum_imin1 = 0
-        for i, v in enumerate(weight_sorted):
-            vcum_i = vcum_imin1 + v
-            if vcum_i > threshold:
-                break
-            vcum_imin1 = vcum_i
-        return interpolate(threshold, vcum_imin1, vcum_i, x_sorted[i - 1], x_sorted[min(i, len(x_sorted) - 1)])
+        threshold = cumweight[-1] * q / 100
+        i = bisect.bisect_right(cumweight, threshold)  # first value for which the cumulative weight > threshold
+        if i == n:
+            return x_sorted[-1]
+        return interpolate(
+            threshold, cumweight[i - 1] if i else 0, cumweight[i], x_sorted[i], x_sorted[min(i + 1, n - 1)])
 
     def bin_number_of_entries(self, lowerbound, upperbound, ex0=False):
         '''
@@ -658,8 +1134,8 @@ class Monitor(object):
         -------
         number of values >lowerbound and <=upperbound : int
         '''
-        x = self.x(ex0=ex0)
-        return sum(1 for vx in x if (vx > lowerbound) and (vx <= upperbound))
+        x_sorted = self._cached(self._sorted, ex0)[0]
+        return bisect.bisect_right(x_sorted, upperbound) - bisect.bisect_right(x_sorted, lowerbound)
 
     def bin_weight(self, lowerbound, upperbound):
         '''
@@ -680,8 +1156,7 @@ class Monitor(object):
         -------
         total weight of values >lowerbound and <=upperbound : int
         '''
-        x, weight = self.xweight()
-        return sum((vweight for vx, vweight in zip(x, weight) if (vx > lowerbound) and (vx <= upperbound)))
+        return self._bin_totals((lowerbound, upperbound, inf))[1]
 
     def value_number_of_entries(self, value):
         '''
@@ -740,6 +1215,14 @@ class Monitor(object):
         -------
         number of entries : int
         '''
+        if not self._store:
+            return self._running_statistics(ex0).number_of_entries
+        return self._cached(self._calculate_number_of_entries, ex0)
+
+    def _calculate_number_of_entries(self, ex0):
+        arrays = self._xweight_numpy(ex0)
+        if arrays is not None:
+            return len(arrays[0])
         return len(self.x(ex0=ex0))
 
     def number_of_entries_zero(self):
@@ -765,6 +1248,14 @@ class Monitor(object):
         -------
         sum of weights : float
         '''
+        if not self._store:
+            return self._running_statistics(ex0).weight
+        return self._cached(self._calculate_weight, ex0)
+
+    def _calculate_weight(self, ex0):
+        arrays = self._xweight_numpy(ex0)
+        if arrays is not None:
+            return float(arrays[1].sum())
         x, weight = self.xweight(ex0=ex0)
         return sum(weight)
 
@@ -1021,7 +1512,15 @@ class Monitor(object):
                         result.append(
                             pad(str(value), 20) + rpad(str(count), 7) + '(' + fn(perc * 100, 5, 1) + '%) ' + s)
             else:
-                bin_width, lowerbound, number_of_bins = self.histogram_autoscale()
+                if number_of_bins is None and lowerbound is None and bin_width is None:
+                    bin_width, lowerbound, number_of_bins = self.histogram_autoscale(ex0=ex0)
+                else:
+                    if number_of_bins is None:
+                        number_of_bins = 30
+                    if lowerbound is None:
+                        lowerbound = 0
+                    if bin_width is None:
+                        bin_width = 1
                 result.append(self.print_statistics(show_header=False, show_legend=True, do_indent=False, as_str=True))
                 if number_of_bins >= 0:
                     result.append('')
@@ -1030,21 +1529,10 @@ class Monitor(object):
                     else:
                         result.append('           <=       entries     %  cum%')
 
+                    upperbounds = [lowerbound + i * bin_width for i in range(number_of_bins + 1)] + [inf]
+                    counts = self._bin_totals(upperbounds, ex0)
                     cumperc = 0
-                    for i in range(-1, number_of_bins + 1):
-                        if i == -1:
-                            lb = -inf
-                        else:
-                            lb = lowerbound + i * bin_width
-                        if i == number_of_bins:
-                            ub = inf
-                        else:
-                            ub = lowerbound + (i + 1) * bin_width
-                        if self.weighted:
-                            count = self.bin_weight(lb, ub)
-                        else:
-                            count = self.bin_number_of_entries(lb, ub)
-
+                    for ub, count in zip(upperbounds, counts):
                         perc = count / weight_total
                         if weight_total == inf:
                             s = ''
@@ -1061,6 +1549,67 @@ class Monitor(object):
         result.append('')
         return return_or_print(result, as_str=as_str, file=file)
 
+    def _bin_totals(self, upperbounds, ex0=False):
+        # total weight (entries for non weighted monitors) per bin, in one pass (cached).
+        # bin i contains the values > upperbounds[i - 1] and <= upperbounds[i]
+        return self._cached(self._calculate_bin_totals, tuple(upperbounds), ex0)
+
+    def _calculate_bin_totals(self, upperbounds, ex0):
+        # the weights are summed per bin in tally order, so the totals add up to the total weight
+        arrays = self._xweight_numpy(ex0)
+        if arrays is not None:
+            np = _numpy()
+            x, weight = arrays
+            totals = np.bincount(
+                np.searchsorted(upperbounds, x, side='left'), weights=weight, minlength=len(upperbounds)).tolist()
+        else:
+            x, weight = self.xweight(ex0=ex0)
+            totals = [0] * len(upperbounds)
+            for vx, vweight in zip(x, weight):
+                totals[bisect.bisect_left(upperbounds, vx)] += vweight
+        if not self.weighted:
+            totals = [int(total) for total in totals]
+        return totals
+
+    def _sorted(self, ex0):
+        # the x-values in ascending order and the cumulative weights (in that order)
+        arrays = self._xweight_numpy(ex0)
+        if arrays is not None:
+            x, weight = arrays
+            order = x.argsort(kind='mergesort')  # stable, like sorted
+            x_sorted = x[order]
+            return (array.array(x_sorted.dtype.char, x_sorted.tobytes()),
+                array.array('d', weight[order].cumsum().tobytes()))
+        x, weight = self.xweight(ex0=ex0)
+        order = sorted(range(len(x)), key=x.__getitem__)
+        x_sorted = array.array(x.typecode, [x[i] for i in order])
+        cumweight = array.array('d')
+        total = 0
+        for i in order:
+            total += weight[i]
+            cumweight.append(total)
+        return x_sorted, cumweight
+
+    def _xweight_numpy(self, ex0=False):
+        # x-values and weights as numpy arrays, or None if the numpy backend is not used.
+        # The stored arrays are viewed without copying, so the results should not be kept.
+        np = _numpy()
+        if np is None:
+            return None
+        if self.xtypecode:
+            x = _numpy_view(np, self._x)
+        else:
+            x = _numpy_view(np, list_to_array(self._x))
+        if self.weighted:
+            weight = _numpy_view(np, self._weight)
+        else:
+            weight = np.ones(len(x))
+        if ex0:
+            nonzero = x != 0
+            x = x[nonzero]
+            weight = weight[nonzero]
+        return x, weight
+
     def key(self, x):
         try:
             x1 = float(x)
@@ -1200,11 +1749,11 @@ class Monitor(object):
         -------
         all tallied values : array/list
         '''
-        thishash = hash((self, len(self._x)))
-
-        if Monitor.cached_xweight[(ex0, force_numeric)][0] == thishash:
-            return Monitor.cached_xweight[(ex0, force_numeric)][1]
+        if not self._store:
+            raise SalabimError('tallied values of ' + self.name() + ' are not stored')
+        return self._cached(self._xweight, ex0, force_numeric)
 
+    def _xweight(self, ex0, force_numeric):
         if self.xtypecode or (not force_numeric):
             xall = self._x
             typecode = self.xtypecode
@@ -1221,13 +1770,11 @@ class Monitor(object):
 
         if self.weighted:
             if ex0:
-                xweight = (x, array.array('d', [vweight for vx, vweight in zip(x, self._weight) if vx != 0]))
+                xweight = (x, array.array('d', [vweight for vx, vweight in zip(xall, self._weight) if vx != 0]))
             else:
                 xweight = (x, self._weight)
         else:
             xweight = (x, array.array('d', (1,) * len(x)))
-
-        Monitor.cached_xweight[(ex0, force_numeric)] = (thishash, xweight)
         return xweight
 
 
@@ -1287,6 +1834,18 @@ class MonitorTimestamp(Monitor):
         environment where the monitor is defined |n|
         if omitted, default_env will be used
 
+    store : bool
+        if True (default), all tallied values and their timestamps are stored |n|
+        if False, only running statistics (number of entries, duration, mean, standard deviation,
+        minimum and maximum) are maintained, in constant memory. In that case percentiles
+        (unless sketch is specified), histograms and the tallied values themselves are not available.
+
+    sketch : bool or int
+        if False (default), percentiles are calculated from the stored values |n|
+        if True, a t-digest (see TDigest) of the values, weighted with their durations, is maintained,
+        so percentiles and the median are estimated in bounded memory, even if the values are not stored. |n|
+        if an int, a t-digest with that compression is maintained (True means 100)
+
     Note
     ----
     A MonitorTimestamp collects both the value and the time.
@@ -1310,12 +1869,18 @@ class MonitorTimestamp(Monitor):
     '''
 
     def __init__(self, name=None, initial_tally=None, monitor=True, type=None,
-        merge=None, env=None, *args, **kwargs):
+        merge=None, env=None, store=True, sketch=False, *args, **kwargs):
         if env is None:
-            self.env = g.default_env
+            self.env = default_env()
         else:
             self.env = env
         self._timestamp = True
+        self._store = store
+        self._compression = (100 if sketch is True else sketch) or None
+        self._mutations = 0  # incremented on every change, to invalidate the cache
+        self._cache_state = None
+        self._x_weight_state = None
+        self._dependents = []  # derived timestamped monitors to be updated when streaming (store=False)
         self.weighted = True
         self.weight_legend = 'duration'
         _set_name(name, self.env._nameserializeComponent, self)
@@ -1341,6 +1906,10 @@ class MonitorTimestamp(Monitor):
             for m in merge:
                 if not isinstance(m, MonitorTimestamp):
                     raise SalabimError('non MonitorTimestamp item found in merge list')
+                if not m._store:
+                    raise SalabimError('not possible to merge ' + m.name() + ' (values not stored)')
+            if not store:
+                raise SalabimError('merge requires store=True')
 
             self.xtypecode = merge[0].xtypecode
             for m in merge:
@@ -1382,6 +1951,15 @@ class MonitorTimestamp(Monitor):
             if not monitor:
                 self._t.append(self.env._now)
                 self._xw.append(self.off)
+            # the merged values are the sum of the values of the merged monitors, so the t-digest
+            # is built from the merged segments; the last segment is pending, like in _stream
+            self._sketches = self._new_sketches()
+            if self._sketches is not None:
+                for t0, t1, x in zip(self._t, self._t[1:], self._xw):
+                    if x != self.off and t1 != t0:
+                        self._tally_sketches(x if self.xtypecode else _numeric(x), t1 - t0)
+                self._stream_t = self._t[-1]
+                self._stream_x = self._xw[-1]
 
         self.setup(*args, **kwargs)
 
@@ -1480,6 +2058,14 @@ class MonitorTimestamp(Monitor):
         '''
         if monitor is not None:
             self._monitor = monitor
+        self._mutations += 1
+        self._sketches = self._new_sketches()
+        if not self._store or self._sketches is not None:
+            self._stream_t = self.env._now
+            self._stream_x = self._tally if self._monitor else self.off
+        if not self._store:
+            self._statistics = (_RunningStatistics(), _RunningStatistics())  # all values and non zero values
+            return
         if self.xtypecode:
             self._xw = array.array(self.xtypecode)
         else:
@@ -1491,7 +2077,6 @@ class MonitorTimestamp(Monitor):
             self._xw.append(self.off)
         self._t = array.array('d')
         self._t.append(self.env._now)
-        self.x_weight_t = None  # invalidate _x and _weight
 
     def monitor(self, value=None):
         '''
@@ -1515,7 +2100,7 @@ class MonitorTimestamp(Monitor):
                 self.tally(self._tally)
             else:
                 self._tally_off()  # can't use tally() here because self._tally should be untouched
-        return self.monitor
+        return self._monitor
 
     def tally(self, value):
         '''
@@ -1528,19 +2113,78 @@ class MonitorTimestamp(Monitor):
         self._tally = value
         if self._monitor:
             t = self.env._now
-            if self._t[-1] == t:
-                self._xw[-1] = value
-            else:
-                self._xw.append(value)
-                self._t.append(t)
+            if self._store:
+                if self._t[-1] == t:
+                    self._xw[-1] = value
+                else:
+                    self._xw.append(value)
+                    self._t.append(t)
+                self._mutations += 1
+                if self._sketches is None:
+                    return
+            self._stream(value, t)
 
     def _tally_off(self):
         t = self.env._now
-        if self._t[-1] == t:
-            self._xw[-1] = self.off
-        else:
-            self._xw.append(self.off)
-            self._t.append(t)
+        if self._store:
+            if self._t[-1] == t:
+                self._xw[-1] = self.off
+            else:
+                self._xw.append(self.off)
+                self._t.append(t)
+            self._mutations += 1
+            if self._sketches is None:
+                return
+        self._stream(self.off, t)
+
+    def _stream(self, value, t):
+        # the current value is added to the running statistics and sketches when its duration is known
+        if t != self._stream_t:
+            x = self._stream_x
+            if x != self.off:
+                if not self.xtypecode:
+                    x = _numeric(x)
+                if not self._store:
+                    self._tally_statistics(x, t - self._stream_t)
+                if self._sketches is not None:
+                    self._tally_sketches(x, t - self._stream_t)
+            self._stream_t = t
+        self._stream_x = value
+        for monitor in self._dependents:
+            monitor._update()
+
+    def _current(self, ex0):
+        # the current (numeric) value, or None if it is off (or zero and ex0)
+        x = self._stream_x
+        if x == self.off:
+            return None
+        if not self.xtypecode:
+            x = _numeric(x)
+        if ex0 and x == 0:
+            return None
+        return x
+
+    def _running_statistics(self, ex0):
+        # the running statistics, including the current value up to now
+        x = self._current(ex0)
+        if x is None:
+            return self._statistics[ex0]
+        statistics = self._statistics[ex0].copy()
+        statistics.tally(x, self.env._now - self._stream_t)
+        return statistics
+
+    def _state(self):
+        # the durations depend on now as well
+        return (self._mutations, self.env._now)
+
+    def _running_sketch(self, ex0):
+        # the t-digest, including the current value up to now
+        x = self._current(ex0)
+        if x is None or self.env._now == self._stream_t:
+            return self._sketches[ex0]
+        sketch = self._sketches[ex0].copy()
+        sketch.add(x, self.env._now - self._stream_t)
+        return sketch
 
     def name(self, value=None):
         '''
@@ -1614,6 +2258,48 @@ class MonitorTimestamp(Monitor):
         self.set_x_weight()
         return Monitor.std(self, *args, **kwargs)
 
+    def batch_means(self, number_of_batches=20, ex0=False):
+        '''
+        means of consecutive, equally long, time intervals, weighted with their durations
+
+        Parameters
+        ----------
+        number_of_batches : int
+            number of batches (default 20) |n|
+            the time since the monitor was (re)started is divided into this number of equal intervals
+
+        ex0 : bool
+            if False (default), include zeroes. if True, exclude zeroes
+
+        Returns
+        -------
+        means of the batches : list
+
+        Note
+        ----
+        Periods that the monitor was off are excluded. Batches without any duration are ignored. |n|
+        Values tallied during the warmup period should be discarded by resetting the monitor at the end of the warmup.
+        '''
+        x, t = self.xt(add_now=True)
+        off = self.off if self.xtypecode else -inf
+        t0 = t[0]
+        batch_duration = (t[-1] - t0) / number_of_batches
+        if batch_duration <= 0:
+            return []
+        sumx = [0] * number_of_batches
+        sumduration = [0] * number_of_batches
+        for vx, start, end in zip(x, t, t[1:]):
+            if vx == off or (ex0 and vx == 0):
+                continue
+            i = min(int((start - t0) / batch_duration), number_of_batches - 1)
+            while start < end:
+                batch_end = end if i == number_of_batches - 1 else min(end, t0 + (i + 1) * batch_duration)
+                sumx[i] += vx * (batch_end - start)
+                sumduration[i] += batch_end - start
+                start = batch_end
+                i += 1
+        return [vsumx / vsumduration for vsumx, vsumduration in zip(sumx, sumduration) if vsumduration]
+
     def minimum(self, *args, **kwargs):
         '''
         minimum of tallied values
@@ -1765,7 +2451,7 @@ class MonitorTimestamp(Monitor):
         total duration of zero samples : float
         '''
         self.set_x_weight()
-        return Monitor.duration_zero(self, *args, **kwargs)
+        return Monitor.weight_zero(self, *args, **kwargs)
 
     def number_of_entries(self, *args, **kwargs):
         '''
@@ -1901,18 +2587,35 @@ class MonitorTimestamp(Monitor):
         -------
         array/list with x-values and array with durations : tuple
         '''
-        return self.xweight(self, *args, **kwargs)
+        return self.xweight(*args, **kwargs)
 
     def xweight(self, *args, **kwargs):
         self.set_x_weight()
         return Monitor.xweight(self, *args, **kwargs)
 
+    def _xweight_numpy(self, *args, **kwargs):
+        self.set_x_weight()
+        return Monitor._xweight_numpy(self, *args, **kwargs)
+
     def set_x_weight(self):
-        if self.x_weight_t == self.env.t:
+        if not self._store:
+            return
+        state = self._state()
+        if state == self._x_weight_state:
+            return
+        self._x_weight_state = state  # stays valid until the monitor changes or time advances
+
+        np = _numpy()
+        if np is not None and self.xtypecode:
+            t = _numpy_view(np, self._t)
+            xw = _numpy_view(np, self._xw)
+            weightall = np.empty(len(t))
+            weightall[:-1] = t[1:] - t[:-1]
+            weightall[-1] = self.env._now - t[-1]
+            on = xw != self.off
+            self._x = array.array(self.xtypecode, xw[on].tobytes())
+            self._weight = array.array('d', weightall[on].tobytes())
             return
-        self.x_weight_t = self.env.t   # stay valid until new t detected or invalidated
-        Monitor.cached_xweight = {(ex0, force_numeric): (0, 0)
-            for ex0 in (False, True) for force_numeric in (False, True)}  # invalidate the cache
 
         weightall = array.array('d')
         lastt = None
@@ -1963,6 +2666,8 @@ class MonitorTimestamp(Monitor):
         The value self.off is stored when monitoring is turned off |n|
         The timestamps are not corrected for any reset_now() adjustment.
         '''
+        if not self._store:
+            raise SalabimError('tallied values of ' + self.name() + ' are not stored')
         if self.xtypecode or (not force_numeric):
             xall = self._xw
             typecode = self.xtypecode
@@ -2152,32 +2857,227 @@ class MonitorTimestamp(Monitor):
             self, number_of_bins, lowerbound, bin_width, values, ex0, as_str=as_str, file=file)
 
 
-class AnimateMonitor(object):
+class _DerivedMonitorTimestamp(MonitorTimestamp):
     '''
-    animates a (timestamped) monitor in a panel
+    timestamped monitor with values that are derived from other timestamped monitors
+
+    The values are not tallied, but computed from the sources when queried, so changes of the sources
+    don't require any additional work. This is used for the occupancy and available_quantity of resources.
 
     Parameters
     ----------
-    linecolor : colorspec
-        color of the line or points (default foreground color)
-
-    linewidth : int
-        width of the line or points (default 1 for line, 3 for points)
+    name : str
+        name of the timestamped monitor
 
-    fillcolor : colorspec
-        color of the panel (default transparent)
+    sources : list or tuple
+        timestamped monitors the values are derived from
 
-    bordercolor : colorspec
-        color of the border (default foreground color)
+    function : function
+        function that calculates the value from the values of the sources
 
-    borderlinewidth : int
-        width of the line around the panel (default 1)
+    type : str
+        type of the derived values (see MonitorTimestamp) |n|
+        default: 'float'
 
-    nowcolor : colorspec
-        color of the line indicating now (default red)
+    env : Environment
+        environment where the monitor is defined |n|
+        if omitted, default_env will be used
 
-    titlecolor : colorspec
-        color of the title (default foreground color)
+    store : bool
+        if True (default), the values are derived from the stored values of the sources when queried |n|
+        if False, the sources should not store their values either. In that case the running statistics
+        are updated by the sources whenever they change.
+
+    Note
+    ----
+    The derived value is off if any of the sources is off or if the derived monitor itself is not monitoring.
+    '''
+
+    def __init__(self, name, sources, function, type='float', env=None, store=True):
+        if env is None:
+            self.env = default_env()
+        else:
+            self.env = env
+        self._timestamp = True
+        self._store = store
+        self._compression = None
+        self._sketches = None
+        self._mutations = 0
+        self._cache_state = None
+        self._x_weight_state = None
+        self._dependents = []
+        self.weighted = True
+        self.weight_legend = 'duration'
+        _set_name(name, self.env._nameserializeComponent, self)
+        self.xtypecode, self.off = type_to_typecode_off(type)
+        self._sources = tuple(sources)
+        self._function = function
+        self._monitor = True
+        if not store:
+            for m in self._sources:
+                if m._store:
+                    raise SalabimError(m.name() + ' should not store its values')
+                m._dependents.append(self)
+        self.reset()
+
+    @property
+    def _tally(self):
+        return self._function(*[m._tally for m in self._sources])
+
+    @property
+    def _t(self):
+        self._derive()
+        return self._derived_t
+
+    @property
+    def _xw(self):
+        self._derive()
+        return self._derived_xw
+
+    def _derive(self):
+        # recalculates the values only if any of the sources has changed since the last time
+        key = self._state()[:-1]
+        if key == self._derived_key:
+            return
+        self._derived_key = key
+        if self.xtypecode:
+            xw = array.array(self.xtypecode)
+        else:
+            xw = []
+        tw = array.array('d')
+        curx = [m.off for m in self._sources]
+        n = len(self._sources)
+        monitoring = True
+        streams = [zip(m._t, itertools.repeat(index), m._xw) for index, m in enumerate(self._sources)]
+        streams.append(zip(self._monitor_t, itertools.repeat(n), self._monitor_on))
+        for t, index, x in heapq.merge(*streams):
+            if index == n:
+                monitoring = x
+            else:
+                curx[index] = x
+            if not monitoring or any(xi == m.off for xi, m in zip(curx, self._sources)):
+                value = self.off
+            else:
+                value = self._function(*curx)
+            t = max(t, self._reset_t)
+            if tw and t == tw[-1]:
+                xw[-1] = value
+            else:
+                tw.append(t)
+                xw.append(value)
+        self._derived_t = tw
+        self._derived_xw = xw
+
+    def _state(self):
+        return (self._mutations,) + tuple(m._mutations for m in self._sources) + (self.env._now,)
+
+    def set_x_weight(self):
+        if self._store:
+            self._derive()  # invalidates _x and _weight if any of the sources has changed
+        MonitorTimestamp.set_x_weight(self)
+
+    def _value(self):
+        if self._monitor and all(m._monitor for m in self._sources):
+            return self._tally
+        return self.off
+
+    def _update(self):
+        # called by the sources when they change (only if not stored)
+        self._stream(self._value(), self.env._now)
+
+    def reset(self, monitor=None):
+        '''
+        resets the derived timestamped monitor
+
+        Parameters
+        ----------
+        monitor : bool
+            if True, monitoring will be on. |n|
+            if False, monitoring is disabled |n|
+            if omitted, the monitor state remains unchanged
+
+        Note
+        ----
+        Only values from now on will be used, as long as the sources are not reset.
+        '''
+        if monitor is not None:
+            self._monitor = monitor
+        self._mutations += 1
+        if not self._store:
+            self._statistics = (_RunningStatistics(), _RunningStatistics())
+            self._stream_t = self.env._now
+            self._stream_x = self._value()
+            return
+        self._reset_t = self.env._now
+        self._monitor_t = array.array('d', [self.env._now])
+        self._monitor_on = [self._monitor]
+        self._derived_key = None
+
+    def monitor(self, value=None):
+        '''
+        enables/disabled the derived timestamped monitor
+
+        Parameters
+        ----------
+        value : bool
+            if True, monitoring will be on. |n|
+            if False, monitoring is disabled |n|
+            if omitted, no change
+
+        Returns
+        -------
+        True, if monitoring enabled. False, if not : bool
+        '''
+        if value is not None:
+            self._monitor = value
+            self._mutations += 1
+            if not self._store:
+                self._update()
+            elif self._monitor_t[-1] == self.env._now:
+                self._monitor_on[-1] = value
+            else:
+                self._monitor_t.append(self.env._now)
+                self._monitor_on.append(value)
+        return self._monitor
+
+    def tally(self, value):
+        raise SalabimError('not possible to tally a derived monitor (' + self.name() + ')')
+
+
+def _occupancy(claimed_quantity, capacity):
+    return 0 if capacity <= 0 else claimed_quantity / capacity
+
+
+def _available_quantity(claimed_quantity, capacity):
+    return capacity - claimed_quantity
+
+
+class AnimateMonitor(object):
+    '''
+    animates a (timestamped) monitor in a panel
+
+    Parameters
+    ----------
+    linecolor : colorspec
+        color of the line or points (default foreground color)
+
+    linewidth : int
+        width of the line or points (default 1 for line, 3 for points)
+
+    fillcolor : colorspec
+        color of the panel (default transparent)
+
+    bordercolor : colorspec
+        color of the border (default foreground color)
+
+    borderlinewidth : int
+        width of the line around the panel (default 1)
+
+    nowcolor : colorspec
+        color of the line indicating now (default red)
+
+    titlecolor : colorspec
+        color of the title (default foreground color)
 
     titlefont : font
         font of the title (default '')
@@ -2250,6 +3150,8 @@ class AnimateMonitor(object):
         vertical_scale=5, horizontal_scale=None, width=200, height=75, xy_anchor='sw', layer=0):
 
         _checkismonitor(monitor)
+        if not monitor._store:
+            raise SalabimError('not possible to animate ' + monitor.name() + ' (values not stored)')
 
         if title is None:
             title = monitor.name()
@@ -2272,6 +3174,8 @@ class AnimateMonitor(object):
         self.aos = []
         self.parent = parent
         self.env = monitor.env
+        if parent is not None:
+            self.env._animation_objects_with_parent = True
         self.aos.append(AnimateRectangle(spec=(0, 0, width, height), offsetx=xll, offsety=yll,
             fillcolor=fillcolor, linewidth=borderlinewidth, linecolor=bordercolor,
             screen_coordinates=True, layer=layer))
@@ -2475,7 +3379,10 @@ if Pythonista:
             g.in_draw = False
 
 
-class Qmember():
+class Qmember(object):
+    __slots__ = ('predecessor', 'successor', 'priority', 'component', 'queue', 'enter_time',
+        '_left', '_right', '_parent', '_size', '_weight', '_min')
+
     def __init__(self):
         pass
 
@@ -2490,15 +3397,255 @@ class Qmember():
         self.queue = q
         self.enter_time = c.env._now
         q._length += 1
-        for iter in q._iter_touched:
-            q._iter_touched[iter] = True
+        if q._iter_log is not None:
+            q._iter_log_append(self)
+        if not c._qmembers:
+            c._qmembers = {}
         c._qmembers[q] = self
+        if q._index is not None:
+            q._index.insert(self)
+        if q._name_index is not None:
+            q._name_index_add(self)
         if q.env._trace:
             if not q._isinternal:
-                q.env.print_trace('', '', c.name(), 'enter ' + q.name())
+                q.env._trace_event(_tr_enter, c, q)
         q.length.tally(q._length)
 
 
+_queue_walk_length = 32  # positional access within this distance from head or tail doesn't use the index
+_iter_log_minimum = 32  # the log of entered qmembers during iteration is compacted beyond this length
+
+
+class _QueueIndex(object):
+    '''
+    order statistic tree over the qmembers of a queue
+
+    The qmembers are the nodes of a treap (randomized binary search tree), in queue order,
+    with subtree sizes. This makes positional access, rank, insertion and removal O(log n).
+    The index is built by Queue._indexed, only when positional access is required on a long queue.
+    '''
+
+    def __init__(self, q):
+        self._random = random.Random(len(q))  # own stream, doesn't disturb the model's random streams
+        self._root = None
+        stack = []
+        mx = q._head.successor
+        while mx is not q._tail:  # build a Cartesian tree in O(n)
+            mx._weight = self._random.random()
+            last = None
+            while stack and stack[-1]._weight < mx._weight:
+                last = stack.pop()
+            mx._left = last
+            mx._right = None
+            if last is not None:
+                last._parent = mx
+            if stack:
+                stack[-1]._right = mx
+                mx._parent = stack[-1]
+            else:
+                mx._parent = None
+            stack.append(mx)
+            mx = mx.successor
+        if stack:
+            self._root = stack[0]
+            nodes = [self._root]
+            for node in nodes:  # preorder, so all descendants follow their ancestors
+                if node._left is not None:
+                    nodes.append(node._left)
+                if node._right is not None:
+                    nodes.append(node._right)
+            for node in reversed(nodes):
+                node._size = 1 + (node._left._size if node._left is not None else 0) +\
+                    (node._right._size if node._right is not None else 0)
+
+    def insert(self, mx):
+        # mx is already linked in the queue, so its position follows from its predecessor and successor
+        mx._left = None
+        mx._right = None
+        mx._size = 1
+        mx._weight = self._random.random()
+        if self._root is None:
+            mx._parent = None
+            self._root = mx
+            return
+        m1 = mx.predecessor
+        if m1.predecessor is not None and m1._right is None:
+            m1._right = mx
+        else:
+            m1 = mx.successor  # consecutive, so this one has no left child
+            m1._left = mx
+        mx._parent = m1
+        while m1 is not None:
+            m1._size += 1
+            m1 = m1._parent
+        while mx._parent is not None and mx._parent._weight < mx._weight:
+            self._rotate_up(mx)
+
+    def remove(self, mx):
+        while True:
+            left = mx._left
+            right = mx._right
+            if left is None:
+                if right is None:
+                    break
+                self._rotate_up(right)
+            elif right is None or left._weight > right._weight:
+                self._rotate_up(left)
+            else:
+                self._rotate_up(right)
+        parent = mx._parent
+        if parent is None:
+            self._root = None
+            return
+        if parent._left is mx:
+            parent._left = None
+        else:
+            parent._right = None
+        while parent is not None:
+            parent._size -= 1
+            parent = parent._parent
+
+    def _rotate_up(self, mx):
+        parent = mx._parent
+        grandparent = parent._parent
+        if parent._left is mx:
+            middle = mx._right
+            parent._left = middle
+            mx._right = parent
+        else:
+            middle = mx._left
+            parent._right = middle
+            mx._left = parent
+        if middle is not None:
+            middle._parent = parent
+        parent._parent = mx
+        mx._parent = grandparent
+        if grandparent is None:
+            self._root = mx
+        elif grandparent._left is parent:
+            grandparent._left = mx
+        else:
+            grandparent._right = mx
+        mx._size = parent._size
+        parent._size = 1 + (parent._left._size if parent._left is not None else 0) +\
+            (parent._right._size if parent._right is not None else 0)
+
+    def rank(self, mx):
+        rank = mx._left._size if mx._left is not None else 0
+        while mx._parent is not None:
+            parent = mx._parent
+            if parent._right is mx:
+                rank += 1 + (parent._left._size if parent._left is not None else 0)
+            mx = parent
+        return rank
+
+    def upper_bound(self, priority, tail):
+        # the qmembers are sorted on priority, so the tree can be searched
+        result = tail
+        mx = self._root
+        while mx is not None:
+            if priority < mx.priority:
+                result = mx
+                mx = mx._left
+            else:
+                mx = mx._right
+        return result
+
+    def select(self, index):
+        mx = self._root
+        while True:
+            left_size = mx._left._size if mx._left is not None else 0
+            if index < left_size:
+                mx = mx._left
+            elif index == left_size:
+                return mx
+            else:
+                index -= left_size + 1
+                mx = mx._right
+
+
+class _RequestIndex(_QueueIndex):
+    '''
+    index of the requesters queue of a resource
+
+    Each node also holds the minimum requested quantity in its subtree (_min). That way, the first requester
+    (in queue order) that doesn't request more than a given quantity is found in O(log n), without visiting
+    the requesters that request more.
+    '''
+
+    def __init__(self, q):
+        self._resource = q._resource
+        _QueueIndex.__init__(self, q)
+        if self._root is not None:
+            nodes = [self._root]
+            for node in nodes:
+                if node._left is not None:
+                    nodes.append(node._left)
+                if node._right is not None:
+                    nodes.append(node._right)
+            for node in reversed(nodes):
+                self._update_min(node)
+
+    def _update_min(self, mx):
+        minimum = mx.component._requests[self._resource]
+        if mx._left is not None and mx._left._min < minimum:
+            minimum = mx._left._min
+        if mx._right is not None and mx._right._min < minimum:
+            minimum = mx._right._min
+        mx._min = minimum
+
+    def update(self, mx):
+        # updates the minima from mx up to the root (required if the requested quantity of mx changes)
+        while mx is not None:
+            self._update_min(mx)
+            mx = mx._parent
+
+    def insert(self, mx):
+        quantity = mx.component._requests[self._resource]
+        mx._min = quantity
+        _QueueIndex.insert(self, mx)
+        mx = mx._parent
+        while mx is not None and mx._min > quantity:  # the rotations have maintained all other minima
+            mx._min = quantity
+            mx = mx._parent
+
+    def remove(self, mx):
+        _QueueIndex.remove(self, mx)
+        if self._root is not None:
+            mx = mx._parent
+            while mx is not None:
+                minimum = mx._min
+                self._update_min(mx)
+                if mx._min == minimum:
+                    break  # so the minima of the ancestors don't change either
+                mx = mx._parent
+
+    def _rotate_up(self, mx):
+        parent = mx._parent
+        _QueueIndex._rotate_up(self, mx)
+        self._update_min(parent)  # parent is now a child of mx
+        self._update_min(mx)
+
+    def first_fit(self, quantity, start=0):
+        # returns the first qmember with rank >= start that requests at most quantity (None if there's none)
+        if self._root._min > quantity:
+            return None
+        return self._first_fit(self._root, 0, quantity, start)
+
+    def _first_fit(self, mx, offset, quantity, start):
+        # offset is the rank of the first qmember in the subtree of mx
+        if mx is None or mx._min > quantity:
+            return None
+        rank = offset + (mx._left._size if mx._left is not None else 0)
+        if start < rank:
+            result = self._first_fit(mx._left, offset, quantity, start)
+            if result is not None:
+                return result
+        if rank >= start and mx.component._requests[self._resource] <= quantity:
+            return mx
+        return self._first_fit(mx._right, rank + 1, quantity, start)
+
+
 class Queue(object):
     '''
     Queue object
@@ -2525,11 +3672,27 @@ class Queue(object):
     env : Environment
         environment where the queue is defined |n|
         if omitted, default_env will be used
+
+    order : str
+        if None (default), positional access is optimized when required |n|
+        if 'priority', the queue is optimized for entering according to priority (enter_sorted, add_sorted)
+        and changing priorities, which are then O(log n) instead of O(n). This is
+        useful for long queues with many different priorities.
+
+    store : bool
+        if True (default), all values of length and length_of_stay are stored |n|
+        if False, length and length_of_stay only maintain running statistics (see Monitor)
+
+    sketch : bool or int
+        if True or an int, length and length_of_stay maintain a t-digest to estimate
+        percentiles in bounded memory (see Monitor) |n|
+        if False (default), no t-digest
     '''
 
-    def __init__(self, name=None, monitor=True, fill=None, env=None, *args, **kwargs):
+    def __init__(self, name=None, monitor=True, fill=None, env=None, order=None, store=True, sketch=False,
+      *args, **kwargs):
         if env is None:
-            self.env = g.default_env
+            self.env = default_env()
         else:
             self.env = env
         _set_name(name, self.env._nameserializeQueue, self)
@@ -2544,13 +3707,23 @@ class Queue(object):
         self._head.priority = 0
         self._tail.priority = 0
         self._length = 0
-        self._iter_sequence = 0
-        self._iter_touched = {}
+        if order == 'priority':
+            self._index = self._new_index()
+        elif order is None:
+            self._index = None
+        else:
+            raise SalabimError('order ' + repr(order) + ' not recognized')
+        self._order = order
+        self._name_index = None  # qmembers per name (only maintained after component_with_name)
+        self._iter_log = None  # qmembers that entered while iterating (only maintained during iteration)
+        self._iter_positions = []  # per active iteration, its position in _iter_log (as a one element list)
         self._isinternal = False
         self.length = MonitorTimestamp(
-            'Length of ' + self.name(), initial_tally=0, monitor=monitor, type='uint32', env=self.env)
+            'Length of ' + self.name(), initial_tally=0, monitor=monitor, type='uint32', env=self.env, store=store,
+            sketch=sketch)
         self.length_of_stay = Monitor(
-            'Length of stay in ' + self.name(), monitor=monitor, type='float')
+            'Length of stay in ' + self.name(), monitor=monitor, type='float', env=self.env, store=store,
+            sketch=sketch)
         if fill is not None:
             savetrace = self.env._trace
             self.env._trace = False
@@ -2941,6 +4114,7 @@ class Queue(object):
         Note
         ----
         the priority of component will be set to the priority of the index'th component,
+        or the priority of the tail if index is len(self), |n|
         or 0 if the queue is empty
         '''
         if index < 0:
@@ -2948,14 +4122,12 @@ class Queue(object):
         if index > self._length:
             raise SalabimError('index > lengh of queue')
         component._checknotinqueue(self)
-        mx = self._head.successor
-        count = 0
-        while mx != self._tail:
-            if count == index:
-                break
-            count = count + 1
-            mx = mx.successor
-        priority = mx.priority
+        if index < self._length:
+            mx = self._qmember_at(index)
+            priority = mx.priority
+        else:
+            mx = self._tail
+            priority = mx.predecessor.priority
         Qmember().insert_in_front_of(mx, component, self, priority)
 
     def add_behind(self, component, poscomponent):
@@ -3105,53 +4277,83 @@ class Queue(object):
         if isinstance(key, slice):
             # Get the start, stop, and step from the slice
             startval, endval, incval = key.indices(self._length)
+            l = []
             if incval > 0:
-                l = []
-                targetval = startval
-                mx = self._head.successor
-                count = 0
-                while mx != self._tail:
-                    if targetval >= endval:
-                        break
-                    if targetval == count:
-                        l.append(mx.component)
-                        targetval += incval
-                    count += 1
-                    mx = mx.successor
+                if startval < endval:
+                    mx = self._qmember_at(startval)
+                    targetval = startval
+                    count = startval
+                    while mx != self._tail:
+                        if targetval >= endval:
+                            break
+                        if targetval == count:
+                            l.append(mx.component)
+                            targetval += incval
+                        count += 1
+                        mx = mx.successor
             else:
-                l = []
-                targetval = startval
-                mx = self._tail.predecessor
-                count = self._length - 1
-                while mx != self._head:
-                    if targetval <= endval:
-                        break
-                    if targetval == count:
-                        l.append(mx.component)
-                        targetval += incval  # incval is negative here!
-                    count -= 1
-                    mx = mx.predecessor
+                if startval > endval:
+                    mx = self._qmember_at(startval)
+                    targetval = startval
+                    count = startval
+                    while mx != self._head:
+                        if targetval <= endval:
+                            break
+                        if targetval == count:
+                            l.append(mx.component)
+                            targetval += incval  # incval is negative here!
+                        count -= 1
+                        mx = mx.predecessor
 
-            return list(l)
+            return l
 
         elif isinstance(key, int):
             if key < 0:  # Handle negative indices
                 key += self._length
             if key < 0 or key >= self._length:
                 return None
-            mx = self._head.successor
-            count = 0
-            while mx != self._tail:
-                if count == key:
-                    return mx.component
-                count = count + 1
-                mx = mx.successor
-
-            return None  # just for safety
+            return self._qmember_at(key).component
 
         else:
             raise TypeError('Invalid argument type.')
 
+    def _insertion_point(self, priority):
+        # returns the first qmember with a priority > given priority (or the tail)
+        mx = self._tail.predecessor
+        if mx is self._head or mx.priority <= priority:
+            return self._tail
+        if self._index is not None:
+            return self._index.upper_bound(priority, self._tail)
+        mx = self._head.successor
+        while (mx != self._tail) and (mx.priority <= priority):
+            mx = mx.successor
+        return mx
+
+    def _indexed(self):
+        # returns the positional index of the queue, which is built on first use
+        if self._index is None:
+            self._index = self._new_index()
+        return self._index
+
+    def _new_index(self):
+        # returns a new positional index of the queue
+        return _QueueIndex(self)
+
+    def _qmember_at(self, index):
+        # returns the index-th qmember (0 <= index < len(self)) |n|
+        # positions near the head or tail are found by walking, others via the index (O(log n))
+        if index < _queue_walk_length:
+            mx = self._head.successor
+            for _ in range(index):
+                mx = mx.successor
+            return mx
+        if index >= self._length - _queue_walk_length:
+            mx = self._tail.predecessor
+            for _ in range(self._length - 1 - index):
+                mx = mx.predecessor
+            return mx
+        return self._indexed().select(index)
+
     def __delitem__(self, key):
         if isinstance(key, slice):
             for c in self[key]:
@@ -3165,32 +4367,7 @@ class Queue(object):
         return self._length
 
     def __reversed__(self):
-        self._iter_sequence += 1
-        iter_sequence = self._iter_sequence
-        self._iter_touched[iter_sequence] = False
-        iter_list = []
-        mx = self._tail.predecessor
-        while mx != self._head:
-            iter_list.append(mx)
-            mx = mx.predecessor
-        iter_index = 0
-        while len(iter_list) > iter_index:
-            if self._iter_touched[iter_sequence]:
-                # place all taken qmembers on the list
-                iter_list = iter_list[:iter_index]
-                mx = self._tail.predecessor
-                while mx != self._head:
-                    if mx not in iter_list:
-                        iter_list.append(mx)
-                    mx = mx.precessor
-                self._iter_touched[iter_sequence] = False
-            else:
-                c = iter_list[iter_index].component
-                if c is not None:  # skip deleted components
-                    yield c
-                iter_index += 1
-
-        del self._iter_touched[iter_sequence]
+        return self._iterate(reverse=True)
 
     def __add__(self, q):
         return self.union(q)
@@ -3257,42 +4434,97 @@ class Queue(object):
         -------
         the first component in the queue with name txt : Component |n|
             returns None if not found
+
+        Note
+        ----
+        On the first call, an index of the names in the queue is built, which is maintained from then on.
+        So, subsequent calls are O(1).
         '''
-        mx = self._head.successor
-        while mx != self._tail:
+        if self._name_index is None:
+            self._name_index = {}
+            mx = self._head.successor
+            while mx != self._tail:
+                self._name_index_add(mx)
+                mx = mx.successor
+        qmembers = self._name_index.get(txt)
+        if not qmembers:
+            return None
+        if len(qmembers) == 1:
+            return qmembers[0].component
+        return min(qmembers, key=self._indexed().rank).component
 
-            if mx.component.name() == txt:
-                return mx.component
-            mx = mx.successor
-        return None
+    def _name_index_add(self, mx):
+        self._name_index.setdefault(mx.component.name(), []).append(mx)
+
+    def _name_index_remove(self, mx):
+        name = mx.component.name()
+        qmembers = self._name_index[name]
+        qmembers.remove(mx)
+        if not qmembers:
+            del self._name_index[name]
 
     def __iter__(self):
-        self._iter_sequence += 1
-        iter_sequence = self._iter_sequence
-        self._iter_touched[iter_sequence] = False
+        return self._iterate(reverse=False)
+
+    def _iterate(self, reverse):
+        # yields the components in the queue at the start of the iteration that are still in the queue,
+        # followed by the components that entered the queue during the iteration (in order of entering). |n|
+        # The queue keeps a log of entered qmembers as long as there's an active iteration,
+        # so entering and leaving don't depend on the number of active iterations.
         iter_list = []
-        mx = self._head.successor
-        while mx != self._tail:
-            iter_list.append(mx)
-            mx = mx.successor
-        iter_index = 0
-        while len(iter_list) > iter_index:
-            if self._iter_touched[iter_sequence]:
-                # place all taken qmembers on the list
-                iter_list = iter_list[:iter_index]
-                mx = self._head.successor
-                while mx != self._tail:
-                    if mx not in iter_list:
-                        iter_list.append(mx)
-                    mx = mx.successor
-                self._iter_touched[iter_sequence] = False
-            else:
-                c = iter_list[iter_index].component
-                if c is not None:  # skip deleted components
+        if reverse:
+            mx = self._tail.predecessor
+            while mx != self._head:
+                iter_list.append(mx)
+                mx = mx.predecessor
+        else:
+            mx = self._head.successor
+            while mx != self._tail:
+                iter_list.append(mx)
+                mx = mx.successor
+        if self._iter_log is None:
+            self._iter_log = []
+            self._iter_log_limit = _iter_log_minimum
+        position = [len(self._iter_log)]
+        self._iter_positions.append(position)
+        try:
+            for mx in iter_list:
+                c = mx.component
+                if c is not None:  # skip components that left the queue
                     yield c
-                iter_index += 1
-
-        del self._iter_touched[iter_sequence]
+            while position[0] < len(self._iter_log):
+                c = self._iter_log[position[0]].component
+                position[0] += 1
+                if c is not None:
+                    yield c
+        finally:
+            for i, iter_position in enumerate(self._iter_positions):
+                if iter_position is position:
+                    del self._iter_positions[i]
+                    break
+            if not self._iter_positions:
+                self._iter_log = None
+
+    def _iter_log_append(self, mx):
+        self._iter_log.append(mx)
+        if len(self._iter_log) > self._iter_log_limit:
+            self._iter_log_compact()
+
+    def _iter_log_compact(self):
+        # removes the qmembers that left the queue from the log and adjusts the positions of the iterations.
+        # The limit is doubled relative to the remaining length, so compacting is amortized O(1) per enter.
+        iter_log = self._iter_log
+        new_positions = []
+        live = []
+        for mx in iter_log:
+            new_positions.append(len(live))
+            if mx.component is not None:
+                live.append(mx)
+        new_positions.append(len(live))
+        for position in self._iter_positions:
+            position[0] = new_positions[position[0]]
+        iter_log[:] = live
+        self._iter_log_limit = 2 * len(live) + _iter_log_minimum
 
     def extend(self, q):
         '''
@@ -3308,17 +4540,180 @@ class Queue(object):
         '''
         savetrace = self.env._trace
         self.env._trace = False
-        for c in q:
-            if c not in self:
-                c.enter(q)
+        self._enter_many([c for c in q if c not in self])
         self.env._trace = savetrace
 
+    def extend_from(self, components):
+        '''
+        adds components to the tail of the queue, with only one update of the length monitor
+
+        Parameters
+        ----------
+        components : iterable
+            components to be added to the tail of the queue (in the given order) |n|
+            may not be member of the queue yet
+
+        Note
+        ----
+        The components added to the queue will get the priority of the tail of the queue,
+        or 0 if the queue is empty. |n|
+        This is equivalent to c.enter(q) for all components, but faster.
+        '''
+        self._enter_many(list(components))
+
+    def pop_many(self, n=None):
+        '''
+        removes a number of components from the head of the queue, with only one update of the length monitor
+
+        Parameters
+        ----------
+        n : int
+            number of components to be removed |n|
+            if omitted, all components
+
+        Returns
+        -------
+        the removed components (in queue order) : list
+
+        Note
+        ----
+        If the queue contains less than n components, all components will be removed. |n|
+        The length_of_stay monitor is updated for each component.
+        '''
+        qmembers = []
+        mx = self._head.successor
+        while mx != self._tail and (n is None or len(qmembers) < n):
+            qmembers.append(mx)
+            mx = mx.successor
+        components = [mx.component for mx in qmembers]
+        self._leave_many(qmembers)
+        return components
+
+    def move_all(self, target):
+        '''
+        moves all components to the tail of another queue, with only one update of the length monitor per queue
+
+        Parameters
+        ----------
+        target : Queue
+            queue to move the components to |n|
+            none of the components may be member of target
+
+        Returns
+        -------
+        the moved components (in queue order) : list
+
+        Note
+        ----
+        The components get the priority of the tail of target, or 0 if target is empty. |n|
+        The length_of_stay monitor of the queue is updated for each component.
+        '''
+        for c in self:
+            c._checknotinqueue(target)
+        components = self.pop_many()
+        target._enter_many(components)
+        return components
+
+    def _enter_many(self, components, priorities=None, check=True):
+        # adds components to the tail, with one tally of the length monitor |n|
+        # if priorities is None, all components get the priority of the tail |n|
+        # check=False may only be used if the components are unique and not in the queue
+        if not components:
+            return
+        if check:
+            if len(set(components)) != len(components):
+                raise SalabimError('component(s) specified more than once')
+            for c in components:
+                c._checknotinqueue(self)
+        env = self.env
+        trace = env._trace and not self._isinternal
+        tail = self._tail
+        m1 = tail.predecessor
+        if priorities is None:
+            priorities = itertools.repeat(m1.priority)
+        if self._order is None:
+            self._index = None  # will be rebuilt when required
+        for c, priority in zip(components, priorities):
+            mx = Qmember()
+            mx.predecessor = m1
+            mx.successor = tail
+            m1.successor = mx
+            tail.predecessor = mx
+            mx.priority = priority
+            mx.component = c
+            mx.queue = self
+            mx.enter_time = env._now
+            if self._iter_log is not None:
+                self._iter_log_append(mx)
+            if self._index is not None:
+                self._index.insert(mx)
+            if not c._qmembers:
+                c._qmembers = {}
+            c._qmembers[self] = mx
+            if self._name_index is not None:
+                self._name_index_add(mx)
+            if trace:
+                env._trace_event(_tr_enter, c, self)
+            m1 = mx
+        self._length += len(components)
+        self.length.tally(self._length)
+
+    def _leave_many(self, qmembers):
+        # removes qmembers from the queue, with one tally of the length monitor
+        if not qmembers:
+            return
+        env = self.env
+        trace = env._trace and not self._isinternal
+        if self._order is None:
+            self._index = None  # will be rebuilt when required
+        for mx in qmembers:
+            if self._index is not None:
+                self._index.remove(mx)
+            if self._name_index is not None:
+                self._name_index_remove(mx)
+            m1 = mx.predecessor
+            m2 = mx.successor
+            m1.successor = m2
+            m2.predecessor = m1
+            c = mx.component
+            mx.component = None
+            del c._qmembers[self]
+            if trace:
+                env._trace_event(_tr_leave, c, self)
+            self.length_of_stay.tally(env._now - mx.enter_time)
+        self._length -= len(qmembers)
+        self.length.tally(self._length)
+
     def as_set(self):
         return {c for c in self}
 
     def as_list(self):
         return [c for c in self]
 
+    def view(self, condition=None, name=None):
+        '''
+        returns a lazy view on the queue, optionally filtered
+
+        Parameters
+        ----------
+        condition : function
+            function of a component, returning True if the component is in the view |n|
+            if omitted, all components of the queue are in the view
+
+        name : str
+            name of the view |n|
+            if omitted, the name of the queue
+
+        Returns
+        -------
+        view on the queue : QueueView
+
+        Note
+        ----
+        The components are not copied: the view always reflects the current contents of the queue.
+        '''
+        return QueueView(self, condition=condition, name=name)
+
     def union(self, q, name=None, monitor=False):
         '''
         Parameters
@@ -3348,26 +4743,11 @@ class Queue(object):
         in that order. |n|
         Alternatively, the more pythonic | operator is also supported, e.g. q1 | q2
         '''
-        save_trace = self.env._trace
-        self.env._trace = False
         if name is None:
             name = self.name() + ' | ' + q.name()
-        q1 = type(self)(name=name, monitor=monitor, env=self.env)
-        self_set = self.as_set()
-
-        mx = self._head.successor
-        while mx != self._tail:
-            Qmember().insert_in_front_of(q1._tail, mx.component, q1, 0)
-            mx = mx.successor
-
-        mx = q._head.successor
-        while mx != q._tail:
-            if mx.component not in self_set:
-                Qmember().insert_in_front_of(q1._tail, mx.component, q1, 0)
-            mx = mx.successor
-
-        self.env._trace = save_trace
-        return q1
+        components = self.as_list()
+        components.extend(c for c in q if c._member(self) is None)
+        return self._new_queue(name, monitor, components)
 
     def intersection(self, q, name=None, monitor=False):
         '''
@@ -3398,21 +4778,12 @@ class Queue(object):
         in the same order as in self. |n|
         Alternatively, the more pythonic & operator is also supported, e.g. q1 & q2
         '''
-        save_trace = self.env._trace
-        self.env._trace = False
         if name is None:
             name = self.name() + ' & ' + q.name()
-        q1 = type(self)(name=name, monitor=monitor, env=self.env)
-        q_set = q.as_set()
-        mx = self._head.successor
-        while mx != self._tail:
-            if mx.component in q_set:
-                Qmember().insert_in_front_of(q1._tail, mx.component, q1, 0)
-            mx = mx.successor
-        self.env._trace = save_trace
-        return q1
+        components = [c for c in self if c._member(q) is not None]
+        return self._new_queue(name, monitor, components)
 
-    def difference(self, q, name=None, monitor=monitor):
+    def difference(self, q, name=None, monitor=False):
         '''
         returns the difference of two queues
 
@@ -3441,20 +4812,11 @@ class Queue(object):
         '''
         if name is None:
             name = self.name() + ' - ' + q.name()
-        save_trace = self.env._trace
-        self.env._trace = False
-        q1 = type(self)(name=name, monitor=monitor, env=self.env)
-        q_set = q.as_set()
-        mx = self._head.successor
-        while mx != self._tail:
-            if mx.component not in q_set:
-                Qmember().insert_in_front_of(
-                    q1._tail, mx.component, q1, mx.priority)
-            mx = mx.successor
-        self.env._trace = save_trace
-        return q1
+        qmembers = [mx for mx in self._iter_qmembers() if mx.component._member(q) is None]
+        return self._new_queue(
+            name, monitor, [mx.component for mx in qmembers], [mx.priority for mx in qmembers])
 
-    def symmetric_difference(self, q, name=None, monitor=monitor):
+    def symmetric_difference(self, q, name=None, monitor=False):
         '''
         returns the symmetric difference of two queues
 
@@ -3483,28 +4845,11 @@ class Queue(object):
         '''
         if name is None:
             name = self.name() + ' ^ ' + q.name()
-        save_trace = self.env._trace
-        self.env._trace = False
-        q1 = type(self)(name=name, monitor=monitor, env=self.env)
-
-        intersection_set = self.as_set() & q.as_set()
-        mx = self._head.successor
-        while mx != self._tail:
-            if mx.component not in intersection_set:
-                Qmember().insert_in_front_of(
-                    q1._tail, mx.component, q1, 0)
-            mx = mx.successor
-        mx = q._head.successor
-        while mx != q._tail:
-            if mx.component not in intersection_set:
-                Qmember().insert_in_front_of(
-                    q1._tail, mx.component, q1, 0)
-            mx = mx.successor
-
-        self.env._trace = save_trace
-        return q1
+        components = [c for c in self if c._member(q) is None]
+        components.extend(c for c in q if c._member(self) is None)
+        return self._new_queue(name, monitor, components)
 
-    def copy(self, name=None, monitor=monitor):
+    def copy(self, name=None, monitor=False):
         '''
         returns a copy of two queues
 
@@ -3527,19 +4872,29 @@ class Queue(object):
         The priority will be copied from original queue.
         Also, the order will be maintained.
         '''
-        save_trace = self.env._trace
-        self.env._trace = False
         if name is None:
             name = 'copy of ' + self.name()
-        q1 = type(self)(name=name, env=self.env)
+        qmembers = list(self._iter_qmembers())
+        return self._new_queue(
+            name, monitor, [mx.component for mx in qmembers], [mx.priority for mx in qmembers])
+
+    def _iter_qmembers(self):
+        # generates the qmembers of the queue, from head to tail (not safe for changes during the iteration)
         mx = self._head.successor
         while mx != self._tail:
-            Qmember().insert_in_front_of(q1._tail, mx.component, q1, mx.priority)
+            yield mx
             mx = mx.successor
+
+    def _new_queue(self, name, monitor, components, priorities=None):
+        # returns a new queue (of the same type as self) with the given, unique, components
+        save_trace = self.env._trace
+        self.env._trace = False
+        q1 = type(self)(name=name, monitor=monitor, env=self.env)
+        q1._enter_many(components, priorities, check=False)
         self.env._trace = save_trace
         return q1
 
-    def move(self, name=None, monitor=monitor):
+    def move(self, name=None, monitor=False):
         '''
         makes a copy of a queue and empties the original
 
@@ -3573,1261 +4928,2236 @@ class Queue(object):
         '''
         savetrace = self.env._trace
         self.env._trace = False
-        mx = self._head.successor
-        while mx != self._tail:
-            c = mx.component
-            mx = mx.successor
-            c.leave(self)
-        self._trace = savetrace
+        self._index = None  # no need to maintain the indexes while removing all
+        self._name_index = None
+        self.pop_many()
+        if self._order == 'priority':
+            self._index = self._new_index()
+        self.env._trace = savetrace
         if self.env._trace:
             self.env.print_trace('', '', self.name() + ' clear')
 
 
-class Environment(object):
+class _Requesters(Queue):
+    # requesters queue of a resource, with an index on the requested quantities
+
+    def __init__(self, resource=None, *args, **kwargs):
+        self._resource = resource
+        Queue.__init__(self, *args, **kwargs)
+
+    def _new_index(self):
+        if self._resource is None:
+            return _QueueIndex(self)
+        return _RequestIndex(self)
+
+
+class QueueView(object):
     '''
-    environment object
+    QueueView object
+
+    A QueueView is a lazy, read only view on the union of one or more queues (or views),
+    optionally filtered with a condition. The components are not copied, so the view always reflects
+    the current contents of the underlying queues, without any overhead when components enter or leave.
 
     Parameters
     ----------
-    trace : bool
-        defines whether to trace or not |n|
-        if omitted, False
+    sources : Queue, QueueView or list/tuple of these
+        queue(s) and/or view(s) to be viewed
 
-    random_seed : hashable object, usually int
-        the seed for random, equivalent to random.seed() |n|
-        if '*', a purely random value (based on the current time) will be used
-        (not reproducable) |n|
-        if the null string (''), no action on random is taken |n|
-        if None (the default), 1234567 will be used.
+    condition : function
+        function of a component, returning True if the component is in the view |n|
+        if omitted, all components of the sources are in the view
 
     name : str
-        name of the environment |n|
-        if the name ends with a period (.),
-        auto serializing will be applied |n|
-        if the name end with a comma,
-        auto serializing starting at 1 will be applied |n|
-        if omitted, the name will be derived from the class (lowercased)
-        or 'default environment' if isdefault_env is True.
-
-    print_trace_header : bool
-        if True (default) print a (two line) header line as a legend |n|
-        if False, do not print a header |n|
-        note that the header is only printed if trace=True
-
-    isdefault_env : bool
-        if True (default), this environment becomes the default environment |n|
-        if False, this environment will not be the default environment |n|
-        if omitted, this environment becomes the default environment |n|
+        name of the view |n|
+        if omitted, the names of the sources, separated by ' | '
 
     Note
     ----
-    The trace may be switched on/off later with trace |n|
-    The seed may be later set with random_seed() |n|
-    Initially, the random stream will be seeded with the value 1234567.
-    If required to be purely, not not reproducable, values, use
-    random_seed='*'.
+    The order of a view is: first all (matching) components of the first source, in that order,
+    followed by the (matching) components of the second source that are not in the first source,
+    in that order, etc. |n|
+    Iterating over a view is O(n), but the length of a view is also determined by iteration,
+    unless the view is an unfiltered view on one queue. |n|
+    A view can be converted into a queue with as_queue. |n|
+    The | operator is supported, e.g. q1.view() | q2 is the (lazy) union of q1 and q2.
     '''
-    _nameserialize = {}
-    cached_modelname_width = [None, None]
 
-    def __init__(self, trace=False, random_seed=None, name=None,
-      print_trace_header=True, isdefault_env=True, *args, **kwargs):
-        if isdefault_env:
-            g.default_env = self
+    def __init__(self, sources, condition=None, name=None):
+        if isinstance(sources, (Queue, QueueView)):
+            sources = (sources,)
+        self._sources = tuple(sources)
+        if not self._sources:
+            raise SalabimError('at least one source required')
+        self._condition = condition
         if name is None:
-            if isdefault_env:
-                name = 'default environment'
-        self._trace = trace
-        self._source_files = {inspect.getframeinfo(_get_caller_frame()).filename: 0}
-        if random_seed != '':
-            if random_seed is None:
-                random_seed = 1234567
-            elif random_seed == '*':
-                random_seed = None
-            random.seed(random_seed)
-        _set_name(name, Environment._nameserialize, self)
-        self._buffered_trace = False
-        self._suppress_trace_standby = True
-        if self._trace:
-            if print_trace_header:
-                self.print_trace_header()
-            self.print_trace('', '', self.name() + ' initialize')
-        self.env = self
-        # just to allow main to be created; will be reset later
-        self._nameserializeComponent = {}
-        self._now = 0
-        self._offset = 0
-        self._main = Component(name='main', env=self, process=None)
-        self._main._status = current
-        self._main.frame = _get_caller_frame()
-        self._current_component = self._main
-        if self._trace:
-            self.print_trace('{:10.3f}'.format(0), 'main', 'current')
-        self._nameserializeQueue = {}
-        self._nameserializeComponent = {}
-        self._nameserializeResource = {}
-        self._nameserializeState = {}
-        self._nameserializeMonitor = {}
-        self._nameserializeMonitorTimestamp = {}
-        self._seq = 0
-        self._event_list = []
-        self._standbylist = []
-        self._pendingstandbylist = []
+            name = ' | '.join(source.name() for source in self._sources)
+        self._name = name
+        self.env = self._sources[0].env
 
-        self.an_objects = []
-        self.ui_objects = []
-        self.sys_objects = []
-        self.serial = 0
-        self._speed = 1
-        self._animate = False
-        self.running = False
-        self.t = 0
-        self._synced = True
-        self._step_pressed = False
-        self.stopped = False
-        self.last_s0 = ''
-        if Pythonista:
-            self._width, self._height = ui.get_screen_size()
-            self._width = int(self._width)
-            self._height = int(self._height)
-        else:
-            self._width = 1024
-            self._height = 768
-        self._x0 = 0
-        self._y0 = 0
-        self._x1 = self._width
-        self._scale = 1
-        self._y1 = self._y0 + self._height
-        self._background_color = 'white'
-        self._foreground_color = 'black'
-        self._fps = 30
-        self._modelname = ''
-        self.use_toplevel = False
-        self._show_fps = False
-        self._show_time = True
-        self._video = ''
-        self._video_out = None
-        self._video_repeat = 1
-        self._video_pingpong = False
-        self.an_modelname()
-        self.an_clocktext()
+    def __repr__(self):
+        return objectclass_to_str(self) + ' (' + self.name() + ')'
 
-        self.setup(*args, **kwargs)
+    def name(self):
+        '''
+        Returns
+        -------
+        name of the view : str
+        '''
+        return self._name
 
-    def setup(self):
+    def sources(self):
         '''
-        called immediately after initialization of an environment.
+        Returns
+        -------
+        queues and/or views the view is defined on : tuple
+        '''
+        return self._sources
 
-        by default this is a dummy method, but it can be overridden.
+    def __iter__(self):
+        condition = self._condition
+        for i, source in enumerate(self._sources):
+            previous = self._sources[:i]
+            for c in source:
+                if previous and any(c in source_previous for source_previous in previous):
+                    continue
+                if condition is None or condition(c):
+                    yield c
 
-        only keyword arguments are passed
+    def __contains__(self, component):
+        if not any(component in source for source in self._sources):
+            return False
+        return self._condition is None or bool(self._condition(component))
+
+    def __len__(self):
+        if self._condition is None and len(self._sources) == 1:
+            return len(self._sources[0])
+        return sum(1 for c in self)
+
+    def __getitem__(self, key):
+        if isinstance(key, int) and key >= 0:
+            for i, c in enumerate(self):
+                if i == key:
+                    return c
+            return None
+        l = self.as_list()
+        if isinstance(key, int):
+            if key < -len(l):
+                return None
+        return l[key]
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def head(self):
         '''
-        pass
+        Returns
+        -------
+        the first component of the view, if any : Component |n|
+            None otherwise
+        '''
+        return self[0]
 
-    def serialize(self):
-        self.serial += 1
-        return self.serial
+    def as_list(self):
+        return [c for c in self]
 
-    def __repr__(self):
-        return objectclass_to_str(self) + ' (' + self.name() + ')'
+    def as_set(self):
+        return {c for c in self}
 
-    def animation_pre_tick(self, t):
+    def view(self, condition=None, name=None):
         '''
-        called just before the animation object loop. |n|
-        Default behaviour: just return
+        returns a (further) filtered view on the view
 
         Parameters
         ----------
-        t : float
-            Current (animation) time.
+        condition : function
+            function of a component, returning True if the component is in the view |n|
+            if omitted, all components of the view are in the new view
+
+        name : str
+            name of the view |n|
+            if omitted, the name of this view
+
+        Returns
+        -------
+        view on the view : QueueView
         '''
-        return
+        if name is None:
+            name = self.name()
+        return QueueView(self, condition=condition, name=name)
 
-    def animation_post_tick(self, t):
+    def union(self, other, name=None):
         '''
-        called just after the animation object loop. |n|
-        Default behaviour: just return
+        returns the lazy union of the view and another queue or view
 
         Parameters
         ----------
-        t : float
-            Current (animation) time.
-        '''
-        return
+        other : Queue or QueueView
+            queue or view to be unioned with the view
 
-    def animation_pre_tick_sys(self, t):
-        for ao in self.sys_objects:
-            ao.update(t)
+        name : str
+            name of the view |n|
+            if omitted, self.name() | other.name()
 
-    def print_info(self, as_str=False, file=None):
+        Returns
+        -------
+        view on all components of self and other : QueueView
         '''
-        prints information about the environment
+        return QueueView((self, other), name=name)
+
+    def as_queue(self, name=None, monitor=False):
+        '''
+        returns a queue with the current components of the view
 
         Parameters
         ----------
-        as_str: bool
-            if False (default), print the info
-            if True, return a string containing the info
+        name : str
+            name of the queue |n|
+            if omitted, the name of the view
 
-        file: file
-            if None(default), all output is directed to stdout |n|
-            otherwise, the output is directed to the file
+        monitor : bool
+            if True, monitor the queue |n|
+            if False (default), do not monitor the queue
 
         Returns
         -------
-        info (if as_str is True) : str
-        '''
-        result = []
-        result.append(objectclass_to_str(self) + ' ' + hex(id(self)))
-        result.append('  name=' + self.name())
-        result.append('  now=' + time_to_string(self._now - self._offset))
-        result.append('  current_component=' + self._current_component.name())
-        result.append('  trace=' + str(self._trace))
-        return return_or_print(result, as_str, file)
+        queue with all components of the view, in the order of the view : Queue
 
-    def step(self):
+        Note
+        ----
+        All components get priority 0.
         '''
-        executes the next step of the future event list
+        if name is None:
+            name = self.name()
+        save_trace = self.env._trace
+        self.env._trace = False
+        q = Queue(name=name, monitor=monitor, env=self.env)
+        q._enter_many(self.as_list(), check=False)
+        self.env._trace = save_trace
+        return q
 
-        for advanced use with animation / GUI loops
+
+class EventList(object):
+    '''
+    future event list, implemented as a binary heap
+
+    Note
+    ----
+    This is the default event list of an environment. |n|
+    The entries are tuples (scheduled time, sequence number, component).
+    The sequence number is unique and negative for urgent scheduling, so the
+    order of the entries is fully determined by (scheduled time, sequence number). |n|
+    An alternative event list can be specified with the event_list parameter of Environment. |n|
+    A user defined event list should implement push, pop, first, purge, __len__ and __iter__.
+    '''
+
+    def __init__(self):
+        self._heap = []
+
+    def push(self, t, seq, component):
         '''
-        if len(self.env._pendingstandbylist) > 0:
-            c = self.env._pendingstandbylist.pop(0)
-            if c._status == standby:  # skip cancelled components
-                c._status = current
-                c._scheduled_time = inf
-                self.env._current_component = c
-                if self._trace:
-                    self.print_trace('{:10.3f}'.format(self._now - self.env._offset), c.name(),
-                        'current (standby)', s0=c.lineno_txt(), _optional=self._suppress_trace_standby)
-                try:
-                    next(c._process)
-                    return
-                except StopIteration:
-                    if self._trace:
-                        gi_code = c._process.gi_code
-                        gs = inspect.getsourcelines(gi_code)
-                        s0 = self.filename_lineno_to_str(gi_code.co_filename, len(gs[0]) + gs[1] - 1) + '+'
-                    else:
-                        s0 = None
-                    for r in list(c._claims):
-                        c._release(r, s0=s0)
-                    if self._trace:
-                        self.print_trace('', '', c.name() + ' ended', s0=s0)
-                    c._status = data
-                    c._scheduled_time = inf
-                    c._process = None
-                    for ao in self.an_objects[:]:
-                        if ao.parent == c:
-                            self.an_objects.remove(ao)
-                    for so in self.sys_objects[:]:
-                        if so.parent == c:
-                            so.remove()
-                    return
+        adds an entry to the event list
 
-        if len(self.env._standbylist) > 0:
-            self._pendingstandbylist = list(self.env._standbylist)
-            self._standbylist = []
+        Parameters
+        ----------
+        t : float
+            scheduled time
 
-        if self._event_list:
-            (t, _, c) = heapq.heappop(self._event_list)
-        else:
-            t = self.env._now
-            c = self._main
-            self.print_trace('', '', 'run ended', 'no more events', s0=c.lineno_txt())
-        c._on_event_list = False
-        self.env._now = t
+        seq : int
+            sequence number (negative for urgent)
 
-        self._current_component = c
+        component : Component
+            component to be scheduled
+        '''
+        heapq.heappush(self._heap, (t, seq, component))
 
-        c._status = current
-        c._scheduled_time = inf
-        if self._trace:
-            self.print_trace('{:10.3f}'.format(self._now - self._offset), c.name(),
-              'current', s0=c.lineno_txt())
-        if c == self._main:
-            self.running = False
-            return
-        c._check_fail()
-        try:
-            next(c._process)
-            return
-        except StopIteration:
-            if self._trace:
-                gi_code = c._process.gi_code
-                gs = inspect.getsourcelines(gi_code)
-                s0 = self.filename_lineno_to_str(gi_code.co_filename, len(gs[0]) + gs[1] - 1) + '+'
-            else:
-                s0 = None
-            for r in list(c._claims):
-                c._release(r, s0=s0)
-            if self._trace:
-                self.print_trace('', '', c.name() + ' ended', s0=s0)
-            c._status = data
-            c._scheduled_time = inf
-            c._process = None
-            for ao in self.an_objects[:]:
-                if ao.parent == c:
-                    self.an_objects.remove(ao)
-            for so in self.sys_objects[:]:
-                if so.parent == c:
-                    so.remove()
-            return
+    def pop(self):
+        '''
+        removes and returns the first entry of the event list
 
-    def _print_event_list(self, s):
-        print('eventlist ', s)
-        for (t, seq, comp) in self._event_list:
-            print('{:10.3f} {}'.format(t, comp.name()))
+        Returns
+        -------
+        first entry, i.e. a tuple (t, seq, component) : tuple
+        '''
+        return heapq.heappop(self._heap)
 
-    def animation_parameters(self,
-      animate=True, synced=None, speed=None, width=None, height=None,
-      x0=None, y0=None, x1=None, background_color=None, foreground_color=None,
-      fps=None, modelname=None, use_toplevel=None,
-      show_fps=None, show_time=None,
-      video=None, video_repeat=None, video_pingpong=None):
+    def first(self):
         '''
-        set animation parameters
+        returns the first entry of the event list, without removing it
+
+        Returns
+        -------
+        first entry, i.e. a tuple (t, seq, component) : tuple
+        '''
+        return self._heap[0]
+
+    def purge(self, keep):
+        '''
+        removes all entries for which keep(entry) is False
 
         Parameters
         ----------
-        animate : bool
-            animate indicator |n|
-            if not specified, set animate on |n|
-
-        synced : bool
-            specifies whether animation is synced |n|
-            if omitted, no change. At init of the environment synced will be set to True
+        keep : function
+            called with an entry as the only argument
+        '''
+        self._heap[:] = [entry for entry in self._heap if keep(entry)]
+        heapq.heapify(self._heap)
 
-        speed : float
-            speed |n|
-            specifies how much faster or slower than real time the animation will run.
-            e.g. if 2, 2 simulation time units will be displayed per second.
+    def __len__(self):
+        return len(self._heap)
 
-        width : int
-            width of the animation in screen coordinates |n|
-            if omitted, no change. At init of the environment, the width will be
-            set to 1024 for CPython and the current screen width for Pythonista.
+    def __iter__(self):
+        return iter(self._heap)
 
-        height : int
-            height of the animation in screen coordinates |n|
-            if omitted, no change. At init of the environment, the height will be
-            set to 768 for CPython and the current screen height for Pythonista.
 
-        x0 : float
-            user x-coordinate of the lower left corner |n|
-            if omitted, no change. At init of the environment, x0 will be set to 0.
+class CalendarQueue(EventList):
+    '''
+    future event list, implemented as a calendar queue (R. Brown, 1988)
 
-        y0 : float
-            user y_coordinate of the lower left corner |n|
-            if omitted, no change. At init of the environment, y0 will be set to 0.
+    Parameters
+    ----------
+    number_of_buckets : int
+        initial number of buckets (default 2) |n|
+        the number of buckets will be adjusted automatically to the length of the event list
 
-        x1 : float
-            user x-coordinate of the lower right corner |n|
-            if omitted, no change. At init of the environment, x1 will be set to 1024
-            for CPython and the current screen width for Pythonista.
+    bucket_width : float
+        initial width of the buckets (default 1) |n|
+        the width will be adjusted automatically, based on the scheduled times
 
-        background_color : colorspec
-            color of the background |n|
-            if omitted, no change. At init of the environment, this will be set to white.
+    Note
+    ----
+    Push and pop are O(1) amortized, provided that the scheduled times are reasonably spread. |n|
+    However, the constant factor of this pure Python implementation is much larger than that of the
+    heap (EventList), which uses the C implementation of heapq. In a hold model, the calendar queue
+    is about 2 times slower than the heap with 1000 pending events and still about 20% slower with
+    200000 pending events. So, for ordinary models the heap is the better choice. |n|
+    Use as Environment(event_list='calendar') or Environment(event_list=sim.CalendarQueue())
+    '''
 
-        foreground_color : colorspec
-            color of foreground (texts) |n|
-            if omitted and background_color is specified, either white of black will be used,
-            in order to get a good contrast with the background color. |n|
-            if omitted and background_color is also omitted, no change. At init of the
-            environment, this will be set to black.
+    def __init__(self, number_of_buckets=2, bucket_width=1):
+        self._length = 0
+        self._last_t = 0
+        self._build(number_of_buckets, bucket_width, [])
+
+    def _build(self, number_of_buckets, bucket_width, entries):
+        # entries should be sorted
+        self._number_of_buckets = number_of_buckets
+        self._width = bucket_width
+        self._buckets = [[] for i in range(number_of_buckets)]  # each bucket is sorted
+        for entry in entries:
+            self._buckets[int(entry[0] // bucket_width) % number_of_buckets].append(entry)
+        t = entries[0][0] if entries else self._last_t
+        self._year_bucket = int(t // bucket_width)  # absolute bucket number of the current bucket
+        self._upper_threshold = 2 * number_of_buckets
+        self._lower_threshold = number_of_buckets // 2 - 2
+        self._pops_to_go = number_of_buckets  # the bucket width is reevaluated after this number of pops
+
+    def _estimated_width(self, sample):
+        # bucket width, based on the average separation of the (sorted) sample, ignoring large separations
+        width = self._width
+        if len(sample) >= 2:
+            separations = [entry1[0] - entry0[0] for entry0, entry1 in zip(sample, sample[1:])]
+            average = sum(separations) / len(separations)
+            separations = [separation for separation in separations if separation <= 2 * average]
+            if separations and sum(separations) > 0:
+                width = 3 * sum(separations) / len(separations)
+        return width
+
+    def _resize(self, number_of_buckets, width=None):
+        entries = sorted(self)
+        if width is None:
+            width = self._estimated_width(entries[:25])
+        self._build(number_of_buckets, width, entries)
+
+    def _reevaluate_width(self):
+        # the sample is taken in O(n), without sorting, so this is O(1) amortized per pop.
+        # The buckets are only rebuilt if the width has changed significantly.
+        width = self._estimated_width(heapq.nsmallest(25, self))
+        if width > 2 * self._width or width < self._width / 2:
+            self._resize(self._number_of_buckets, width)
+        else:
+            self._pops_to_go = self._number_of_buckets
+
+    def push(self, t, seq, component):
+        year_bucket = int(t // self._width)
+        bisect.insort(self._buckets[year_bucket % self._number_of_buckets], (t, seq, component))
+        if year_bucket < self._year_bucket:
+            self._year_bucket = year_bucket
+        self._length += 1
+        if self._length > self._upper_threshold:
+            self._resize(2 * self._number_of_buckets)
+
+    def _first_bucket(self):
+        # returns the bucket containing the first entry and makes that the current bucket
+        if not self._length:
+            raise IndexError('event list is empty')
+        buckets = self._buckets
+        number_of_buckets = self._number_of_buckets
+        width = self._width
+        year_bucket = self._year_bucket
+        for i in range(number_of_buckets):
+            bucket = buckets[year_bucket % number_of_buckets]
+            if bucket and bucket[0][0] // width <= year_bucket:
+                self._year_bucket = year_bucket
+                return bucket
+            year_bucket += 1
+        # no entry within a year, so search directly
+        t = min(bucket[0] for bucket in buckets if bucket)[0]
+        self._year_bucket = int(t // width)
+        return buckets[self._year_bucket % number_of_buckets]
+
+    def pop(self):
+        bucket = self._buckets[self._year_bucket % self._number_of_buckets]
+        if not (bucket and bucket[0][0] // self._width <= self._year_bucket):
+            bucket = self._first_bucket()
+        entry = bucket.pop(0)  # buckets are short, so this is cheap
+        self._last_t = entry[0]
+        self._length -= 1
+        if self._length < self._lower_threshold:
+            self._resize(self._number_of_buckets // 2)
+        else:
+            self._pops_to_go -= 1
+            if self._pops_to_go <= 0:
+                self._reevaluate_width()
+        return entry
 
-        fps : float
-            number of frames per second
+    def first(self):
+        return self._first_bucket()[0]
 
-        modelname : str
-            name of model to be shown in upper left corner,
-            along with text 'a salabim model' |n|
-            if omitted, no change. At init of the environment, this will be set
-            to the null string, which implies suppression of this feature.
+    def purge(self, keep):
+        entries = [entry for entry in sorted(self) if keep(entry)]
+        self._length = len(entries)
+        self._build(self._number_of_buckets, self._width, entries)
 
-        use_toplevel : bool
-            if salabim animation is used in parallel with
-            other modules using tkinter, it might be necessary to
-            initialize the root with tkinter.TopLevel().
-            In that case, set this parameter to True. |n|
-            if False (default), the root will be initialized with tkinter.Tk()
+    def __len__(self):
+        return self._length
 
-        show_fps : bool
-            if True, show the number of frames per second |n|
-            if False, do not show the number of frames per second (default)
+    def __iter__(self):
+        return itertools.chain(*self._buckets)
 
-        show_time: bool
-            if True, show the time (default)  |n|
-            if False, do not show the time
 
-        video : str
-            if video is not omitted, a video with the name video
-            will be created. |n|
-            If the video extension is not .gif, a codec may be added
-            by appending a plus sign and the four letter code name,
-            like 'myvideo.avi+DIVX'.
-            If no codec is given, MP4V will be used.
+class LadderQueue(EventList):
+    '''
+    future event list, implemented as a ladder queue (W.T. Tang, R.S.M. Goh and I.L.-J. Thng, 2005)
 
-        video_repeat : int
-            number of times gif should be repeated |n|
-            0 means inifinite |n|
-            at init of the environment video_repeat is 1 |n|
-            this only applies to gif files production.
+    Parameters
+    ----------
+    threshold : int
+        maximum number of entries in a bucket that are sorted directly (default 50) |n|
+        larger buckets are split into a new rung
 
-        video_pingpong : bool
-            if True, all frames will be added reversed at the end of the video (useful for smooth loops)
-            at init of the environment video_pingpong is False |n|
-            this only applies to gif files production.
+    max_rungs : int
+        maximum number of rungs (default 8)
 
-        Note
-        ----
-        The y-coordinate of the upper right corner is determined automatically
-        in such a way that the x and scaling are the same. |n|
-        '''
-        frame_changed = False
-        width_changed = False
-        height_changed = False
-        fps_changed = False
-        if speed is not None:
-            self._speed = speed
-            self.set_start_animation()
+    Note
+    ----
+    Entries are kept unsorted in the top, distributed over buckets in the rungs
+    and only sorted (in reverse order) when they arrive in the bottom. Push and pop are O(1) amortized,
+    even for strongly clustered scheduled times. |n|
+    Use as Environment(event_list='ladder') or Environment(event_list=sim.LadderQueue())
+    '''
 
-        if show_fps is not None:
-            if show_fps != show_fps:
-                self._show_fps = show_fps
+    def __init__(self, threshold=50, max_rungs=8):
+        self._threshold = threshold
+        self._max_rungs = max_rungs
+        self._length = 0
+        self._top = []
+        self._top_start = -inf  # entries with t > top_start go in the top
+        self._rungs = []  # each rung is a list [start, width, buckets, current bucket index], finest rung last
+        self._bottom = []
+
+    def _rung(self, entries, start, width):
+        number_of_buckets = len(entries) + 2
+        buckets = [[] for i in range(number_of_buckets)]
+        for entry in entries:
+            buckets[min(int((entry[0] - start) // width), number_of_buckets - 1)].append(entry)
+        self._rungs.append([start, width, buckets, 0])
+
+    def push(self, t, seq, component):
+        entry = (t, seq, component)
+        self._length += 1
+        if t > self._top_start:
+            self._top.append(entry)
+            return
+        for rung in self._rungs:
+            start, width, buckets, current = rung
+            i = min(int((t - start) // width), len(buckets) - 1)
+            if i >= current:
+                buckets[i].append(entry)
+                return
+        bottom = self._bottom
+        _insort_reversed(bottom, entry)
+        if len(bottom) > self._threshold and len(self._rungs) < self._max_rungs and bottom[-1][0] < bottom[0][0]:
+            self._bottom = []
+            self._rung(bottom, bottom[-1][0], (bottom[0][0] - bottom[-1][0]) / len(bottom))
+
+    def _fill_bottom(self):
+        while not self._bottom:
+            if self._rungs:
+                rung = self._rungs[-1]
+                start, width, buckets, current = rung
+                while current < len(buckets) and not buckets[current]:
+                    current += 1
+                if current == len(buckets):
+                    del self._rungs[-1]
+                    continue
+                bucket = buckets[current]
+                buckets[current] = []
+                rung[3] = current + 1
+                if len(bucket) > self._threshold and len(self._rungs) < self._max_rungs:
+                    t_min = min(entry[0] for entry in bucket)
+                    t_max = max(entry[0] for entry in bucket)
+                    if t_min < t_max:
+                        self._rung(bucket, t_min, (t_max - t_min) / len(bucket))
+                        continue
+                self._bottom = sorted(bucket, reverse=True)
+            else:
+                top = self._top
+                if not top:
+                    raise IndexError('event list is empty')
+                self._top = []
+                t_min = min(entry[0] for entry in top)
+                t_max = max(entry[0] for entry in top)
+                self._top_start = t_max
+                if len(top) > self._threshold and t_min < t_max:
+                    self._rung(top, t_min, (t_max - t_min) / len(top))
+                else:
+                    self._bottom = sorted(top, reverse=True)
 
-        if show_time is not None:
-            self._show_time = show_time
+    def pop(self):
+        self._fill_bottom()
+        self._length -= 1
+        return self._bottom.pop()
 
-        if synced is not None:
-            self._synced = synced
-            self.set_start_animation()
+    def first(self):
+        self._fill_bottom()
+        return self._bottom[-1]
 
-        if width is not None:
-            if self._width != width:
-                self._width = width
-                frame_changed = True
-                width_changed = True
+    def purge(self, keep):
+        self._top = [entry for entry in self if keep(entry)]
+        self._length = len(self._top)
+        self._top_start = -inf
+        self._rungs = []
+        self._bottom = []
 
-        if height is not None:
-            if self._height != height:
-                self._height = height
-                frame_changed = True
-                height_changed = True
+    def __len__(self):
+        return self._length
 
-        if fps is not None:
-            if self._fps != fps:
-                self._fps = fps
-                fps_changed = True
+    def __iter__(self):
+        return itertools.chain(
+            self._top, (entry for rung in self._rungs for bucket in rung[2] for entry in bucket), self._bottom)
 
-        if x0 is not None:
-            if self._x0 != x0:
-                self._x0 = x0
-                self.uninstall_uios()
 
-        if x1 is not None:
-            if self._x1 != x1:
-                self._x1 = x1
-                self.uninstall_uios()
+def _insort_reversed(l, entry):
+    # inserts entry in the reversely sorted list l, so the smallest entry can be popped from the end
+    if not l or entry < l[-1]:
+        l.append(entry)
+        return
+    lo = 0
+    hi = len(l)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if entry < l[mid]:
+            lo = mid + 1
+        else:
+            hi = mid
+    l.insert(lo, entry)
 
-        if y0 is not None:
-            if self._y0 != y0:
-                self._y0 = y0
-                self.uninstall_uios()
 
-        if background_color is not None:
-            if background_color in ('fg', 'bg'):
-                raise SalabimError(background_color + 'not allowed for background_color')
-            if self._background_color != background_color:
-                self._background_color = background_color
-                frame_changed = True
-            if foreground_color is None:
-                self._foreground_color = 'white' if self.is_dark('bg') else 'black'
+class EventLog(object):
+    '''
+    structured trace log
 
-        if foreground_color is not None:
-            if foreground_color in ('fg', 'bg'):
-                raise SalabimError(foreground_color + 'not allowed for foreground_color')
-            self._foreground_color = foreground_color
+    Parameters
+    ----------
+    size : int
+        if None (default), all records will be kept |n|
+        if specified, only the last size records will be kept in a preallocated circular buffer
+        (flight recorder)
 
-        if modelname is not None:
-            self._modelname = modelname
+    Note
+    ----
+    An event log can be used as the trace parameter of Environment or as the argument of
+    Environment.trace. From then on, all trace events will be recorded in the event log
+    as compact records, instead of being printed. |n|
+    Each record contains the time, the action, the component, the target (queue, resource, ...),
+    a value, an info item and the line number. All strings are stored only once. |n|
+    The recorded trace can be printed later with print_trace, optionally for one component and/or
+    queue only, or be saved to a file with save and read back with EventLog.load. |n|
+    If size is specified, the memory used remains constant. Such an event log will be
+    printed automatically when a SalabimError occurs during run.
+    '''
 
-        if use_toplevel is not None:
-            self.use_toplevel = use_toplevel
-            
-        if animate is None:
-            animate = self._animate  # no change
+    def __init__(self, size=None):
+        self._size = size
+        if size is None:
+            self._t = array.array('d')
+            self._action = array.array('B')
+            self._component = array.array('l')
+            self._target = array.array('l')
+            self._value = array.array('d')
+            self._info = array.array('l')
+            self._s0 = array.array('l')
+            self._items = []  # all strings and info items; the arrays contain indexes into this list
+            self._item_index = {}
         else:
-            if animate != self._animate:
-                frame_changed = True
-
-        self._scale = self._width / (self._x1 - self._x0)
-        self._y1 = self._y0 + self._height / self._scale
-
-        if g.animation_env is not self:
-            if g.animation_env is not None:
-                g.animation_env.video_close()
-            if animate:
-                frame_changed = True
-            else:
-                frame_changed = False  # no animation required, so leave running animation_env untouched
-
-        if video_repeat is not None:
-            self._video_repeat = video_repeat
-
-        if video_pingpong is not None:
-            self._video_pingpong = video_pingpong
-
-        video_opened = False
-        if video is not None:
-            if video != self._video:
-                if self._video:
-                    self.video_close()
-                self._video = video
-
-                if video:
-                    video_opened = True
-                    extension = os.path.splitext(video)[1].lower()
-                    if extension == '.gif':
-                        self._video_name = video
-                        can_animate(try_only=False)
-                        self._video_out = 'gif'
-                        self._images = []
-                    else:
-                        if len(video.split('+')) == 2:
-                            self._video_name, codec = video.split('+')
-                        else:
-                            self._video_name = video
-                            codec = 'MP4V'
-                        can_video(try_only=False)
-                        fourcc = cv2.VideoWriter_fourcc(*codec)
-                        self._video_out = cv2.VideoWriter(
-                            self._video_name, fourcc, self._fps, (self._width, self._height))
-
-        if self._video and (not video_opened):
-            if width_changed:
-                raise SalabimError('width changed while recording video.')
-            if height_changed:
-                raise SalabimError('height changed while recording video.')
-            if fps_changed and self._video_out != 'gif':
-                raise SalabimError('fps changed while recording video.')
-
-        if self._video:
-            self.video_t = self.t
-
-        if frame_changed:
-            if g.animation_env is not None:
-                g.animation_env._animate = animate
-                if not Pythonista:
-                    g.animation_env.root.destroy()
-                g.animation_env = None
-
-            if animate:
-                can_animate(try_only=False)  # install modules
-
-                g.animation_env = self
-                self.t = self._now  # for the call to set_start_animation
-                self.set_start_animation()
-
-                self.paused = False
-
-                if Pythonista:
-                    if g.animation_scene is None:
-                        g.animation_scene = AnimationScene(env=self)
-                        scene.run(g.animation_scene, frame_interval=1, show_fps=False)
-
-                else:
-                    if self.use_toplevel:
-                        self.root = tkinter.Toplevel()
-                    else:
-                        self.root = tkinter.Tk()
-                    g.canvas = tkinter.Canvas(
-                        self.root, width=self._width, height=self._height)
-                    g.canvas.configure(background=self.colorspec_to_hex('bg', False))
-                    g.canvas.pack()
-                    g.canvas_objects = []
+            if size <= 0:
+                raise SalabimError('size should be positive')
+            self._buffer = [None] * size
+            self._next = 0
+            self._length = 0
 
-                self.uninstall_uios()  # this causes all ui objects to be (re)installed
+    def _intern(self, item):
+        try:
+            return self._item_index[item]
+        except KeyError:
+            index = len(self._items)
+            self._items.append(item)
+            self._item_index[item] = index
+            return index
+        except TypeError:  # not hashable
+            self._items.append(item)
+            return len(self._items) - 1
 
-                self.an_menu_buttons()
+    def _record(self, t, action, component, target, value, info, s0):
+        if self._size is None:
+            intern = self._intern
+            self._t.append(t)
+            self._action.append(action)
+            self._component.append(intern(component))
+            self._target.append(intern(target))
+            self._value.append(value)
+            self._info.append(intern(info))
+            self._s0.append(intern(s0))
+        else:
+            self._buffer[self._next] = (t, action, component, target, value, info, s0)
+            self._next = (self._next + 1) % self._size
+            if self._length < self._size:
+                self._length += 1
+
+    def _drop_last(self):
+        if self._size is None:
+            for column in (self._t, self._action, self._component, self._target, self._value, self._info, self._s0):
+                column.pop()
+        else:
+            self._next = (self._next - 1) % self._size
+            self._buffer[self._next] = None
+            self._length -= 1
+
+    def _get(self, i):
+        # returns the i-th record (in chronological order) as a tuple
+        if self._size is None:
+            items = self._items
+            return (self._t[i], self._action[i], items[self._component[i]], items[self._target[i]],
+                self._value[i], items[self._info[i]], items[self._s0[i]])
+        return self._buffer[(self._next - self._length + i) % self._size]
 
-        self._animate = animate
+    def __len__(self):
+        if self._size is None:
+            return len(self._t)
+        return self._length
 
-    def video_close(self):
+    def clear(self):
         '''
-        closes the current animation video recording, if any.
+        removes all records from the event log
         '''
-        if self._video_out:
-            if self._video_out == 'gif':
-                if self._images:
-                    if self._video_pingpong:
-                        self._images.extend(self._images[::-1])
-                    if Pythonista:
-                        import images2gif
-                        images2gif.writeGif(self._video_name, self._images,
-                           duration=1 / self._fps, repeat=self._video_repeat)
-                    else:
-                        self._images[0].save(self._video_name, save_all=True,
-                            append_images=self._images[1:], loop=self._video_repeat, duration=1000 / self._fps)
-                    self._images = []  # release memory
-            else:
-                self._video_out.release()
-            self._video_out = None
-            self._video = ''
-            
-
-    def uninstall_uios(self):
-        for uio in self.ui_objects:
-            uio.installed = False
+        self.__init__(size=self._size)
 
-    def x0(self, value=None):
+    def records(self, component=None, queue=None):
         '''
-        x coordinate of lower left corner of animation
+        iterates over the records of the event log
 
         Parameters
         ----------
-        value : float
-            new x coordinate
-
-        Returns
-        -------
-        x coordinate of lower left corner of animation : float
-        '''
-        if value is not None:
-            self.animation_parameters(x0=value, animate=None)
-        return self._x0
-
-    def x1(self, value=None):
-        '''
-        x coordinate of upper right corner of animation : float
+        component : Component or str
+            if specified, only records of this component (or component with this name) will be returned
 
-        Parameters
-        ----------
-        value : float
-            new x coordinate |n|
-            if not specified, no change
+        queue : Queue, Resource, State or str
+            if specified, only records with this queue, resource or state (or object with this name)
+            as target will be returned
 
         Returns
         -------
-        x coordinate of upper right corner of animation : float
+        iterator of tuples (t, action, component, target, value, info, s0) : iterator |n|
+        action is a str, like 'current', 'enter' or 'text' |n|
+        component and target are names (str), which are '' if not applicable
         '''
-        if value is not None:
-            self.animation_parameters(x1=value, animate=None)
-        return self._x1
+        for record in self._selection(component, queue):
+            yield (record[0], _trace_actions[record[1]]) + record[2:6] + (_location_to_str(record[6]),)
 
-    def y0(self, value=None):
+    def _selection(self, component, queue, legend=False):
+        component_name = _name_of(component)
+        queue_name = _name_of(queue)
+        for i in range(len(self)):
+            record = self._get(i)
+            if ((component_name is None or record[2] == component_name) and
+                    (queue_name is None or record[3] == queue_name)) or (legend and record[1] == _tr_legend):
+                yield record
+
+    def print_trace(self, component=None, queue=None, as_str=False, file=None):
         '''
-        y coordinate of lower left corner of animation
+        prints the recorded trace, in the same format as a printed trace
 
         Parameters
         ----------
-        value : float
-            new y coordinate |n|
-            if not specified, no change
-
-        Returns
-        -------
-        y coordinate of lower left corner of animation : float
-        '''
-        if value is not None:
-            self.animation_parameters(y0=value, animate=None)
-        return self._y0
-
-    def y1(self):
-        '''
-        y coordinate of upper right corner of animation
+        component : Component or str
+            if specified, only trace lines of this component (or component with this name) will be printed
 
-        Returns
-        -------
-        y coordinate of upper right corner of animation : float
+        queue : Queue, Resource, State or str
+            if specified, only trace lines with this queue, resource or state (or object with this name)
+            as target will be printed
 
-        Note
-        ----
-        It is not possible to set this value explicitely.
-        '''
-        return self._y1
+        as_str: bool
+            if False (default), print the trace
+            if True, return a string containing the trace
 
-    def scale(self):
-        '''
-        scale of the animation, i.e. width / (x1 - x0)
+        file: file
+            if None(default), all output is directed to stdout |n|
+            otherwise, the output is directed to the file
 
         Returns
         -------
-        scale : float
+        trace (if as_str is True) : str
 
         Note
         ----
-        It is not possible to set this value explicitely.
+        The header and line number legend lines are always printed, if recorded. |n|
+        If the header is not recorded (anymore), a header will be added.
         '''
-        return self._scale
+        result = []
+        for t, action, component_name, target_name, value, info, s0 in self._selection(component, queue, legend=True):
+            if not result and action != _tr_legend:
+                result.append(_trace_line('line#', '      time', 'current component', 'action', 'information'))
+                result.append(_trace_line(6 * '-', 10 * '-', 20 * '-', 35 * '-', 48 * '-'))
+            result.append(_trace_line(
+                _location_to_str(s0), *_trace_columns(action, t, component_name, target_name, value, info)))
+        return return_or_print(result, as_str, file)
 
-    def width(self, value=None):
+    def save(self, filename):
         '''
-        width of the animation in screen coordinates
+        saves the event log to a file
 
         Parameters
         ----------
-        value : int
-            new width |n|
-            if not specified, no change
-
-
-        Returns
-        -------
-        width of animation : int
+        filename : str
+            name of the file to be written
         '''
-        if value is not None:
-            self.animation_parameters(width=value, animate=None)
-        return self._width
+        with open(filename, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
 
-    def height(self, value=None):
+    @staticmethod
+    def load(filename):
         '''
-        height of the animation in screen coordinates
+        reads an event log from a file, written by save
 
         Parameters
         ----------
-        value : int
-            new height |n|
-            if not specified, no change
+        filename : str
+            name of the file to be read
 
         Returns
         -------
-        height of animation : int
+        event log : EventLog
         '''
-        if value is not None:
-            self.animation_parameters(height=value, animate=None)
-        return self._height
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
 
-    def background_color(self, value=None):
-        '''
-        background_color of the animation
 
-        Parameters
-        ----------
-        value : colorspec
-            new background_color |n|
-            if not specified, no change
+def _name_of(obj):
+    if obj is None or isinstance(obj, str):
+        return obj
+    return obj.name()
 
-        Returns
-        -------
-        background_color of animation : colorspec
-        '''
-        if value is not None:
-            self.animation_parameters(background_color=value, animate=None)
-        return self._background_color
 
-    def foreground_color(self, value=None):
-        '''
-        foreground_color of the animation
+class Environment(object):
+    '''
+    environment object
 
-        Parameters
-        ----------
-        value : colorspec
-            new foreground_color |n|
-            if not specified, no change
+    Parameters
+    ----------
+    trace : bool, EventLog or 'ring'
+        defines whether to trace or not |n|
+        if an EventLog, the trace will be recorded in that event log, instead of being printed |n|
+        if 'ring', the trace will be recorded in an EventLog with size trace_size (flight recorder),
+        which will be printed if a SalabimError occurs during run |n|
+        if omitted, False
 
-        Returns
-        -------
-        foreground_color of animation : colorspec
-        '''
-        if value is not None:
-            self.animation_parameters(foreground_color=value, animate=None)
-        return self._foreground_color
+    trace_size : int
+        number of trace records that will be kept if trace is 'ring' |n|
+        if omitted, 1000
 
-    def animate(self, value=None):
-        '''
-        animate indicator
+    random_seed : hashable object, usually int
+        the seed for random, equivalent to random.seed() |n|
+        the environment gets its own random stream (see randomstream()), seeded with this value.
+        For compatibility, random is seeded with the same value. |n|
+        if '*', a purely random value (based on the current time) will be used
+        (not reproducable) |n|
+        if the null string (''), no action on random is taken and the environment will use random
+        as its random stream |n|
+        if None (the default), 1234567 will be used.
 
-        Parameters
-        ----------
-        value : bool
-            new animate indicator |n|
-            if not specified, no change
+    name : str
+        name of the environment |n|
+        if the name ends with a period (.),
+        auto serializing will be applied |n|
+        if the name end with a comma,
+        auto serializing starting at 1 will be applied |n|
+        if omitted, the name will be derived from the class (lowercased)
+        or 'default environment' if isdefault_env is True.
 
-        Returns
-        -------
-        animate status : bool
+    print_trace_header : bool
+        if True (default) print a (two line) header line as a legend |n|
+        if False, do not print a header |n|
+        note that the header is only printed if trace=True
 
-        Note
-        ----
-        When the run is not issued, no acction will be taken.
-        '''
-        if value is not None:
-            self.animation_parameters(animate=value)
-        return self._animate
+    isdefault_env : bool
+        if True (default), this environment becomes the default environment |n|
+        if False, this environment will not be the default environment |n|
+        if omitted, this environment becomes the default environment |n|
 
-    def modelname(self, value=None):
-        '''
-        modelname
+    event_list : str or EventList
+        future event list to be used |n|
+        if 'heap' or omitted, a binary heap (EventList) will be used |n|
+        if 'calendar', a calendar queue (CalendarQueue) will be used |n|
+        if 'ladder', a ladder queue (LadderQueue) will be used |n|
+        alternatively, an (empty) EventList, CalendarQueue, LadderQueue or
+        compatible object may be given
 
-        Parameters
-        ----------
-        value : str
-            new modelname |n|
-            if not specified, no change
+    Note
+    ----
+    The trace may be switched on/off later with trace |n|
+    The seed may be later set with random_seed() |n|
+    An environment can be used as a context manager (with env: ...), which makes it the default environment
+    in the current context (thread or asyncio task) for the duration of the with block. |n|
+    Initially, the random stream will be seeded with the value 1234567.
+    If required to be purely, not not reproducable, values, use
+    random_seed='*'.
+    '''
+    _nameserialize = {}
+    cached_modelname_width = [None, None]
 
-        Returns
-        -------
-        modelname : str
+    def __init__(self, trace=False, random_seed=None, name=None,
+      print_trace_header=True, isdefault_env=True, event_list=None, trace_size=1000, *args, **kwargs):
+        if isdefault_env:
+            _set_default_env(self)
+        self._context_envs = []
+        if name is None:
+            if isdefault_env:
+                name = 'default environment'
+        self._trace_size = trace_size
+        if trace == 'ring':
+            trace = EventLog(size=trace_size)
+        if isinstance(trace, EventLog):
+            self._event_log = trace
+            self._trace = True
+        else:
+            self._event_log = None
+            self._trace = trace
+        self._source_files = {_get_caller_frame().f_code.co_filename: 0}
+        self._now = 0
+        self._offset = 0
+        if random_seed == '':
+            self._randomstream = random
+        else:
+            if random_seed is None:
+                random_seed = 1234567
+            elif random_seed == '*':
+                random_seed = None
+            random.seed(random_seed)
+            self._randomstream = random.Random(random_seed)
+        _set_name(name, Environment._nameserialize, self)
+        self._buffered_trace = False
+        self._suppress_trace_standby = True
+        if self._trace:
+            if print_trace_header:
+                self.print_trace_header()
+            self.print_trace('', '', self.name() + ' initialize')
+        self.env = self
+        # just to allow main to be created; will be reset later
+        self._nameserializeComponent = {}
+        self._main = Component(name='main', env=self, process=None)
+        self._main._status = current
+        self._main.frame = _get_caller_frame()
+        self._current_component = self._main
+        if self._trace:
+            self.print_trace('{:10.3f}'.format(0), 'main', 'current')
+        self._nameserializeQueue = {}
+        self._nameserializeComponent = {}
+        self._nameserializeEntity = {}
+        self._nameserializeResource = {}
+        self._nameserializeState = {}
+        self._nameserializeMonitor = {}
+        self._nameserializeMonitorTimestamp = {}
+        self._seq = 0
+        if event_list is None or event_list == 'heap':
+            self._event_list = EventList()
+        elif event_list == 'calendar':
+            self._event_list = CalendarQueue()
+        elif event_list == 'ladder':
+            self._event_list = LadderQueue()
+        elif isinstance(event_list, str):
+            raise SalabimError('event_list ' + event_list + ' not recognized')
+        else:
+            self._event_list = event_list
+        self._event_list_tombstones = 0
+        self._standbylist = []
+        self._pendingstandbylist = []
 
-        Note
-        ----
-        If modelname is the null string, nothing will be displayed.
-        '''
-        if value is not None:
-            self.animation_parameters(modelname=value, animate=None)
-        return self._modelname
+        self.an_objects = []
+        self.ui_objects = []
+        self.sys_objects = []
+        self._animation_objects_with_parent = False
+        self.serial = 0
+        self._speed = 1
+        self._animate = False
+        self.running = False
+        self.t = 0
+        self._synced = True
+        self._step_pressed = False
+        self.stopped = False
+        self.last_s0 = ''
+        if Pythonista:
+            self._width, self._height = ui.get_screen_size()
+            self._width = int(self._width)
+            self._height = int(self._height)
+        else:
+            self._width = 1024
+            self._height = 768
+        self._x0 = 0
+        self._y0 = 0
+        self._x1 = self._width
+        self._scale = 1
+        self._y1 = self._y0 + self._height
+        self._background_color = 'white'
+        self._foreground_color = 'black'
+        self._fps = 30
+        self._modelname = ''
+        self.use_toplevel = False
+        self._show_fps = False
+        self._show_time = True
+        self._video = ''
+        self._video_out = None
+        self._video_repeat = 1
+        self._video_pingpong = False
+        self.an_modelname()
+        self.an_clocktext()
 
-    def video(self, value=None):
-        '''
-        video name
+        self.setup(*args, **kwargs)
 
-        Parameters
-        ----------
-        value : str, list or tuple
-            new video name |n|
-            if not specified, no change |n|
-            for explanation see animation_parameters()
+    def setup(self):
+        '''
+        called immediately after initialization of an environment.
 
-        Returns
-        -------
-        video : str, list or tuple
+        by default this is a dummy method, but it can be overridden.
 
-        Note
-        ----
-        If video is the null string, the video (if any) will be closed.
+        only keyword arguments are passed
         '''
-        if value is not None:
-            self.animation_parameters(video=value, animate=None)
-        return self._video
+        pass
 
-    def video_repeat(self, value=None):
-        '''
-        video repeat
+    def serialize(self):
+        self.serial += 1
+        return self.serial
 
-        Parameters
-        ----------
-        value : int
-            new video repeat |n|
-            if not specified, no change
+    def __repr__(self):
+        return objectclass_to_str(self) + ' (' + self.name() + ')'
 
-        Returns
-        -------
-        video repeat : int
+    def __enter__(self):
+        self._context_envs.append(_get_context_env())
+        _set_context_env(self)
+        return self
 
-        Note
-        ----
-        Applies only to gif animation.
-        '''
-        if value is not None:
-            self.animation_parameters(video_repeat=value, animate=None)
-        return self._video_repeat
+    def __exit__(self, exc_type, exc_value, traceback):
+        _set_context_env(self._context_envs.pop())
 
-    def video_pingpong(self, value=None):
+    def animation_pre_tick(self, t):
         '''
-        video pingponf
+        called just before the animation object loop. |n|
+        Default behaviour: just return
 
         Parameters
         ----------
-        value : bool
-            new video pingpong |n|
-            if not specified, no change
-
-        Returns
-        -------
-        video pingpong : bool
-
-        Note
-        ----
-        Applies only to gif animation.
+        t : float
+            Current (animation) time.
         '''
-        if value is not None:
-            self.animation_parameters(video_pingpong=value, animate=None)
-        return self._video_pingpong
+        return
 
-    def fps(self, value=None):
+    def animation_post_tick(self, t):
         '''
-        fps
+        called just after the animation object loop. |n|
+        Default behaviour: just return
 
         Parameters
         ----------
-        value : int
-            new fps |n|
-            if not specified, no change
-
-        Returns
-        -------
-        fps : bool
+        t : float
+            Current (animation) time.
         '''
-        if value is not None:
-            self.animation_parameters(fps=value, animate=None)
-        return self._fps
+        return
 
-    def show_time(self, value=None):
+    def animation_pre_tick_sys(self, t):
+        for ao in self.sys_objects:
+            ao.update(t)
+
+    def print_info(self, as_str=False, file=None):
         '''
-        show_time
+        prints information about the environment
 
         Parameters
         ----------
-        value : bool
-            new show_time |n|
-            if not specified, no change
+        as_str: bool
+            if False (default), print the info
+            if True, return a string containing the info
+
+        file: file
+            if None(default), all output is directed to stdout |n|
+            otherwise, the output is directed to the file
 
         Returns
         -------
-        show_time : bool
+        info (if as_str is True) : str
         '''
-        if value is not None:
-            self.animation_parameters(show_time=value, animate=None)
-        return self._show_time
+        result = []
+        result.append(objectclass_to_str(self) + ' ' + hex(id(self)))
+        result.append('  name=' + self.name())
+        result.append('  now=' + time_to_string(self._now - self._offset))
+        result.append('  current_component=' + self._current_component.name())
+        result.append('  trace=' + str(self._trace))
+        return return_or_print(result, as_str, file)
 
-    def show_fps(self, value=None):
+    def step(self):
         '''
-        show_fps
-
-        Parameters
-        ----------
-        value : bool
-            new show_fps |n|
-            if not specified, no change
-
-        Returns
-        -------
-        show_fps : bool
-        '''
-        if value is not None:
-            self.animation_parameters(show_fps=value, animate=None)
-        return self._show_fps
+        executes the next step of the future event list
 
-    def synced(self, value=None):
+        for advanced use with animation / GUI loops
         '''
-        synced
-
-        Parameters
-        ----------
-        value : bool
-            new synced |n|
-            if not specified, no change
+        if len(self.env._pendingstandbylist) > 0:
+            c = self.env._pendingstandbylist.pop(0)
+            if c._status == standby:  # skip cancelled components
+                c._status = current
+                c._scheduled_time = inf
+                self.env._current_component = c
+                if self._trace:
+                    self._trace_event(_tr_current_standby, c, s0=c._location(), _optional=self._suppress_trace_standby)
+                try:
+                    next(c._process)
+                    return
+                except StopIteration:
+                    if self._trace:
+                        gi_code = c._process.gi_code
+                        gs = inspect.getsourcelines(gi_code)
+                        s0 = (self._source_file_ref(gi_code.co_filename), len(gs[0]) + gs[1] - 1, '+')
+                    else:
+                        s0 = None
+                    for r in list(c._claims):
+                        c._release(r, s0=s0)
+                    if self._trace:
+                        self._trace_event(_tr_ended, c, s0=s0)
+                    c._status = data
+                    c._scheduled_time = inf
+                    c._process = None
+                    if self._animation_objects_with_parent:
+                        self._remove_animation_objects(c)
+                    return
 
-        Returns
-        -------
-        synced : bool
-        '''
-        if value is not None:
-            self.animation_parameters(synced=value, animate=None)
-        return self._synced
+        if len(self.env._standbylist) > 0:
+            self._pendingstandbylist = list(self.env._standbylist)
+            self._standbylist = []
 
-    def speed(self, value=None):
-        '''
-        speed
+        event_list = self._event_list
+        while event_list:
+            (t, seq, c) = event_list.pop()
+            if c._on_event_list and c._event_seq == seq:
+                break
+            self._event_list_tombstones -= 1  # skip cancelled entry
+        else:
+            t = self.env._now
+            c = self._main
+            if self._trace:
+                self.print_trace('', '', 'run ended', 'no more events', s0=c._location())
+        c._on_event_list = False
+        self.env._now = t
 
-        Parameters
-        ----------
-        value : float
-            new speed |n|
-            if not specified, no change
+        self._current_component = c
 
-        Returns
-        -------
-        speed : float
-        '''
-        if value is not None:
-            self.animation_parameters(speed=value, animate=None)
-        return self._speed
+        c._status = current
+        c._scheduled_time = inf
+        if self._trace:
+            self._trace_event(_tr_current, c, s0=c._location())
+        if c == self._main:
+            self.running = False
+            return
+        c._check_fail()
+        try:
+            next(c._process)
+            return
+        except StopIteration:
+            if self._trace:
+                gi_code = c._process.gi_code
+                gs = inspect.getsourcelines(gi_code)
+                s0 = (self._source_file_ref(gi_code.co_filename), len(gs[0]) + gs[1] - 1, '+')
+            else:
+                s0 = None
+            for r in list(c._claims):
+                c._release(r, s0=s0)
+            if self._trace:
+                self._trace_event(_tr_ended, c, s0=s0)
+            c._status = data
+            c._scheduled_time = inf
+            c._process = None
+            if self._animation_objects_with_parent:
+                self._remove_animation_objects(c)
+            return
 
-    def peek(self):
-        '''
-        returns the time of the next component to become current |n|
-        if there are no more events, peek will return inf |n|
-        Only for advance use with animation / GUI event loops
-        '''
-        if len(self.env._pendingstandbylist) > 0:
-            return self.env._now
-        else:
-            if self._event_list:
-                return self._event_list[0][0]
+    def _simulate_fast(self):
+        # specialized version of step, used by run when trace and animation are both off.
+        # returns when the run is finished, or when trace, animation or standby requires the general step.
+        event_list = self._event_list
+        pop = event_list.pop
+        main = self._main
+        while self.running and not (self._trace or self._animate or self._standbylist or self._pendingstandbylist):
+            while event_list:
+                (t, seq, c) = pop()
+                if c._on_event_list and c._event_seq == seq:
+                    break
+                self._event_list_tombstones -= 1  # skip cancelled entry
             else:
-                return self._now  # here the event list is empty, so return last event time
+                t = self._now
+                c = main
+            c._on_event_list = False
+            self._now = t
+            self._current_component = c
+            c._status = current
+            c._scheduled_time = inf
+            if c is main:
+                self.running = False
+                return
+            if c._requests or c._waits:
+                c._check_fail()
+            try:
+                next(c._process)
+            except StopIteration:
+                for r in list(c._claims):
+                    c._release(r)
+                c._status = data
+                c._scheduled_time = inf
+                c._process = None
+                if self._animation_objects_with_parent:
+                    self._remove_animation_objects(c)
 
-    def main(self):
-        '''
-        Returns
-        -------
-        the main component : Component
-        '''
-        return self._main
+    def _remove_animation_objects(self, c):
+        for ao in self.an_objects[:]:
+            if ao.parent == c:
+                self.an_objects.remove(ao)
+        for so in self.sys_objects[:]:
+            if so.parent == c:
+                so.remove()
 
-    def now(self):
-        '''
-        Returns
-        -------
-        the current simulation time : float
-        '''
-        return self._now - self.env._offset
+    def _print_event_list(self, s):
+        print('eventlist ', s)
+        for (t, seq, comp) in sorted(self._event_list, key=lambda entry: entry[:2]):
+            if comp._on_event_list and comp._event_seq == seq:
+                print('{:10.3f} {}'.format(t, comp.name()))
 
-    def reset_now(self, new_now=0):
+    def _purge_event_list(self):
+        # removes all tombstones (cancelled entries) from the event list
+        self._event_list.purge(lambda entry: entry[2]._on_event_list and entry[2]._event_seq == entry[1])
+        self._event_list_tombstones = 0
+
+    def animation_parameters(self,
+      animate=True, synced=None, speed=None, width=None, height=None,
+      x0=None, y0=None, x1=None, background_color=None, foreground_color=None,
+      fps=None, modelname=None, use_toplevel=None,
+      show_fps=None, show_time=None,
+      video=None, video_repeat=None, video_pingpong=None):
         '''
-        reset the current time
+        set animation parameters
 
         Parameters
         ----------
-        new_now : float
-            now will be set to new_now |n|
-            default: 0
+        animate : bool
+            animate indicator |n|
+            if not specified, set animate on |n|
 
-        Note
-        ----
-        Internally, salabim still works with the 'old' time. Only in the interface
-        from and to the user program, a correction will be applied.
+        synced : bool
+            specifies whether animation is synced |n|
+            if omitted, no change. At init of the environment synced will be set to True
 
-        The registered time in timestamped monitors will be always is the 'old' time.
-        This is only relevant when using the time value in MonitorTimestamp.xt() or
-        MonitorTimestamp.tx().
-        '''
-        offset_before = self._offset
-        self._offset = self._now - new_now
+        speed : float
+            speed |n|
+            specifies how much faster or slower than real time the animation will run.
+            e.g. if 2, 2 simulation time units will be displayed per second.
 
-        if self._trace:
-            self.print_trace(
-                '', '', 'now reset to {:0.3f}'.format(new_now),
-                '(all times are reduced by {:0.3f})'.format(self._offset - offset_before))
+        width : int
+            width of the animation in screen coordinates |n|
+            if omitted, no change. At init of the environment, the width will be
+            set to 1024 for CPython and the current screen width for Pythonista.
 
-    def trace(self, value=None):
-        '''
-        trace status
+        height : int
+            height of the animation in screen coordinates |n|
+            if omitted, no change. At init of the environment, the height will be
+            set to 768 for CPython and the current screen height for Pythonista.
 
-        Parameters
-        ----------
-        value : bool
-            new trace status |n|
-            if omitted, no change
+        x0 : float
+            user x-coordinate of the lower left corner |n|
+            if omitted, no change. At init of the environment, x0 will be set to 0.
 
-        Returns
-        -------
-        trace status : bool
+        y0 : float
+            user y_coordinate of the lower left corner |n|
+            if omitted, no change. At init of the environment, y0 will be set to 0.
 
-        Note
-        ----
-        If you want to test the status, always include
-        parentheses, like
+        x1 : float
+            user x-coordinate of the lower right corner |n|
+            if omitted, no change. At init of the environment, x1 will be set to 1024
+            for CPython and the current screen width for Pythonista.
 
-            ``if env.trace():``
-        '''
-        if value is not None:
-            self._trace = value
-            self._buffered_trace = False
-        return self._trace
+        background_color : colorspec
+            color of the background |n|
+            if omitted, no change. At init of the environment, this will be set to white.
 
-    def suppress_trace_standby(self, value=None):
-        '''
-        suppress_trace_standby status
+        foreground_color : colorspec
+            color of foreground (texts) |n|
+            if omitted and background_color is specified, either white of black will be used,
+            in order to get a good contrast with the background color. |n|
+            if omitted and background_color is also omitted, no change. At init of the
+            environment, this will be set to black.
 
-        Parameters
-        ----------
-        value : bool
-            new suppress_trace_standby status |n|
-            if omitted, no change
+        fps : float
+            number of frames per second
 
-        Returns
-        -------
-        suppress trace status : bool
+        modelname : str
+            name of model to be shown in upper left corner,
+            along with text 'a salabim model' |n|
+            if omitted, no change. At init of the environment, this will be set
+            to the null string, which implies suppression of this feature.
 
-        Note
-        ----
-        By default, suppress_trace_standby is True, meaning that standby components are
-        (apart from when they become non standby) suppressed from the trace. |n|
-        If you set suppress_trace_standby to False, standby components are fully traced.
-        '''
-        if value is not None:
-            self._suppress_trace_standby = value
-            self._buffered_trace = False
-        return self._suppress_trace_standby
+        use_toplevel : bool
+            if salabim animation is used in parallel with
+            other modules using tkinter, it might be necessary to
+            initialize the root with tkinter.TopLevel().
+            In that case, set this parameter to True. |n|
+            if False (default), the root will be initialized with tkinter.Tk()
 
-    def current_component(self):
-        '''
-        Returns
-        -------
-        the current_component : Component
-        '''
-        return self._current_component
+        show_fps : bool
+            if True, show the number of frames per second |n|
+            if False, do not show the number of frames per second (default)
 
-    def run(self, duration=None, till=None, urgent=False):
-        '''
-        start execution of the simulation
+        show_time: bool
+            if True, show the time (default)  |n|
+            if False, do not show the time
 
-        Parameters
-        ----------
-        duration : float
-            schedule with a delay of duration |n|
-            if 0, now is used
+        video : str
+            if video is not omitted, a video with the name video
+            will be created. |n|
+            If the video extension is not .gif, a codec may be added
+            by appending a plus sign and the four letter code name,
+            like 'myvideo.avi+DIVX'.
+            If no codec is given, MP4V will be used.
 
-        till : float
-            schedule time |n|
-            if omitted, inf is assumed
+        video_repeat : int
+            number of times gif should be repeated |n|
+            0 means inifinite |n|
+            at init of the environment video_repeat is 1 |n|
+            this only applies to gif files production.
 
-        urgent : bool
-            urgency indicator |n|
-            if False (default), main will be scheduled
-            behind all other components scheduled
-            for the same time |n|
-            if True, main will be scheduled
-            in front of all components scheduled
-            for the same time
+        video_pingpong : bool
+            if True, all frames will be added reversed at the end of the video (useful for smooth loops)
+            at init of the environment video_pingpong is False |n|
+            this only applies to gif files production.
 
         Note
         ----
-        only issue run() from the main level
+        The y-coordinate of the upper right corner is determined automatically
+        in such a way that the x and scaling are the same. |n|
         '''
-        if till is None:
-            if duration is None:
-                scheduled_time = inf
-            else:
-                if duration == inf:
-                    scheduled_time = inf
-                else:
-                    scheduled_time = self.env._now + duration
-        else:
-            if duration is None:
-                scheduled_time = till + self.env._offset
-            else:
-                raise SalabimError('both duration and till specified')
-
-        self._main.frame = _get_caller_frame()
-        self._main._reschedule(scheduled_time, urgent, 'run')
-
-        self.running = True
-        while self.running:
-            if self._animate:
-                self.do_simulate_and_animate()
-            else:
-                self.do_simulate()
-        if self.stopped:
-            self.quit()
+        frame_changed = False
+        width_changed = False
+        height_changed = False
+        fps_changed = False
+        if speed is not None:
+            self._speed = speed
+            self.set_start_animation()
 
-    def do_simulate(self):
-        while g.in_draw:
-            pass
-        while self.running and not self._animate:
-            self.step()
+        if show_fps is not None:
+            if show_fps != show_fps:
+                self._show_fps = show_fps
 
-    def do_simulate_and_animate(self):
-        if Pythonista:
-            while self.running and self._animate:
-                pass
-        else:
-            self.root.after(0, self.simulate_and_animate_loop)
-            self.root.mainloop()
+        if show_time is not None:
+            self._show_time = show_time
 
-    def simulate_and_animate_loop(self):
-     
-        while True:
-            tick_start = time.time()
+        if synced is not None:
+            self._synced = synced
+            self.set_start_animation()
 
-            if self._synced or self._video:  # video forces synced
-                if self._video:
-                    self.t = self.video_t
-                else:
-                    if self.paused:
-                        self.t = self.start_animation_time
-                    else:
-                        self.t = self.start_animation_time +\
-                            ((time.time() - self.start_animation_clocktime) *
-                            self._speed)
+        if width is not None:
+            if self._width != width:
+                self._width = width
+                frame_changed = True
+                width_changed = True
 
-                while self.peek() < self.t:
-                    self.step()
-                    if not (self.running and self._animate):
-                        self.root.quit()
-                        return
-            else:
-                if self._step_pressed or (not self.paused):
-                    self.step()
+        if height is not None:
+            if self._height != height:
+                self._height = height
+                frame_changed = True
+                height_changed = True
 
-                    if not self._current_component._suppress_pause_at_step:
-                        self._step_pressed = False
-                    self.t = self._now
+        if fps is not None:
+            if self._fps != fps:
+                self._fps = fps
+                fps_changed = True
 
-            if not (self.running and self._animate):
-                self.root.quit()
-                return
+        if x0 is not None:
+            if self._x0 != x0:
+                self._x0 = x0
+                self.uninstall_uios()
 
-            if self._video:
-                capture_image = Image.new(
-                    'RGB', (self._width, self._height), self.colorspec_to_tuple('bg'))
-            if not self.paused:
-                self.frametimes.append(time.time())
+        if x1 is not None:
+            if self._x1 != x1:
+                self._x1 = x1
+                self.uninstall_uios()
 
-            self.an_objects.sort(
-                key=lambda obj: (-obj.layer(self.t), obj.sequence))
+        if y0 is not None:
+            if self._y0 != y0:
+                self._y0 = y0
+                self.uninstall_uios()
 
-            canvas_objects_iter = iter(g.canvas_objects[:])
-            co = next(canvas_objects_iter, None)
-            self.animation_pre_tick(self.t)
-            self.animation_pre_tick_sys(self.t)
-            for ao in self.an_objects:
-                ao.make_pil_image(self.t)
+        if background_color is not None:
+            if background_color in ('fg', 'bg'):
+                raise SalabimError(background_color + 'not allowed for background_color')
+            if self._background_color != background_color:
+                self._background_color = background_color
+                frame_changed = True
+            if foreground_color is None:
+                self._foreground_color = 'white' if self.is_dark('bg') else 'black'
 
-                if ao._image_visible:
-                    if co is None:
-                        ao.im = ImageTk.PhotoImage(ao._image)
-                        co1 = g.canvas.create_image(
-                            ao._image_x, self._height - ao._image_y, image=ao.im, anchor=tkinter.SW)
-                        g.canvas_objects.append(co1)
-                        ao.canvas_object = co1
+        if foreground_color is not None:
+            if foreground_color in ('fg', 'bg'):
+                raise SalabimError(foreground_color + 'not allowed for foreground_color')
+            self._foreground_color = foreground_color
 
-                    else:
-                        if ao.canvas_object == co:
-                            if ao._image_ident != ao._image_ident_prev:
-                                ao.im = ImageTk.PhotoImage(ao._image)
-                                g.canvas.itemconfig(
-                                    ao.canvas_object, image=ao.im)
+        if modelname is not None:
+            self._modelname = modelname
 
-                            if (ao._image_x != ao._image_x_prev) or (ao._image_y != ao._image_y_prev):
-                                g.canvas.coords(
-                                    ao.canvas_object, (ao._image_x, self._height - ao._image_y))
+        if use_toplevel is not None:
+            self.use_toplevel = use_toplevel
+            
+        if animate is None:
+            animate = self._animate  # no change
+        else:
+            if animate != self._animate:
+                frame_changed = True
 
-                        else:
-                            ao.im = ImageTk.PhotoImage(ao._image)
-                            ao.canvas_object = co
-                            g.canvas.itemconfig(
-                                ao.canvas_object, image=ao.im)
-                            g.canvas.coords(
-                                ao.canvas_object, (ao._image_x, self._height - ao._image_y))
-                    co = next(canvas_objects_iter, None)
+        self._scale = self._width / (self._x1 - self._x0)
+        self._y1 = self._y0 + self._height / self._scale
 
-                    if self._video:
-                        capture_image.paste(ao._image,
-                            (int(ao._image_x), int(self._height - ao._image_y - ao._image.size[1])),
-                            ao._image)
-                else:
-                    ao.canvas_object = None
+        if g.animation_env is not self:
+            if g.animation_env is not None:
+                g.animation_env.video_close()
+            if animate:
+                frame_changed = True
+            else:
+                frame_changed = False  # no animation required, so leave running animation_env untouched
 
-            self.animation_post_tick(self.t)
+        if video_repeat is not None:
+            self._video_repeat = video_repeat
 
-            while co is not None:
-                g.canvas.delete(co)
-                g.canvas_objects.remove(co)
-                co = next(canvas_objects_iter, None)
-                
-            for uio in self.ui_objects:
-                if not uio.installed:
-                    uio.install()
+        if video_pingpong is not None:
+            self._video_pingpong = video_pingpong
 
-            for uio in self.ui_objects:
-                if uio.type == 'button':
-                    thistext = uio.text()
-                    if thistext != uio.lasttext:
-                        uio.lasttext = thistext
-                        uio.button.config(text=thistext)
+        video_opened = False
+        if video is not None:
+            if video != self._video:
+                if self._video:
+                    self.video_close()
+                self._video = video
 
-            if self._video and (not self.paused):
-                if self._video_out == 'gif':
-                    self._images.append(capture_image)
-                else:
-                    open_cv_image = cv2.cvtColor(
-                        np.array(capture_image), cv2.COLOR_RGB2BGR)
-                    self._video_out.write(open_cv_image)
+                if video:
+                    video_opened = True
+                    extension = os.path.splitext(video)[1].lower()
+                    if extension == '.gif':
+                        self._video_name = video
+                        can_animate(try_only=False)
+                        self._video_out = 'gif'
+                        self._images = []
+                    else:
+                        if len(video.split('+')) == 2:
+                            self._video_name, codec = video.split('+')
+                        else:
+                            self._video_name = video
+                            codec = 'MP4V'
+                        can_video(try_only=False)
+                        fourcc = cv2.VideoWriter_fourcc(*codec)
+                        self._video_out = cv2.VideoWriter(
+                            self._video_name, fourcc, self._fps, (self._width, self._height))
+
+        if self._video and (not video_opened):
+            if width_changed:
+                raise SalabimError('width changed while recording video.')
+            if height_changed:
+                raise SalabimError('height changed while recording video.')
+            if fps_changed and self._video_out != 'gif':
+                raise SalabimError('fps changed while recording video.')
+
+        if self._video:
+            self.video_t = self.t
+
+        if frame_changed:
+            if g.animation_env is not None:
+                g.animation_env._animate = animate
+                if not Pythonista:
+                    g.animation_env.root.destroy()
+                g.animation_env = None
+
+            if animate:
+                can_animate(try_only=False)  # install modules
+
+                g.animation_env = self
+                self.t = self._now  # for the call to set_start_animation
+                self.set_start_animation()
+
+                self.paused = False
+
+                if Pythonista:
+                    if g.animation_scene is None:
+                        g.animation_scene = AnimationScene(env=self)
+                        scene.run(g.animation_scene, frame_interval=1, show_fps=False)
+
+                else:
+                    if self.use_toplevel:
+                        self.root = tkinter.Toplevel()
+                    else:
+                        self.root = tkinter.Tk()
+                    g.canvas = tkinter.Canvas(
+                        self.root, width=self._width, height=self._height)
+                    g.canvas.configure(background=self.colorspec_to_hex('bg', False))
+                    g.canvas.pack()
+                    g.canvas_objects = []
+
+                self.uninstall_uios()  # this causes all ui objects to be (re)installed
+
+                self.an_menu_buttons()
+
+        self._animate = animate
+
+    def video_close(self):
+        '''
+        closes the current animation video recording, if any.
+        '''
+        if self._video_out:
+            if self._video_out == 'gif':
+                if self._images:
+                    if self._video_pingpong:
+                        self._images.extend(self._images[::-1])
+                    if Pythonista:
+                        import images2gif
+                        images2gif.writeGif(self._video_name, self._images,
+                           duration=1 / self._fps, repeat=self._video_repeat)
+                    else:
+                        self._images[0].save(self._video_name, save_all=True,
+                            append_images=self._images[1:], loop=self._video_repeat, duration=1000 / self._fps)
+                    self._images = []  # release memory
+            else:
+                self._video_out.release()
+            self._video_out = None
+            self._video = ''
+            
+
+    def uninstall_uios(self):
+        for uio in self.ui_objects:
+            uio.installed = False
+
+    def x0(self, value=None):
+        '''
+        x coordinate of lower left corner of animation
+
+        Parameters
+        ----------
+        value : float
+            new x coordinate
+
+        Returns
+        -------
+        x coordinate of lower left corner of animation : float
+        '''
+        if value is not None:
+            self.animation_parameters(x0=value, animate=None)
+        return self._x0
+
+    def x1(self, value=None):
+        '''
+        x coordinate of upper right corner of animation : float
+
+        Parameters
+        ----------
+        value : float
+            new x coordinate |n|
+            if not specified, no change
+
+        Returns
+        -------
+        x coordinate of upper right corner of animation : float
+        '''
+        if value is not None:
+            self.animation_parameters(x1=value, animate=None)
+        return self._x1
+
+    def y0(self, value=None):
+        '''
+        y coordinate of lower left corner of animation
+
+        Parameters
+        ----------
+        value : float
+            new y coordinate |n|
+            if not specified, no change
+
+        Returns
+        -------
+        y coordinate of lower left corner of animation : float
+        '''
+        if value is not None:
+            self.animation_parameters(y0=value, animate=None)
+        return self._y0
+
+    def y1(self):
+        '''
+        y coordinate of upper right corner of animation
+
+        Returns
+        -------
+        y coordinate of upper right corner of animation : float
+
+        Note
+        ----
+        It is not possible to set this value explicitely.
+        '''
+        return self._y1
+
+    def scale(self):
+        '''
+        scale of the animation, i.e. width / (x1 - x0)
+
+        Returns
+        -------
+        scale : float
+
+        Note
+        ----
+        It is not possible to set this value explicitely.
+        '''
+        return self._scale
+
+    def width(self, value=None):
+        '''
+        width of the animation in screen coordinates
+
+        Parameters
+        ----------
+        value : int
+            new width |n|
+            if not specified, no change
+
+
+        Returns
+        -------
+        width of animation : int
+        '''
+        if value is not None:
+            self.animation_parameters(width=value, animate=None)
+        return self._width
+
+    def height(self, value=None):
+        '''
+        height of the animation in screen coordinates
+
+        Parameters
+        ----------
+        value : int
+            new height |n|
+            if not specified, no change
+
+        Returns
+        -------
+        height of animation : int
+        '''
+        if value is not None:
+            self.animation_parameters(height=value, animate=None)
+        return self._height
+
+    def background_color(self, value=None):
+        '''
+        background_color of the animation
+
+        Parameters
+        ----------
+        value : colorspec
+            new background_color |n|
+            if not specified, no change
+
+        Returns
+        -------
+        background_color of animation : colorspec
+        '''
+        if value is not None:
+            self.animation_parameters(background_color=value, animate=None)
+        return self._background_color
+
+    def foreground_color(self, value=None):
+        '''
+        foreground_color of the animation
+
+        Parameters
+        ----------
+        value : colorspec
+            new foreground_color |n|
+            if not specified, no change
+
+        Returns
+        -------
+        foreground_color of animation : colorspec
+        '''
+        if value is not None:
+            self.animation_parameters(foreground_color=value, animate=None)
+        return self._foreground_color
+
+    def animate(self, value=None):
+        '''
+        animate indicator
+
+        Parameters
+        ----------
+        value : bool
+            new animate indicator |n|
+            if not specified, no change
+
+        Returns
+        -------
+        animate status : bool
+
+        Note
+        ----
+        When the run is not issued, no acction will be taken.
+        '''
+        if value is not None:
+            self.animation_parameters(animate=value)
+        return self._animate
+
+    def modelname(self, value=None):
+        '''
+        modelname
+
+        Parameters
+        ----------
+        value : str
+            new modelname |n|
+            if not specified, no change
+
+        Returns
+        -------
+        modelname : str
+
+        Note
+        ----
+        If modelname is the null string, nothing will be displayed.
+        '''
+        if value is not None:
+            self.animation_parameters(modelname=value, animate=None)
+        return self._modelname
+
+    def video(self, value=None):
+        '''
+        video name
+
+        Parameters
+        ----------
+        value : str, list or tuple
+            new video name |n|
+            if not specified, no change |n|
+            for explanation see animation_parameters()
+
+        Returns
+        -------
+        video : str, list or tuple
+
+        Note
+        ----
+        If video is the null string, the video (if any) will be closed.
+        '''
+        if value is not None:
+            self.animation_parameters(video=value, animate=None)
+        return self._video
+
+    def video_repeat(self, value=None):
+        '''
+        video repeat
+
+        Parameters
+        ----------
+        value : int
+            new video repeat |n|
+            if not specified, no change
+
+        Returns
+        -------
+        video repeat : int
+
+        Note
+        ----
+        Applies only to gif animation.
+        '''
+        if value is not None:
+            self.animation_parameters(video_repeat=value, animate=None)
+        return self._video_repeat
+
+    def video_pingpong(self, value=None):
+        '''
+        video pingponf
+
+        Parameters
+        ----------
+        value : bool
+            new video pingpong |n|
+            if not specified, no change
+
+        Returns
+        -------
+        video pingpong : bool
+
+        Note
+        ----
+        Applies only to gif animation.
+        '''
+        if value is not None:
+            self.animation_parameters(video_pingpong=value, animate=None)
+        return self._video_pingpong
+
+    def fps(self, value=None):
+        '''
+        fps
+
+        Parameters
+        ----------
+        value : int
+            new fps |n|
+            if not specified, no change
+
+        Returns
+        -------
+        fps : bool
+        '''
+        if value is not None:
+            self.animation_parameters(fps=value, animate=None)
+        return self._fps
+
+    def show_time(self, value=None):
+        '''
+        show_time
+
+        Parameters
+        ----------
+        value : bool
+            new show_time |n|
+            if not specified, no change
+
+        Returns
+        -------
+        show_time : bool
+        '''
+        if value is not None:
+            self.animation_parameters(show_time=value, animate=None)
+        return self._show_time
+
+    def show_fps(self, value=None):
+        '''
+        show_fps
+
+        Parameters
+        ----------
+        value : bool
+            new show_fps |n|
+            if not specified, no change
+
+        Returns
+        -------
+        show_fps : bool
+        '''
+        if value is not None:
+            self.animation_parameters(show_fps=value, animate=None)
+        return self._show_fps
+
+    def synced(self, value=None):
+        '''
+        synced
+
+        Parameters
+        ----------
+        value : bool
+            new synced |n|
+            if not specified, no change
+
+        Returns
+        -------
+        synced : bool
+        '''
+        if value is not None:
+            self.animation_parameters(synced=value, animate=None)
+        return self._synced
+
+    def speed(self, value=None):
+        '''
+        speed
+
+        Parameters
+        ----------
+        value : float
+            new speed |n|
+            if not specified, no change
+
+        Returns
+        -------
+        speed : float
+        '''
+        if value is not None:
+            self.animation_parameters(speed=value, animate=None)
+        return self._speed
+
+    def peek(self):
+        '''
+        returns the time of the next component to become current |n|
+        if there are no more events, peek will return inf |n|
+        Only for advance use with animation / GUI event loops
+        '''
+        if len(self.env._pendingstandbylist) > 0:
+            return self.env._now
+        else:
+            event_list = self._event_list
+            while event_list:
+                (t, seq, c) = event_list.first()
+                if c._on_event_list and c._event_seq == seq:
+                    return t
+                event_list.pop()  # skip cancelled entry
+                self._event_list_tombstones -= 1
+            return self._now  # here the event list is empty, so return last event time
+
+    def main(self):
+        '''
+        Returns
+        -------
+        the main component : Component
+        '''
+        return self._main
+
+    def randomstream(self):
+        '''
+        Returns
+        -------
+        the random stream of this environment : random.Random
+
+        Note
+        ----
+        Distributions that are created without a randomstream will sample from the
+        random stream of the (context local) default environment. |n|
+        If the environment was created with random_seed='', the global random module is returned.
+        '''
+        return self._randomstream
+
+    def now(self):
+        '''
+        Returns
+        -------
+        the current simulation time : float
+        '''
+        return self._now - self.env._offset
+
+    def reset_now(self, new_now=0):
+        '''
+        reset the current time
+
+        Parameters
+        ----------
+        new_now : float
+            now will be set to new_now |n|
+            default: 0
+
+        Note
+        ----
+        Internally, salabim still works with the 'old' time. Only in the interface
+        from and to the user program, a correction will be applied.
+
+        The registered time in timestamped monitors will be always is the 'old' time.
+        This is only relevant when using the time value in MonitorTimestamp.xt() or
+        MonitorTimestamp.tx().
+        '''
+        offset_before = self._offset
+        self._offset = self._now - new_now
+
+        if self._trace:
+            self.print_trace(
+                '', '', 'now reset to {:0.3f}'.format(new_now),
+                '(all times are reduced by {:0.3f})'.format(self._offset - offset_before))
+
+    def trace(self, value=None):
+        '''
+        trace status
+
+        Parameters
+        ----------
+        value : bool, EventLog or 'ring'
+            new trace status |n|
+            if an EventLog, the trace will be recorded in that event log, instead of being printed |n|
+            if 'ring', the trace will be recorded in a new EventLog with size trace_size, as
+            specified at initialization of the environment |n|
+            if omitted, no change
+
+        Returns
+        -------
+        trace status : bool
+
+        Note
+        ----
+        If you want to test the status, always include
+        parentheses, like
+
+            ``if env.trace():``
+        '''
+        if value is not None:
+            if value == 'ring':
+                value = EventLog(size=self._trace_size)
+            if isinstance(value, EventLog):
+                self._event_log = value
+                self._trace = True
+            else:
+                self._event_log = None
+                self._trace = value
+            self._buffered_trace = False
+        return self._trace
+
+    def event_log(self):
+        '''
+        Returns
+        -------
+        event log that is used for tracing : EventLog |n|
+        None if trace is printed or off
+        '''
+        return self._event_log
+
+    def suppress_trace_standby(self, value=None):
+        '''
+        suppress_trace_standby status
+
+        Parameters
+        ----------
+        value : bool
+            new suppress_trace_standby status |n|
+            if omitted, no change
+
+        Returns
+        -------
+        suppress trace status : bool
+
+        Note
+        ----
+        By default, suppress_trace_standby is True, meaning that standby components are
+        (apart from when they become non standby) suppressed from the trace. |n|
+        If you set suppress_trace_standby to False, standby components are fully traced.
+        '''
+        if value is not None:
+            self._suppress_trace_standby = value
+            self._buffered_trace = False
+        return self._suppress_trace_standby
+
+    def current_component(self):
+        '''
+        Returns
+        -------
+        the current_component : Component
+        '''
+        return self._current_component
+
+    def run(self, duration=None, till=None, urgent=False):
+        '''
+        start execution of the simulation
+
+        Parameters
+        ----------
+        duration : float
+            schedule with a delay of duration |n|
+            if 0, now is used
+
+        till : float
+            schedule time |n|
+            if omitted, inf is assumed
+
+        urgent : bool
+            urgency indicator |n|
+            if False (default), main will be scheduled
+            behind all other components scheduled
+            for the same time |n|
+            if True, main will be scheduled
+            in front of all components scheduled
+            for the same time
+
+        Note
+        ----
+        only issue run() from the main level
+        '''
+        if till is None:
+            if duration is None:
+                scheduled_time = inf
+            else:
+                if duration == inf:
+                    scheduled_time = inf
+                else:
+                    scheduled_time = self.env._now + duration
+        else:
+            if duration is None:
+                scheduled_time = till + self.env._offset
+            else:
+                raise SalabimError('both duration and till specified')
+
+        self._main.frame = _get_caller_frame()
+        self._main._reschedule(scheduled_time, urgent, 'run')
+
+        self.running = True
+        try:
+            while self.running:
+                if self._animate:
+                    self.do_simulate_and_animate()
+                else:
+                    self.do_simulate()
+        except SalabimError:
+            if self._event_log is not None and self._event_log._size is not None:
+                print('trace (last {} records) before error'.format(len(self._event_log)))
+                self._event_log.print_trace()
+            raise
+        if self.stopped:
+            self.quit()
+
+    def fork(self, n, fn, duration=None, till=None, processes=None):
+        '''
+        runs n what-if scenarios, each in a copy of the environment in its current state
+
+        Parameters
+        ----------
+        n : int
+            number of scenarios
+
+        fn : function
+            function that applies the scenario change. It will be called as fn(env, i) in the copy of
+            the environment for scenario i (starting at 0). |n|
+            The function should return a dict with the key performance indicators (KPIs) to be collected.
+            The values of that dict may be a Monitor, a MonitorTimestamp, a function without arguments
+            (which will be called at the end of the run) or any other (picklable) value.
+
+        duration : float
+            duration of each scenario run |n|
+            if duration and till are both omitted, fn should run the simulation itself
+
+        till : float
+            end time of each scenario run
+
+        processes : int
+            maximum number of scenarios that run simultaneously |n|
+            if omitted, all scenarios run simultaneously
+
+        Returns
+        -------
+        the KPIs of each scenario : list of dicts |n|
+        for a Monitor or MonitorTimestamp, a summary (a dict with mean, std, minimum, maximum, median,
+        number_of_entries and weight or duration) is returned
+
+        Note
+        ----
+        The environment is copied with os.fork (copy-on-write), so this is only available on POSIX
+        systems (not on Windows). The state of the environment itself is not changed. |n|
+        Thus, a (long) warmup has to be simulated only once for all scenarios. |n|
+        All scenarios start with the same state of the random streams (common random numbers),
+        unless fn reseeds. |n|
+        Only issue fork() from the main level, not from a process, and with animation off.
+        '''
+        if not hasattr(os, 'fork'):
+            raise SalabimError('fork requires os.fork (not available on ' + sys.platform + ')')
+        if self._current_component is not self._main:
+            raise SalabimError('fork only allowed from the main level')
+        if self._animate:
+            raise SalabimError('fork not allowed when animating')
+        if processes is None:
+            processes = n
+        results = [None] * n
+        pending = collections.deque(range(n))
+        running = collections.deque()
+        while pending or running:
+            while pending and len(running) < processes:
+                i = pending.popleft()
+                running.append((i,) + self._fork_scenario(i, fn, duration, till))
+            i, pid, fd = running.popleft()
+            with os.fdopen(fd, 'rb') as f:
+                data = f.read()
+            os.waitpid(pid, 0)
+            try:
+                status, value = pickle.loads(data)
+            except Exception:
+                status, value = 'error', 'no result returned'
+            if status == 'error':
+                for _, pid, fd in running:
+                    os.close(fd)
+                    os.waitpid(pid, 0)
+                raise SalabimError('fork scenario {}: {}'.format(i, value))
+            results[i] = value
+        return results
+
+    def _fork_scenario(self, i, fn, duration, till):
+        r, w = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid:
+            os.close(w)
+            return pid, r
+        os.close(r)
+        try:
+            try:
+                kpis = fn(self, i)
+                if duration is not None or till is not None:
+                    self.run(duration=duration, till=till)
+                if isinstance(kpis, dict):
+                    kpis = dict((kpi, _kpi_value(value)) for kpi, value in kpis.items())
+                else:
+                    kpis = _kpi_value(kpis)
+                data = pickle.dumps(('ok', kpis), protocol=pickle.HIGHEST_PROTOCOL)
+            except BaseException as e:
+                data = pickle.dumps(('error', '{}: {}'.format(type(e).__name__, e)), protocol=pickle.HIGHEST_PROTOCOL)
+            with os.fdopen(w, 'wb') as f:
+                f.write(data)
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(0)
+
+    def do_simulate(self):
+        while g.in_draw:
+            pass
+        while self.running and not self._animate:
+            if self._trace or self._standbylist or self._pendingstandbylist:
+                self.step()
+            else:
+                self._simulate_fast()
+
+    def do_simulate_and_animate(self):
+        if Pythonista:
+            while self.running and self._animate:
+                pass
+        else:
+            self.root.after(0, self.simulate_and_animate_loop)
+            self.root.mainloop()
+
+    def simulate_and_animate_loop(self):
+     
+        while True:
+            tick_start = time.time()
+
+            if self._synced or self._video:  # video forces synced
+                if self._video:
+                    self.t = self.video_t
+                else:
+                    if self.paused:
+                        self.t = self.start_animation_time
+                    else:
+                        self.t = self.start_animation_time +\
+                            ((time.time() - self.start_animation_clocktime) *
+                            self._speed)
+
+                while self.peek() < self.t:
+                    self.step()
+                    if not (self.running and self._animate):
+                        self.root.quit()
+                        return
+            else:
+                if self._step_pressed or (not self.paused):
+                    self.step()
+
+                    if not self._current_component._suppress_pause_at_step:
+                        self._step_pressed = False
+                    self.t = self._now
+
+            if not (self.running and self._animate):
+                self.root.quit()
+                return
+
+            if self._video:
+                capture_image = Image.new(
+                    'RGB', (self._width, self._height), self.colorspec_to_tuple('bg'))
+            if not self.paused:
+                self.frametimes.append(time.time())
+
+            self.an_objects.sort(
+                key=lambda obj: (-obj.layer(self.t), obj.sequence))
+
+            canvas_objects_iter = iter(g.canvas_objects[:])
+            co = next(canvas_objects_iter, None)
+            self.animation_pre_tick(self.t)
+            self.animation_pre_tick_sys(self.t)
+            for ao in self.an_objects:
+                ao.make_pil_image(self.t)
+
+                if ao._image_visible:
+                    if co is None:
+                        ao.im = ImageTk.PhotoImage(ao._image)
+                        co1 = g.canvas.create_image(
+                            ao._image_x, self._height - ao._image_y, image=ao.im, anchor=tkinter.SW)
+                        g.canvas_objects.append(co1)
+                        ao.canvas_object = co1
+
+                    else:
+                        if ao.canvas_object == co:
+                            if ao._image_ident != ao._image_ident_prev:
+                                ao.im = ImageTk.PhotoImage(ao._image)
+                                g.canvas.itemconfig(
+                                    ao.canvas_object, image=ao.im)
+
+                            if (ao._image_x != ao._image_x_prev) or (ao._image_y != ao._image_y_prev):
+                                g.canvas.coords(
+                                    ao.canvas_object, (ao._image_x, self._height - ao._image_y))
+
+                        else:
+                            ao.im = ImageTk.PhotoImage(ao._image)
+                            ao.canvas_object = co
+                            g.canvas.itemconfig(
+                                ao.canvas_object, image=ao.im)
+                            g.canvas.coords(
+                                ao.canvas_object, (ao._image_x, self._height - ao._image_y))
+                    co = next(canvas_objects_iter, None)
+
+                    if self._video:
+                        capture_image.paste(ao._image,
+                            (int(ao._image_x), int(self._height - ao._image_y - ao._image.size[1])),
+                            ao._image)
+                else:
+                    ao.canvas_object = None
+
+            self.animation_post_tick(self.t)
+
+            while co is not None:
+                g.canvas.delete(co)
+                g.canvas_objects.remove(co)
+                co = next(canvas_objects_iter, None)
+                
+            for uio in self.ui_objects:
+                if not uio.installed:
+                    uio.install()
+
+            for uio in self.ui_objects:
+                if uio.type == 'button':
+                    thistext = uio.text()
+                    if thistext != uio.lasttext:
+                        uio.lasttext = thistext
+                        uio.button.config(text=thistext)
+
+            if self._video and (not self.paused):
+                if self._video_out == 'gif':
+                    self._images.append(capture_image)
+                else:
+                    open_cv_image = cv2.cvtColor(
+                        np.array(capture_image), cv2.COLOR_RGB2BGR)
+                    self._video_out.write(open_cv_image)
 
             g.canvas.update()
             if self._video:
@@ -5427,8 +7757,8 @@ class Environment(object):
         also the legend for line numbers will be printed |n|
         not that the header is only printed if trace=True
         '''
-        self.print_trace('      time', 'current component', 'action', 'information', 'line#')
-        self.print_trace(10 * '-', 20 * '-', 35 * '-', 48 * '-', 6 * '-')
+        self._trace_event(_tr_legend, info=('      time', 'current component', 'action', 'information'), s0='line#')
+        self._trace_event(_tr_legend, info=(10 * '-', 20 * '-', 35 * '-', 48 * '-'), s0=6 * '-')
         for ref in range(len(self._source_files)):
             for fullfilename, iref in self._source_files.items():
                 if ref == iref:
@@ -5441,28 +7771,26 @@ class Environment(object):
             s = 'line numbers refers to'
         for fullfilename, iref in self._source_files.items():
             if ref == iref:
-                self.print_trace('', '', s, (os.path.basename(fullfilename)), '')
+                self._trace_event(_tr_legend, info=('', '', s, os.path.basename(fullfilename)), s0='')
                 break
 
-    def _frame_to_lineno(self, frame):
-        frameinfo = inspect.getframeinfo(frame)
-        return self.filename_lineno_to_str(frameinfo.filename, frameinfo.lineno)
+    def _frame_to_location(self, frame, plus=''):
+        # the unformatted line number, to be formatted only when printed (see _location_to_str)
+        ref = self._source_files.get(frame.f_code.co_filename)
+        if ref is None:
+            ref = self._source_file_ref(frame.f_code.co_filename)
+        return (ref, frame.f_lineno, plus)
 
-    def filename_lineno_to_str(self, filename, lineno):
+    def _source_file_ref(self, filename):
         ref = self._source_files.get(filename)
-        new_entry = False
         if ref is None:
-            if self._source_files:
-                ref = len(self._source_files)
+            ref = len(self._source_files)
             self._source_files[filename] = ref
-            new_entry = True
-        if ref == 0:
-            pre = ''
-        else:
-            pre = chr(ref + ord('A') - 1)
-        if new_entry:
             self._print_legend(ref)
-        return rpad(pre + str(lineno), 5)
+        return ref
+
+    def filename_lineno_to_str(self, filename, lineno):
+        return _location_to_str((self._source_file_ref(filename), lineno, ''))
 
     def print_trace(self, s1='', s2='', s3='', s4='', s0=None, _optional=False):
         '''
@@ -5497,28 +7825,35 @@ class Environment(object):
 
         '''
         if self._trace:
-            if not (hasattr(self, '_current_component') and self._current_component._suppress_trace):
-                if s0 is None:
-                    stack = inspect.stack()
-                    filename0 = inspect.getframeinfo(stack[0][0]).filename
-                    for i in range(len(inspect.stack())):
-                        frame = stack[i][0]
-                        if filename0 != inspect.getframeinfo(frame).filename:
-                            break
+            self._trace_event(_tr_text, info=(s1, s2, s3, s4), s0=s0, _optional=_optional)
 
-                    s0 = self._frame_to_lineno(_get_caller_frame())
-                self.last_s0 = s0
-                line = pad(s0, 7) + pad(s1, 10) + ' ' + pad(s2, 20) + ' ' + \
-                    pad(s3, max(len(s3), 36)) + ' ' + s4.strip()
-                if _optional:
-                    self._buffered_trace = line
-                else:
-                    if self._buffered_trace:
-                        print(self._buffered_trace)
-                        logging.debug(self._buffered_trace)
-                        self._buffered_trace = False
-                    print(line)
-                    logging.debug(line)
+    def _trace_event(self, action, component=None, target=None, value=nan, info='', s0=None, _optional=False):
+        # prints a trace event or records it in the event log. Should only be called if trace is on.
+        if hasattr(self, '_current_component') and self._current_component._suppress_trace:
+            return
+        if s0 is None:
+            s0 = self._frame_to_location(_get_caller_frame())
+        self.last_s0 = s0
+        component_name = '' if component is None else component.name()
+        target_name = '' if target is None else target.name()
+        if self._event_log is None:
+            line = _trace_line(_location_to_str(s0), *_trace_columns(
+                action, self._now - self._offset, component_name, target_name, value, info))
+            if _optional:
+                self._buffered_trace = line
+            else:
+                if self._buffered_trace:
+                    print(self._buffered_trace)
+                    logging.debug(self._buffered_trace)
+                    self._buffered_trace = False
+                print(line)
+                logging.debug(line)
+        else:
+            if _optional and self._buffered_trace:
+                self._event_log._drop_last()
+            self._event_log._record(
+                self._now - self._offset, action, component_name, target_name, value, info, s0)
+            self._buffered_trace = _optional
 
     def beep(self):
         '''
@@ -5797,7 +8132,7 @@ class Animate(object):
                  linewidth1=None, fillcolor1=None, linecolor1=None, textcolor1=None,
                  angle1=None, fontsize1=None, width1=None, xy_anchor='', env=None):
 
-        self.env = g.default_env if env is None else env
+        self.env = default_env() if env is None else env
         self._image_ident = None  # denotes no image yet
         self._image = None
         self._image_x = 0
@@ -5815,6 +8150,8 @@ class Animate(object):
 
         self.layer0 = layer
         self.parent = parent
+        if parent is not None:
+            self.env._animation_objects_with_parent = True
         self.keep = keep
         self.visible0 = visible
         self.screen_coordinates = screen_coordinates
@@ -7121,7 +9458,7 @@ class AnimateEntry(object):
         fillcolor='fg', color='bg', text='', action=None, env=None, xy_anchor='sw'):
         if Pythonista:
             raise SalabimError('AnimateEntry not supported under Pythonista')
-        self.env = g.default_env if env is None else env
+        self.env = default_env() if env is None else env
         self.env.ui_objects.append(self)
         self.type = 'entry'
         self.value = value
@@ -7249,7 +9586,7 @@ class AnimateButton(object):
                  linecolor='fg', color='bg', text='', font='',
                  fontsize=15, action=None, env=None, xy_anchor='sw'):
 
-        self.env = g.default_env if env is None else env
+        self.env = default_env() if env is None else env
         self.type = 'button'
         self.t0 = -inf
         self.t1 = inf
@@ -7389,7 +9726,7 @@ class AnimateSlider(object):
                  linecolor='fg', labelcolor='fg', label='',
                  font='', fontsize=12, action=None, xy_anchor='sw', env=None):
 
-        self.env = g.default_env if env is None else env
+        self.env = default_env() if env is None else env
         n = round((vmax - vmin) / resolution) + 1
         self.vmin = vmin
         self.vmax = vmin + (n - 1) * resolution
@@ -7592,6 +9929,8 @@ class AnimateQueue(object):
         self.current_aos = {}
         self.parent = parent
         self.env = queue.env
+        if parent is not None:
+            self.env._animation_objects_with_parent = True
         self.vx = 0
         self.vy = 0
         self.vangle = 0
@@ -7690,20 +10029,311 @@ class AnimateQueue(object):
         self.env.sys_objects.remove(self)
 
 
-class _Vis(object):
-    pass
+class _Vis(object):
+    pass
+
+
+class AnimateText(_Vis):
+    '''
+    Displays a text
+
+    Parameters
+    ----------
+    text : str, tuple or list
+        the text to be displayed |n|
+        if text is str, the text may contain linefeeds, which are shown as individual lines
+        if text is tple or list, each item is displayed on a separate line
+
+    x : float
+        position of anchor point (default 0)
+
+    y : float
+        position of anchor point (default 0)
+
+    xy_anchor : str
+        specifies where x and y are relative to |n|
+        possible values are (default: sw) : |n|
+        ``nw    n    ne`` |n|
+        ``w     c     e`` |n|
+        ``sw    s    se`` |n|
+        If '', the given coordimates are used untranslated
+
+    offsetx : float
+        offsets the x-coordinate of the rectangle (default 0)
+
+    offsety : float
+        offsets the y-coordinate of the rectangle (default 0)
+
+    angle : float
+        angle of the text (in degrees) |n|
+        default: 0
+
+    max_lines : int
+        the maximum of lines of text to be displayed |n|
+        if positive, it refers to the first max_lines lines |n|
+        if negative, it refers to the last -max_lines lines |n|
+        if zero (default), all lines will be displayed
+
+    font : str or list/tuple
+        font to be used for texts |n|
+        Either a string or a list/tuple of fontnames.
+        If not found, uses calibri or arial
+
+    text_anchor : str
+        anchor position of text|n|
+        specifies where to texts relative to the rectangle
+        point |n|
+        possible values are (default: c): |n|
+        ``nw    n    ne`` |n|
+        ``w     c     e`` |n|
+        ``sw    s    se``
+
+    textcolor : colorspec
+        color of the text (default foreground_color)
+
+    fontsize : float
+        fontsize of text (default 15)
+
+    arg : any
+        this is used when a parameter is a function with two parameters, as the first argument or
+        if a parameter is a method as the instance |n|
+        default: self (instance itself)
+
+    parent : Component
+        component where this animation object belongs to (default None) |n|
+        if given, the animation object will be removed
+        automatically upon termination of the parent
+
+    Note
+    ----
+    All measures are in screen coordinates |n|
+
+    All parameters, apart from queue and arg can be specified as: |n|
+    - a scalar, like 10 |n|
+    - a function with zero arguments, like lambda: title |n|
+    - a function with one argument, being the time t, like lambda t: t + 10 |n|
+    - a function with two parameters, being arg (as given) and the time, like lambda comp, t: comp.state |n|
+    - a method instance arg for time t, like self.state, actually leading to arg.state(t) to be called
+
+    '''
+    def __init__(self, text='', x=0, y=0, fontsize=15, textcolor='fg', font='', text_anchor='sw', angle=0,
+        visible=True, xy_anchor='', layer=0, env=None, screen_coordinates=False, arg=None, parent=None,
+        offsetx=0, offsety=0, max_lines=0):
+        self.env = default_env() if env is None else env
+
+        # the checks hasattr are req'd to not override methods of inherited classes
+        if not hasattr(self, 'x'):
+            self.x = x
+        if not hasattr(self, 'y'):
+            self.y = y
+        if not hasattr(self, 'offsetx'):
+            self.offsetx = offsetx
+        if not hasattr(self, 'offsety'):
+            self.offsety = offsety
+        if not hasattr(self, 'text'):
+            self.text = text
+        if not hasattr(self, 'max_lines'):
+            self.max_lines = max_lines
+        if not hasattr(self, 'textcolor'):
+            self.textcolor = textcolor
+        if not hasattr(self, 'angle'):
+            self.angle = angle
+        if not hasattr(self, 'text_anchor'):
+            self.text_anchor = text_anchor
+        if not hasattr(self, 'font'):
+            self.font = font
+        if not hasattr(self, 'fontsize'):
+            self.fontsize = fontsize
+        if not hasattr(self, 'visible'):
+            self.visible = visible
+        if not hasattr(self, 'xy_anchor'):
+            self.xy_anchor = xy_anchor
+        if not hasattr(self, 'layer'):
+            self.layer = layer
+        self.arg = self if arg is None else arg
+        ao0 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
+        self.aos = (ao0,)
+
+    def remove(self):
+        for ao in self.aos:
+            ao.remove()
+
+
+class AnimateRectangle(_Vis):
+    '''
+    Displays a rectangle, optionally with a text
+
+    Parameters
+    ----------
+    spec : four item tuple or list
+        should specify xlowerleft, ylowerleft, xupperright, yupperright
+
+    x : float
+        position of anchor point (default 0)
+
+    y : float
+        position of anchor point (default 0)
+
+    xy_anchor : str
+        specifies where x and y are relative to |n|
+        possible values are (default: sw) : |n|
+        ``nw    n    ne`` |n|
+        ``w     c     e`` |n|
+        ``sw    s    se`` |n|
+        If '', the given coordimates are used untranslated
+
+    offsetx : float
+        offsets the x-coordinate of the rectangle (default 0)
+
+    offsety : float
+        offsets the y-coordinate of the rectangle (default 0)
+
+    linewidth : float
+        linewidth of the contour |n|
+        default 1
+
+    fillcolor : colorspec
+        color of interior (default foreground_color) |n|
+        default transparent
+
+    linecolor : colorspec
+        color of the contour (default transparent)
+
+    angle : float
+        angle of the rectangle (in degrees) |n|
+        default: 0
+
+    as_points : bool
+         if False (default), the contour lines are drawn |n|
+         if True, only the corner points are shown
+
+    text : str, tuple or list
+        the text to be displayed |n|
+        if text is str, the text may contain linefeeds, which are shown as individual lines
+
+    max_lines : int
+        the maximum of lines of text to be displayed |n|
+        if positive, it refers to the first max_lines lines |n|
+        if negative, it refers to the last -max_lines lines |n|
+        if zero (default), all lines will be displayed
+
+    font : str or list/tuple
+        font to be used for texts |n|
+        Either a string or a list/tuple of fontnames.
+        If not found, uses calibri or arial
+
+    text_anchor : str
+        anchor position of text|n|
+        specifies where to texts relative to the rectangle
+        point |n|
+        possible values are (default: c): |n|
+        ``nw    n    ne`` |n|
+        ``w     c     e`` |n|
+        ``sw    s    se``
+
+    textcolor : colorspec
+        color of the text (default foreground_color)
+
+    textoffsetx : float
+        extra x offset to the text_anchor point
+
+    textoffsety : float
+        extra y offset to the text_anchor point
+
+    fontsize : float
+        fontsize of text (default 15)
+
+    arg : any
+        this is used when a parameter is a function with two parameters, as the first argument or
+        if a parameter is a method as the instance |n|
+        default: self (instance itself)
+
+    parent : Component
+        component where this animation object belongs to (default None) |n|
+        if given, the animation object will be removed
+        automatically upon termination of the parent
+
+    Note
+    ----
+    All measures are in screen coordinates |n|
+
+    All parameters, apart from queue and arg can be specified as: |n|
+    - a scalar, like 10 |n|
+    - a function with zero arguments, like lambda: title |n|
+    - a function with one argument, being the time t, like lambda t: t + 10 |n|
+    - a function with two parameters, being arg (as given) and the time, like lambda comp, t: comp.state |n|
+    - a method instance arg for time t, like self.state, actually leading to arg.state(t) to be called
+    '''
+    def __init__(self, spec=(), x=0, y=0, fillcolor='fg', linecolor='', linewidth=1,
+        text='', fontsize=15, textcolor='bg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
+        offsetx=0, offsety=0, as_points=False, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None,
+        parent=None,
+        visible=True, env=None, screen_coordinates=False):
+
+        self.env = default_env() if env is None else env
+
+        # the checks hasattr are req'd to not override methods of inherited classes
+        if not hasattr(self, 'spec'):
+            self.spec = spec
+        if not hasattr(self, 'fillcolor'):
+            self.fillcolor = fillcolor
+        if not hasattr(self, 'linecolor'):
+            self.linecolor = linecolor
+        if not hasattr(self, 'linewidth'):
+            self.linewidth = linewidth
+        if not hasattr(self, 'as_points'):
+            self.aspoint = as_points
+        if not hasattr(self, 'x'):
+            self.x = x
+        if not hasattr(self, 'y'):
+            self.y = y
+        if not hasattr(self, 'offsetx'):
+            self.offsetx = offsetx
+        if not hasattr(self, 'offsety'):
+            self.offsety = offsety
+        if not hasattr(self, 'text_offsetx'):
+            self.text_offsetx = text_offsetx
+        if not hasattr(self, 'text_offsety'):
+            self.text_offsety = text_offsety
+        if not hasattr(self, 'text'):
+            self.text = text
+        if not hasattr(self, 'max_lines'):
+            self.max_lines = max_lines
+        if not hasattr(self, 'textcolor'):
+            self.textcolor = textcolor
+        if not hasattr(self, 'text_anchor'):
+            self.text_anchor = text_anchor
+        if not hasattr(self, 'angle'):
+            self.angle = angle
+        if not hasattr(self, 'font'):
+            self.font = font
+        if not hasattr(self, 'fontsize'):
+            self.fontsize = fontsize
+        if not hasattr(self, 'visible'):
+            self.visible = visible
+        if not hasattr(self, 'xy_anchor'):
+            self.xy_anchor = xy_anchor
+        if not hasattr(self, 'layer'):
+            self.layer = layer
+        self.arg = self if arg is None else arg
+        ao0 = _AnimateVis(rectangle0=(), vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
+        ao1 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
+        ao1.dependent = True
+        self.aos = (ao0, ao1)
+
+    def remove(self):
+        for ao in self.aos:
+            ao.remove()
 
 
-class AnimateText(_Vis):
+class AnimatePolygon(_Vis):
     '''
-    Displays a text
+    Displays a polygon, optionally with a text
 
     Parameters
     ----------
-    text : str, tuple or list
-        the text to be displayed |n|
-        if text is str, the text may contain linefeeds, which are shown as individual lines
-        if text is tple or list, each item is displayed on a separate line
+    spec : tuple or list
+        should specify x0, y0, x1, y1, ...
 
     x : float
         position of anchor point (default 0)
@@ -7720,15 +10350,34 @@ class AnimateText(_Vis):
         If '', the given coordimates are used untranslated
 
     offsetx : float
-        offsets the x-coordinate of the rectangle (default 0)
+        offsets the x-coordinate of the polygon (default 0)
 
     offsety : float
-        offsets the y-coordinate of the rectangle (default 0)
+        offsets the y-coordinate of the polygon (default 0)
+
+    linewidth : float
+        linewidth of the contour |n|
+        default 1
+
+    fillcolor : colorspec
+        color of interior (default foreground_color) |n|
+        default transparent
+
+    linecolor : colorspec
+        color of the contour (default transparent)
 
     angle : float
-        angle of the text (in degrees) |n|
+        angle of the polygon (in degrees) |n|
         default: 0
 
+    as_points : bool
+         if False (default), the contour lines are drawn |n|
+         if True, only the corner points are shown
+
+    text : str, tuple or list
+        the text to be displayed |n|
+        if text is str, the text may contain linefeeds, which are shown as individual lines
+
     max_lines : int
         the maximum of lines of text to be displayed |n|
         if positive, it refers to the first max_lines lines |n|
@@ -7742,7 +10391,7 @@ class AnimateText(_Vis):
 
     text_anchor : str
         anchor position of text|n|
-        specifies where to texts relative to the rectangle
+        specifies where to texts relative to the polygon
         point |n|
         possible values are (default: c): |n|
         ``nw    n    ne`` |n|
@@ -7752,6 +10401,12 @@ class AnimateText(_Vis):
     textcolor : colorspec
         color of the text (default foreground_color)
 
+    textoffsetx : float
+        extra x offset to the text_anchor point
+
+    textoffsety : float
+        extra y offset to the text_anchor point
+
     fontsize : float
         fontsize of text (default 15)
 
@@ -7775,14 +10430,24 @@ class AnimateText(_Vis):
     - a function with one argument, being the time t, like lambda t: t + 10 |n|
     - a function with two parameters, being arg (as given) and the time, like lambda comp, t: comp.state |n|
     - a method instance arg for time t, like self.state, actually leading to arg.state(t) to be called
-
     '''
-    def __init__(self, text='', x=0, y=0, fontsize=15, textcolor='fg', font='', text_anchor='sw', angle=0,
-        visible=True, xy_anchor='', layer=0, env=None, screen_coordinates=False, arg=None, parent=None,
-        offsetx=0, offsety=0, max_lines=0):
-        self.env = g.default_env if env is None else env
+    def __init__(self, spec=(), x=0, y=0, fillcolor='fg', linecolor='', linewidth=1,
+        text='', fontsize=15, textcolor='bg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
+        offsetx=0, offsety=0, as_points=False, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None, parent=None,
+        visible=True, env=None, screen_coordinates=False):
+        self.env = default_env() if env is None else env
 
         # the checks hasattr are req'd to not override methods of inherited classes
+        if not hasattr(self, 'spec'):
+            self.spec = spec
+        if not hasattr(self, 'fillcolor'):
+            self.fillcolor = fillcolor
+        if not hasattr(self, 'linecolor'):
+            self.linecolor = linecolor
+        if not hasattr(self, 'linewidth'):
+            self.linewidth = linewidth
+        if not hasattr(self, 'as_points'):
+            self.aspoint = as_points
         if not hasattr(self, 'x'):
             self.x = x
         if not hasattr(self, 'y'):
@@ -7791,16 +10456,20 @@ class AnimateText(_Vis):
             self.offsetx = offsetx
         if not hasattr(self, 'offsety'):
             self.offsety = offsety
+        if not hasattr(self, 'text_offsetx'):
+            self.text_offsetx = text_offsetx
+        if not hasattr(self, 'text_offsety'):
+            self.text_offsety = text_offsety
         if not hasattr(self, 'text'):
             self.text = text
         if not hasattr(self, 'max_lines'):
             self.max_lines = max_lines
         if not hasattr(self, 'textcolor'):
             self.textcolor = textcolor
-        if not hasattr(self, 'angle'):
-            self.angle = angle
         if not hasattr(self, 'text_anchor'):
             self.text_anchor = text_anchor
+        if not hasattr(self, 'angle'):
+            self.angle = angle
         if not hasattr(self, 'font'):
             self.font = font
         if not hasattr(self, 'fontsize'):
@@ -7812,22 +10481,24 @@ class AnimateText(_Vis):
         if not hasattr(self, 'layer'):
             self.layer = layer
         self.arg = self if arg is None else arg
-        ao0 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
-        self.aos = (ao0,)
+        ao0 = _AnimateVis(polygon0=(), vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
+        ao1 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
+        ao1.dependent = True
+        self.aos = (ao0, ao1)
 
     def remove(self):
         for ao in self.aos:
             ao.remove()
 
 
-class AnimateRectangle(_Vis):
+class AnimateLine(_Vis):
     '''
-    Displays a rectangle, optionally with a text
+    Displays a line, optionally with a text
 
     Parameters
     ----------
-    spec : four item tuple or list
-        should specify xlowerleft, ylowerleft, xupperright, yupperright
+    spec : tuple or list
+        should specify x0, y0, x1, y1, ...
 
     x : float
         position of anchor point (default 0)
@@ -7844,24 +10515,20 @@ class AnimateRectangle(_Vis):
         If '', the given coordimates are used untranslated
 
     offsetx : float
-        offsets the x-coordinate of the rectangle (default 0)
+        offsets the x-coordinate of the line (default 0)
 
     offsety : float
-        offsets the y-coordinate of the rectangle (default 0)
+        offsets the y-coordinate of the line (default 0)
 
     linewidth : float
         linewidth of the contour |n|
         default 1
 
-    fillcolor : colorspec
-        color of interior (default foreground_color) |n|
-        default transparent
-
     linecolor : colorspec
-        color of the contour (default transparent)
+        color of the contour (default foreground_color)
 
     angle : float
-        angle of the rectangle (in degrees) |n|
+        angle of the line (in degrees) |n|
         default: 0
 
     as_points : bool
@@ -7885,7 +10552,7 @@ class AnimateRectangle(_Vis):
 
     text_anchor : str
         anchor position of text|n|
-        specifies where to texts relative to the rectangle
+        specifies where to texts relative to the polygon
         point |n|
         possible values are (default: c): |n|
         ``nw    n    ne`` |n|
@@ -7925,19 +10592,16 @@ class AnimateRectangle(_Vis):
     - a function with two parameters, being arg (as given) and the time, like lambda comp, t: comp.state |n|
     - a method instance arg for time t, like self.state, actually leading to arg.state(t) to be called
     '''
-    def __init__(self, spec=(), x=0, y=0, fillcolor='fg', linecolor='', linewidth=1,
-        text='', fontsize=15, textcolor='bg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
+    def __init__(self, spec=(), x=0, y=0, linecolor='fg', linewidth=1,
+        text='', fontsize=15, textcolor='fg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
         offsetx=0, offsety=0, as_points=False, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None,
         parent=None,
         visible=True, env=None, screen_coordinates=False):
-
-        self.env = g.default_env if env is None else env
+        self.env = default_env() if env is None else env
 
         # the checks hasattr are req'd to not override methods of inherited classes
         if not hasattr(self, 'spec'):
             self.spec = spec
-        if not hasattr(self, 'fillcolor'):
-            self.fillcolor = fillcolor
         if not hasattr(self, 'linecolor'):
             self.linecolor = linecolor
         if not hasattr(self, 'linewidth'):
@@ -7976,8 +10640,9 @@ class AnimateRectangle(_Vis):
             self.xy_anchor = xy_anchor
         if not hasattr(self, 'layer'):
             self.layer = layer
+        self.fillcolor = ''
         self.arg = self if arg is None else arg
-        ao0 = _AnimateVis(rectangle0=(), vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
+        ao0 = _AnimateVis(line0=(), vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
         ao1 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
         ao1.dependent = True
         self.aos = (ao0, ao1)
@@ -7987,9 +10652,9 @@ class AnimateRectangle(_Vis):
             ao.remove()
 
 
-class AnimatePolygon(_Vis):
+class AnimatePoints(_Vis):
     '''
-    Displays a polygon, optionally with a text
+    Displays a series of points, optionally with a text
 
     Parameters
     ----------
@@ -8011,24 +10676,20 @@ class AnimatePolygon(_Vis):
         If '', the given coordimates are used untranslated
 
     offsetx : float
-        offsets the x-coordinate of the polygon (default 0)
+        offsets the x-coordinate of the points (default 0)
 
     offsety : float
-        offsets the y-coordinate of the polygon (default 0)
+        offsets the y-coordinate of the points (default 0)
 
     linewidth : float
-        linewidth of the contour |n|
+        width of the points |n|
         default 1
 
-    fillcolor : colorspec
-        color of interior (default foreground_color) |n|
-        default transparent
-
     linecolor : colorspec
-        color of the contour (default transparent)
+        color of the points (default foreground_color)
 
     angle : float
-        angle of the polygon (in degrees) |n|
+        angle of the points (in degrees) |n|
         default: 0
 
     as_points : bool
@@ -8092,23 +10753,19 @@ class AnimatePolygon(_Vis):
     - a function with two parameters, being arg (as given) and the time, like lambda comp, t: comp.state |n|
     - a method instance arg for time t, like self.state, actually leading to arg.state(t) to be called
     '''
-    def __init__(self, spec=(), x=0, y=0, fillcolor='fg', linecolor='', linewidth=1,
-        text='', fontsize=15, textcolor='bg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
-        offsetx=0, offsety=0, as_points=False, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None, parent=None,
+    def __init__(self, spec=(), x=0, y=0, linecolor='fg', linewidth=4,
+        text='', fontsize=15, textcolor='fg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
+        offsetx=0, offsety=0, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None, parent=None,
         visible=True, env=None, screen_coordinates=False):
-        self.env = g.default_env if env is None else env
+        self.env = default_env() if env is None else env
 
         # the checks hasattr are req'd to not override methods of inherited classes
         if not hasattr(self, 'spec'):
             self.spec = spec
-        if not hasattr(self, 'fillcolor'):
-            self.fillcolor = fillcolor
         if not hasattr(self, 'linecolor'):
             self.linecolor = linecolor
         if not hasattr(self, 'linewidth'):
             self.linewidth = linewidth
-        if not hasattr(self, 'as_points'):
-            self.aspoint = as_points
         if not hasattr(self, 'x'):
             self.x = x
         if not hasattr(self, 'y'):
@@ -8141,8 +10798,10 @@ class AnimatePolygon(_Vis):
             self.xy_anchor = xy_anchor
         if not hasattr(self, 'layer'):
             self.layer = layer
+        self.fillcolor = ''
         self.arg = self if arg is None else arg
-        ao0 = _AnimateVis(polygon0=(), vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
+        ao0 = _AnimateVis(line0=(), as_points=True, vis=self,
+            screen_coordinates=screen_coordinates, env=env, parent=parent)
         ao1 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
         ao1.dependent = True
         self.aos = (ao0, ao1)
@@ -8152,14 +10811,28 @@ class AnimatePolygon(_Vis):
             ao.remove()
 
 
-class AnimateLine(_Vis):
+class AnimateCircle(_Vis):
     '''
-    Displays a line, optionally with a text
+    Displays a (partial) circle or (partial) ellipse , optionally with a text
 
     Parameters
     ----------
-    spec : tuple or list
-        should specify x0, y0, x1, y1, ...
+    radius : float
+        radius of the circle
+
+    radius1 : float
+        the 'height of the ellipse. If None (default), a circle will be drawn
+
+    arc_angle0 : float
+        start angle of the circle (default 0)
+
+    arc_angle1 : float
+        end angle of the circle (default 360) |n|
+        when arc_angle1 > arc_angle0 + 360, only 360 degrees will be shown
+
+    draw_arc : bool
+        if False (default), no arcs will be drawn
+        if True, the arcs from and to the center will be drawn
 
     x : float
         position of anchor point (default 0)
@@ -8173,29 +10846,30 @@ class AnimateLine(_Vis):
         ``nw    n    ne`` |n|
         ``w     c     e`` |n|
         ``sw    s    se`` |n|
-        If '', the given coordimates are used untranslated
+        If '', the given coordimates are used untranslated |n|
+        The positions corresponds to a full circle even if arc_angle0 and/or arc_angle1 are specified.
 
     offsetx : float
-        offsets the x-coordinate of the line (default 0)
+        offsets the x-coordinate of the circle (default 0)
 
     offsety : float
-        offsets the y-coordinate of the line (default 0)
+        offsets the y-coordinate of the circle (default 0)
 
     linewidth : float
         linewidth of the contour |n|
         default 1
 
+    fillcolor : colorspec
+        color of interior (default foreground_color) |n|
+        default transparent
+
     linecolor : colorspec
-        color of the contour (default foreground_color)
+        color of the contour (default transparent)
 
     angle : float
-        angle of the line (in degrees) |n|
+        angle of the circle/ellipse and/or text (in degrees) |n|
         default: 0
 
-    as_points : bool
-         if False (default), the contour lines are drawn |n|
-         if True, only the corner points are shown
-
     text : str, tuple or list
         the text to be displayed |n|
         if text is str, the text may contain linefeeds, which are shown as individual lines
@@ -8253,22 +10927,32 @@ class AnimateLine(_Vis):
     - a function with two parameters, being arg (as given) and the time, like lambda comp, t: comp.state |n|
     - a method instance arg for time t, like self.state, actually leading to arg.state(t) to be called
     '''
-    def __init__(self, spec=(), x=0, y=0, linecolor='fg', linewidth=1,
-        text='', fontsize=15, textcolor='fg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
-        offsetx=0, offsety=0, as_points=False, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None,
-        parent=None,
+    def __init__(self, radius=100, radius1=None, arc_angle0=0, arc_angle1=360,
+        draw_arc=False, x=0, y=0, fillcolor='fg', linecolor='', linewidth=1,
+        text='', fontsize=15, textcolor='bg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
+        offsetx=0, offsety=0, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None, parent=None,
         visible=True, env=None, screen_coordinates=False):
-        self.env = g.default_env if env is None else env
+        self.env = default_env() if env is None else env
 
         # the checks hasattr are req'd to not override methods of inherited classes
-        if not hasattr(self, 'spec'):
-            self.spec = spec
+        if not hasattr(self, 'radius'):
+            self.radius = radius
+        if not hasattr(self, 'radius1'):
+            self.radius1 = radius1
+        if not hasattr(self, 'arc_angle0'):
+            self.arc_angle0 = arc_angle0
+        if not hasattr(self, 'arc_angle1'):
+            self.arc_angle1 = arc_angle1
+        if not hasattr(self, 'draw_arc'):
+            self.draw_arc = draw_arc
+        if not hasattr(self, 'fillcolor'):
+            self.fillcolor = fillcolor
         if not hasattr(self, 'linecolor'):
             self.linecolor = linecolor
         if not hasattr(self, 'linewidth'):
             self.linewidth = linewidth
-        if not hasattr(self, 'as_points'):
-            self.aspoint = as_points
+        if not hasattr(self, 'angle'):
+            self.angle = angle
         if not hasattr(self, 'x'):
             self.x = x
         if not hasattr(self, 'y'):
@@ -8301,26 +10985,27 @@ class AnimateLine(_Vis):
             self.xy_anchor = xy_anchor
         if not hasattr(self, 'layer'):
             self.layer = layer
-        self.fillcolor = ''
         self.arg = self if arg is None else arg
-        ao0 = _AnimateVis(line0=(), vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
+        ao0 = _AnimateVis(circle0=(), vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
         ao1 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
         ao1.dependent = True
-        self.aos = (ao0, ao1)
+        self. aos = (ao0, ao1)
 
     def remove(self):
         for ao in self.aos:
             ao.remove()
 
 
-class AnimatePoints(_Vis):
+class AnimateImage(_Vis):
     '''
-    Displays a series of points, optionally with a text
+    Displays an image, optionally with a text
 
     Parameters
     ----------
-    spec : tuple or list
-        should specify x0, y0, x1, y1, ...
+    image : str
+        image to be displayed |n|
+        if used as function or method or in direct assigmnent,
+        the image should be a PIL image (most likely via spec_to_image)
 
     x : float
         position of anchor point (default 0)
@@ -8336,27 +11021,23 @@ class AnimatePoints(_Vis):
         ``sw    s    se`` |n|
         If '', the given coordimates are used untranslated
 
+    anchor : str
+        specifies where the x and refer to |n|
+        possible values are (default: sw) : |n|
+        ``nw    n    ne`` |n|
+        ``w     c     e`` |n|
+        ``sw    s    se`` |n|
+
     offsetx : float
-        offsets the x-coordinate of the points (default 0)
+        offsets the x-coordinate of the circle (default 0)
 
     offsety : float
-        offsets the y-coordinate of the points (default 0)
-
-    linewidth : float
-        width of the points |n|
-        default 1
-
-    linecolor : colorspec
-        color of the points (default foreground_color)
+        offsets the y-coordinate of the circle (default 0)
 
     angle : float
-        angle of the points (in degrees) |n|
+        angle of the text (in degrees) |n|
         default: 0
 
-    as_points : bool
-         if False (default), the contour lines are drawn |n|
-         if True, only the corner points are shown
-
     text : str, tuple or list
         the text to be displayed |n|
         if text is str, the text may contain linefeeds, which are shown as individual lines
@@ -8414,19 +11095,18 @@ class AnimatePoints(_Vis):
     - a function with two parameters, being arg (as given) and the time, like lambda comp, t: comp.state |n|
     - a method instance arg for time t, like self.state, actually leading to arg.state(t) to be called
     '''
-    def __init__(self, spec=(), x=0, y=0, linecolor='fg', linewidth=4,
-        text='', fontsize=15, textcolor='fg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
+
+    def __init__(self, spec='', x=0, y=0, width=None,
+        text='', fontsize=15, textcolor='bg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
         offsetx=0, offsety=0, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None, parent=None,
-        visible=True, env=None, screen_coordinates=False):
-        self.env = g.default_env if env is None else env
+        anchor='sw', visible=True, env=None, screen_coordinates=False):
+        self.env = default_env() if env is None else env
 
         # the checks hasattr are req'd to not override methods of inherited classes
         if not hasattr(self, 'spec'):
-            self.spec = spec
-        if not hasattr(self, 'linecolor'):
-            self.linecolor = linecolor
-        if not hasattr(self, 'linewidth'):
-            self.linewidth = linewidth
+            self.spec = spec_to_image(spec)
+        if not hasattr(self, 'width'):
+            self.width = width
         if not hasattr(self, 'x'):
             self.x = x
         if not hasattr(self, 'y'):
@@ -8449,6 +11129,8 @@ class AnimatePoints(_Vis):
             self.text_anchor = text_anchor
         if not hasattr(self, 'angle'):
             self.angle = angle
+        if not hasattr(self, 'anchor'):
+            self.anchor = anchor
         if not hasattr(self, 'font'):
             self.font = font
         if not hasattr(self, 'fontsize'):
@@ -8459,581 +11141,692 @@ class AnimatePoints(_Vis):
             self.xy_anchor = xy_anchor
         if not hasattr(self, 'layer'):
             self.layer = layer
-        self.fillcolor = ''
+
         self.arg = self if arg is None else arg
-        ao0 = _AnimateVis(line0=(), as_points=True, vis=self,
-            screen_coordinates=screen_coordinates, env=env, parent=parent)
+        ao0 = _AnimateVis(image='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
         ao1 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
         ao1.dependent = True
-        self.aos = (ao0, ao1)
+        self. aos = (ao0, ao1)
 
     def remove(self):
         for ao in self.aos:
             ao.remove()
 
 
-class AnimateCircle(_Vis):
-    '''
-    Displays a (partial) circle or (partial) ellipse , optionally with a text
+class _AnimateVis(Animate):
+    def __init__(self, vis, *args, **kwargs):
+        Animate.__init__(self, *args, **kwargs)
+        self.vis = vis
 
-    Parameters
-    ----------
-    radius : float
-        radius of the circle
+    def x(self, t):
+        return _call(self.vis.x, t, self.vis.arg)
 
-    radius1 : float
-        the 'height of the ellipse. If None (default), a circle will be drawn
+    def y(self, t):
+        return _call(self.vis.y, t, self.vis.arg)
 
-    arc_angle0 : float
-        start angle of the circle (default 0)
+    def offsetx(self, t):
+        return _call(self.vis.offsetx, t, self.vis.arg)
 
-    arc_angle1 : float
-        end angle of the circle (default 360) |n|
-        when arc_angle1 > arc_angle0 + 360, only 360 degrees will be shown
+    def offsety(self, t):
+        return _call(self.vis.offsety, t, self.vis.arg)
 
-    draw_arc : bool
-        if False (default), no arcs will be drawn
-        if True, the arcs from and to the center will be drawn
+    def text_offsetx(self, t):
+        return _call(self.vis.text_offsetx, t, self.vis.arg)
 
-    x : float
-        position of anchor point (default 0)
+    def text_offsety(self, t):
+        return _call(self.vis.text_offsety, t, self.vis.arg)
 
-    y : float
-        position of anchor point (default 0)
+    def rectangle(self, t):
+        return _call(self.vis.spec, t, self.vis.arg)
 
-    xy_anchor : str
-        specifies where x and y are relative to |n|
-        possible values are (default: sw) : |n|
-        ``nw    n    ne`` |n|
-        ``w     c     e`` |n|
-        ``sw    s    se`` |n|
-        If '', the given coordimates are used untranslated |n|
-        The positions corresponds to a full circle even if arc_angle0 and/or arc_angle1 are specified.
+    def line(self, t):
+        return _call(self.vis.spec, t, self.vis.arg)
 
-    offsetx : float
-        offsets the x-coordinate of the circle (default 0)
+    def polygon(self, t):
+        return _call(self.vis.spec, t, self.vis.arg)
 
-    offsety : float
-        offsets the y-coordinate of the circle (default 0)
+    def circle(self, t):
+        return (
+            _call(self.vis.radius, t, self.vis.arg),
+            _call(self.vis.radius1, t, self.vis.arg),
+            _call(self.vis.arc_angle0, t, self.vis.arg),
+            _call(self.vis.arc_angle1, t, self.vis.arg),
+            _call(self.vis.draw_arc, t, self.vis.arg))
 
-    linewidth : float
-        linewidth of the contour |n|
-        default 1
+    def image(self, t):
+        return _call(self.vis.spec, t, self.vis.arg)
 
-    fillcolor : colorspec
-        color of interior (default foreground_color) |n|
-        default transparent
+    def fillcolor(self, t):
+        return _call(self.vis.fillcolor, t, self.vis.arg)
 
-    linecolor : colorspec
-        color of the contour (default transparent)
+    def linecolor(self, t):
+        return _call(self.vis.linecolor, t, self.vis.arg)
 
-    angle : float
-        angle of the circle/ellipse and/or text (in degrees) |n|
-        default: 0
+    def linewidth(self, t):
+        return _call(self.vis.linewidth, t, self.vis.arg)
 
-    text : str, tuple or list
-        the text to be displayed |n|
-        if text is str, the text may contain linefeeds, which are shown as individual lines
+    def text(self, t):
+        return _call(self.vis.text, t, self.vis.arg)
 
-    max_lines : int
-        the maximum of lines of text to be displayed |n|
-        if positive, it refers to the first max_lines lines |n|
-        if negative, it refers to the last -max_lines lines |n|
-        if zero (default), all lines will be displayed
+    def max_lines(self, t):
+        return _call(self.vis.max_lines, t, self.vis.arg)
 
-    font : str or list/tuple
-        font to be used for texts |n|
-        Either a string or a list/tuple of fontnames.
-        If not found, uses calibri or arial
+    def textcolor(self, t):
+        return _call(self.vis.textcolor, t, self.vis.arg)
 
-    text_anchor : str
-        anchor position of text|n|
-        specifies where to texts relative to the polygon
-        point |n|
-        possible values are (default: c): |n|
-        ``nw    n    ne`` |n|
-        ``w     c     e`` |n|
-        ``sw    s    se``
+    def text_anchor(self, t):
+        return _call(self.vis.text_anchor, t, self.vis.arg)
 
-    textcolor : colorspec
-        color of the text (default foreground_color)
+    def angle(self, t):
+        return _call(self.vis.angle, t, self.vis.arg)
+
+    def width(self, t):
+        return _call(self.vis.width, t, self.vis.arg)
+
+    def anchor(self, t):
+        return _call(self.vis.anchor, t, self.vis.arg)
+
+    def font(self, t):
+        return _call(self.vis.font, t, self.vis.arg)
+
+    def fontsize(self, t):
+        return _call(self.vis.fontsize, t, self.vis.arg)
+
+    def visible(self, t):
+        return _call(self.vis.visible, t, self.vis.arg)
+
+    def xy_anchor(self, t):
+        return _call(self.vis.xy_anchor, t, self.vis.arg)
+
+    def layer(self, t):
+        return _call(self.vis.layer, t, self.vis.arg)
+
+
+class _AosObject(object):  # for Monitor.animate and MonitorTimestamp.animate
+    def __init__(self):
+        self.aos = []
+
+    def remove(self):
+        for ao in self.aos:
+            ao.remove()
+        self.aos = []
+
+
+class _Animate_index_x_Line(Animate):
+    def __init__(self, monitor, xll, yll, width, height, value_offsety, value_scale, index_scale,
+        linewidth, *args, **kwargs):
+        self.monitor = monitor
+        self.xll = xll
+        self.yll = yll
+        self.width = width
+        self.height = height
+        self.value_offsety = value_offsety
+        self.value_scale = value_scale
+        self.index_scale = index_scale
+        self._linewidth = linewidth
+        self.index_width = int(self.width / self.index_scale)
+        Animate.__init__(self, *args, **kwargs)
+
+    def index_to_x(self, index):
+        if len(self.monitor._x) > self.index_width:
+            index = index + self.index_width - len(self.monitor._x)
+            if index < 0:
+                self.done = True
+        x = (index + 0.5) * self.index_scale
+        return self.xll + max(self._linewidth / 2, min(self.width - self._linewidth / 2, x))
+
+    def value_to_y(self, value):
+        try:
+            value = float(value)
+        except ValueError:
+            value = 0
+        return self.yll + max(
+            self._linewidth / 2, min(self.height - self._linewidth / 2, value * self.value_scale + self.value_offsety))
+
+    def line(self, t):
+        p = []
+        self.done = False
+
+        for index, value in zip(reversed(range(len(self.monitor._x))), reversed(self.monitor._x)):
+            x = self.index_to_x(index)
+            if self.done:
+                break
+            y = self.value_to_y(value)
+
+            p.append(x)
+            p.append(y)
+        return p
 
-    textoffsetx : float
-        extra x offset to the text_anchor point
 
-    textoffsety : float
-        extra y offset to the text_anchor point
+class _Animate_t_x_Line(Animate):
+    def __init__(self, monitor, width, height, value_offsety, value_scale, t_scale, linewidth,
+        as_level, *args, **kwargs):
+        self.monitor = monitor
+        self.width = width
+        self.height = height
+        self.value_offsety = value_offsety
+        self.value_scale = value_scale
+        self.t_scale = t_scale
+        self._linewidth = linewidth
+        self.as_level = as_level
+        self.t_width = self.width / self.t_scale
+        Animate.__init__(self, *args, **kwargs)
 
-    fontsize : float
-        fontsize of text (default 15)
+    def t_to_x(self, t):
+        t = t - self.t0
+        if self.tnow - self.t0 > self.t_width:
+            t = t + self.t_width - (self.tnow - self.t0)
+            if t < 0:
+                t = 0
+                self.done = True
+        x = t * self.t_scale
+        return max(self._linewidth / 2, min(self.width - self._linewidth / 2, x))
 
-    arg : any
-        this is used when a parameter is a function with two parameters, as the first argument or
-        if a parameter is a method as the instance |n|
-        default: self (instance itself)
+    def value_to_y(self, value):
+        if value == self.monitor.off:
+            value = 0
+        else:
+            try:
+                value = float(value)
+            except ValueError:
+                value = 0
+        return max(
+          self._linewidth / 2, min(self.height - self._linewidth / 2, value * self.value_scale + self.value_offsety))
 
-    parent : Component
-        component where this animation object belongs to (default None) |n|
-        if given, the animation object will be removed
-        automatically upon termination of the parent
+    def line(self, t):
+        self.tnow = t
+        self.t0 = self.monitor._t[0]
+        l = []
+        value = self.monitor._xw[-1]
+        lastt = t
+        if self.as_level:
+            l.append(self.t_to_x(lastt))
+            l.append(self.value_to_y(value))
+        self.done = False
+        for value, t in zip(reversed(self.monitor._xw), reversed(self.monitor._t)):
+            if self.as_level:
+                l.append(self.t_to_x(lastt))
+                l.append(self.value_to_y(value))
+            l.append(self.t_to_x(t))
+            l.append(self.value_to_y(value))
+            if self.done:
+                break
+            lastt = t
+        return l
 
-    Note
-    ----
-    All measures are in screen coordinates |n|
 
-    All parameters, apart from queue and arg can be specified as: |n|
-    - a scalar, like 10 |n|
-    - a function with zero arguments, like lambda: title |n|
-    - a function with one argument, being the time t, like lambda t: t + 10 |n|
-    - a function with two parameters, being arg (as given) and the time, like lambda comp, t: comp.state |n|
-    - a method instance arg for time t, like self.state, actually leading to arg.state(t) to be called
-    '''
-    def __init__(self, radius=100, radius1=None, arc_angle0=0, arc_angle1=360,
-        draw_arc=False, x=0, y=0, fillcolor='fg', linecolor='', linewidth=1,
-        text='', fontsize=15, textcolor='bg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
-        offsetx=0, offsety=0, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None, parent=None,
-        visible=True, env=None, screen_coordinates=False):
-        self.env = g.default_env if env is None else env
+class _Animate_t_Line(Animate):
+    def __init__(self, monitor, width, height, t_scale, *args, **kwargs):
+        self.monitor = monitor
+        self.t_scale = t_scale
+        self.width = width
+        self.height = height
+        self.t_width = self.width / self.t_scale
+        Animate.__init__(self, *args, **kwargs)
 
-        # the checks hasattr are req'd to not override methods of inherited classes
-        if not hasattr(self, 'radius'):
-            self.radius = radius
-        if not hasattr(self, 'radius1'):
-            self.radius1 = radius1
-        if not hasattr(self, 'arc_angle0'):
-            self.arc_angle0 = arc_angle0
-        if not hasattr(self, 'arc_angle1'):
-            self.arc_angle1 = arc_angle1
-        if not hasattr(self, 'draw_arc'):
-            self.draw_arc = draw_arc
-        if not hasattr(self, 'fillcolor'):
-            self.fillcolor = fillcolor
-        if not hasattr(self, 'linecolor'):
-            self.linecolor = linecolor
-        if not hasattr(self, 'linewidth'):
-            self.linewidth = linewidth
-        if not hasattr(self, 'angle'):
-            self.angle = angle
-        if not hasattr(self, 'x'):
-            self.x = x
-        if not hasattr(self, 'y'):
-            self.y = y
-        if not hasattr(self, 'offsetx'):
-            self.offsetx = offsetx
-        if not hasattr(self, 'offsety'):
-            self.offsety = offsety
-        if not hasattr(self, 'text_offsetx'):
-            self.text_offsetx = text_offsetx
-        if not hasattr(self, 'text_offsety'):
-            self.text_offsety = text_offsety
-        if not hasattr(self, 'text'):
-            self.text = text
-        if not hasattr(self, 'max_lines'):
-            self.max_lines = max_lines
-        if not hasattr(self, 'textcolor'):
-            self.textcolor = textcolor
-        if not hasattr(self, 'text_anchor'):
-            self.text_anchor = text_anchor
-        if not hasattr(self, 'angle'):
-            self.angle = angle
-        if not hasattr(self, 'font'):
-            self.font = font
-        if not hasattr(self, 'fontsize'):
-            self.fontsize = fontsize
-        if not hasattr(self, 'visible'):
-            self.visible = visible
-        if not hasattr(self, 'xy_anchor'):
-            self.xy_anchor = xy_anchor
-        if not hasattr(self, 'layer'):
-            self.layer = layer
-        self.arg = self if arg is None else arg
-        ao0 = _AnimateVis(circle0=(), vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
-        ao1 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
-        ao1.dependent = True
-        self. aos = (ao0, ao1)
+    def line(self, t):
+        t = t - self.monitor._t[0]
+        if t > self.t_width:
+            t = self.t_width
+        x = t * self.t_scale
+        return x, 0, x, self.height
 
-    def remove(self):
-        for ao in self.aos:
-            ao.remove()
 
+class Entity(object):
+    '''Entity object
 
-class AnimateImage(_Vis):
-    '''
-    Displays an image, optionally with a text
+    An entity is a lightweight, passive object that can enter and leave queues, like a data component,
+    but without any process machinery. Creating an entity is much faster and requires much less memory than
+    creating a (data) component. |n|
+    Usually, an entity will be defined as a subclass of Entity.
 
     Parameters
     ----------
-    image : str
-        image to be displayed |n|
-        if used as function or method or in direct assigmnent,
-        the image should be a PIL image (most likely via spec_to_image)
-
-    x : float
-        position of anchor point (default 0)
+    name : str
+        name of the entity. |n|
+        if the name ends with a period (.),
+        auto serializing will be applied |n|
+        if the name end with a comma,
+        auto serializing starting at 1 will be applied |n|
+        if omitted, the name will be derived from the class
+        it is defined in (lowercased)
 
-    y : float
-        position of anchor point (default 0)
+    env : Environment
+        environment where the entity is defined |n|
+        if omitted, default_env will be used
 
-    xy_anchor : str
-        specifies where x and y are relative to |n|
-        possible values are (default: sw) : |n|
-        ``nw    n    ne`` |n|
-        ``w     c     e`` |n|
-        ``sw    s    se`` |n|
-        If '', the given coordimates are used untranslated
+    Note
+    ----
+    The name (and sequence number) of an entity is only determined when it is required for the first time
+    (e.g. for the trace), so the serialization follows that order, rather than the order of creation. |n|
+    Entity defines __slots__. If a subclass defines __slots__ as well, only these attributes are allowed,
+    which minimizes the memory used per entity. |n|
+    Component is a subclass of Entity.
+    '''
 
-    anchor : str
-        specifies where the x and refer to |n|
-        possible values are (default: sw) : |n|
-        ``nw    n    ne`` |n|
-        ``w     c     e`` |n|
-        ``sw    s    se`` |n|
+    __slots__ = ('env', '_name', '_base_name', '_sequence_number', '_qmembers', '__weakref__')
 
-    offsetx : float
-        offsets the x-coordinate of the circle (default 0)
+    def __init__(self, name=None, env=None):
+        if env is None:
+            self.env = default_env()
+        else:
+            self.env = env
+        self._qmembers = _empty_mapping
+        self._base_name = name
+        self._name = None
 
-    offsety : float
-        offsets the y-coordinate of the circle (default 0)
+    def _set_name(self):
+        _set_name(self._base_name, self.env._nameserializeEntity, self)
 
-    angle : float
-        angle of the text (in degrees) |n|
-        default: 0
+    def name(self, value=None):
+        '''
+        Parameters
+        ----------
+        value : str
+            new name of the entity
+            if omitted, no change
 
-    text : str, tuple or list
-        the text to be displayed |n|
-        if text is str, the text may contain linefeeds, which are shown as individual lines
+        Returns
+        -------
+        Name of the entity : str
 
-    max_lines : int
-        the maximum of lines of text to be displayed |n|
-        if positive, it refers to the first max_lines lines |n|
-        if negative, it refers to the last -max_lines lines |n|
-        if zero (default), all lines will be displayed
+        Note
+        ----
+        base_name and sequence_number are not affected if the name is changed
+        '''
+        if self._name is None:
+            self._set_name()
+        if value is not None:
+            for q in self._qmembers:
+                q._name_index = None  # will be rebuilt when required
+            self._name = value
+        return self._name
 
-    font : str or list/tuple
-        font to be used for texts |n|
-        Either a string or a list/tuple of fontnames.
-        If not found, uses calibri or arial
+    def base_name(self):
+        '''
+        Returns
+        -------
+        base name of the entity (the name used at initialization): str
+        '''
+        if self._name is None:
+            self._set_name()
+        return self._base_name
 
-    text_anchor : str
-        anchor position of text|n|
-        specifies where to texts relative to the polygon
-        point |n|
-        possible values are (default: c): |n|
-        ``nw    n    ne`` |n|
-        ``w     c     e`` |n|
-        ``sw    s    se``
+    def sequence_number(self):
+        '''
+        Returns
+        -------
+        sequence_number of the entity : int
+            (normally this will be the integer value of a serialized name,
+            but also non serialized names (without a dotcomma at the end)
+            will be numbered)
+        '''
+        if self._name is None:
+            self._set_name()
+        return self._sequence_number
 
-    textcolor : colorspec
-        color of the text (default foreground_color)
+    def __repr__(self):
+        return objectclass_to_str(self) + ' (' + self.name() + ')'
 
-    textoffsetx : float
-        extra x offset to the text_anchor point
+    def animation_objects(self, id):
+        '''
+        defines how to display a component in AnimateQueue
 
-    textoffsety : float
-        extra y offset to the text_anchor point
+        Parameters
+        ----------
+        id : any
+            id as given by AnimateQueue. Note that by default this the reference to the AnimateQueue object.
 
-    fontsize : float
-        fontsize of text (default 15)
+        Returns
+        -------
+        List or tuple containg |n|
+            size_x : how much to displace the next component in x-direction, if applicable |n|
+            size_y : how much to displace the next component in y-direction, if applicable |n|
+            animation objects : instances of Animate class |n|
+            default behaviour: |n|
+            square of size 40 (displacements 50), with the sequence number centered.
 
-    arg : any
-        this is used when a parameter is a function with two parameters, as the first argument or
-        if a parameter is a method as the instance |n|
-        default: self (instance itself)
+        Note
+        ----
+        If you override this method, be sure to use the same header, either with or without the id parameter. |n|
+        '''
+        size_x = 50
+        size_y = 50
+        ao0 = AnimateRectangle(text=str(self.sequence_number()), textcolor='bg', spec=(-20, -20, 20, 20),
+            linewidth=0, fillcolor='fg')
+        return (size_x, size_y, ao0)
 
-    parent : Component
-        component where this animation object belongs to (default None) |n|
-        if given, the animation object will be removed
-        automatically upon termination of the parent
+    def queues(self):
+        '''
+        Returns
+        -------
+        set of queues where the component belongs to : set
+        '''
+        return set(self._qmembers)
 
-    Note
-    ----
-    All measures are in screen coordinates |n|
+    def count(self, q=None):
+        '''
+        queue count
 
-    All parameters, apart from queue and arg can be specified as: |n|
-    - a scalar, like 10 |n|
-    - a function with zero arguments, like lambda: title |n|
-    - a function with one argument, being the time t, like lambda t: t + 10 |n|
-    - a function with two parameters, being arg (as given) and the time, like lambda comp, t: comp.state |n|
-    - a method instance arg for time t, like self.state, actually leading to arg.state(t) to be called
-    '''
+        Parameters
+        ----------
+        q : Queue
+            queue to check or |n|
+            if omitted, the number of queues where the component is in
 
-    def __init__(self, spec='', x=0, y=0, width=None,
-        text='', fontsize=15, textcolor='bg', font='', angle=0, xy_anchor='', layer=0, max_lines=0,
-        offsetx=0, offsety=0, text_anchor='c', text_offsetx=0, text_offsety=0, arg=None, parent=None,
-        anchor='sw', visible=True, env=None, screen_coordinates=False):
-        self.env = g.default_env if env is None else env
+        Returns
+        -------
+        1 if component is in q, 0 otherwise : int
+            |n|
+            if q is omitted, the number of queues where the component is in
+        '''
+        if q is None:
+            return len(self._qmembers)
+        else:
+            return 1 if self in q else 0
 
-        # the checks hasattr are req'd to not override methods of inherited classes
-        if not hasattr(self, 'spec'):
-            self.spec = spec_to_image(spec)
-        if not hasattr(self, 'width'):
-            self.width = width
-        if not hasattr(self, 'x'):
-            self.x = x
-        if not hasattr(self, 'y'):
-            self.y = y
-        if not hasattr(self, 'offsetx'):
-            self.offsetx = offsetx
-        if not hasattr(self, 'offsety'):
-            self.offsety = offsety
-        if not hasattr(self, 'text_offsetx'):
-            self.text_offsetx = text_offsetx
-        if not hasattr(self, 'text_offsety'):
-            self.text_offsety = text_offsety
-        if not hasattr(self, 'text'):
-            self.text = text
-        if not hasattr(self, 'max_lines'):
-            self.max_lines = max_lines
-        if not hasattr(self, 'textcolor'):
-            self.textcolor = textcolor
-        if not hasattr(self, 'text_anchor'):
-            self.text_anchor = text_anchor
-        if not hasattr(self, 'angle'):
-            self.angle = angle
-        if not hasattr(self, 'anchor'):
-            self.anchor = anchor
-        if not hasattr(self, 'font'):
-            self.font = font
-        if not hasattr(self, 'fontsize'):
-            self.fontsize = fontsize
-        if not hasattr(self, 'visible'):
-            self.visible = visible
-        if not hasattr(self, 'xy_anchor'):
-            self.xy_anchor = xy_anchor
-        if not hasattr(self, 'layer'):
-            self.layer = layer
+    def index(self, q):
+        '''
+        Parameters
+        ----------
+        q : Queue
+            queue to be queried
 
-        self.arg = self if arg is None else arg
-        ao0 = _AnimateVis(image='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
-        ao1 = _AnimateVis(text='', vis=self, screen_coordinates=screen_coordinates, env=env, parent=parent)
-        ao1.dependent = True
-        self. aos = (ao0, ao1)
+        Returns
+        -------
+        index of component in q : int
+            if component belongs to q |n|
+            -1 if component does not belong to q
+        '''
+        m1 = self._member(q)
+        if m1 is None:
+            return -1
+        if q._index is None:
+            n = min(q._length, _queue_walk_length)
+            mx = q._head.successor
+            for index in range(n):
+                if mx is m1:
+                    return index
+                mx = mx.successor
+            mx = q._tail.predecessor
+            for index in range(q._length - 1, q._length - 1 - n, -1):
+                if mx is m1:
+                    return index
+                mx = mx.predecessor
+        return q._indexed().rank(m1)
 
-    def remove(self):
-        for ao in self.aos:
-            ao.remove()
+    def enter(self, q):
+        '''
+        enters a queue at the tail
 
+        Parameters
+        ----------
+        q : Queue
+            queue to enter
 
-class _AnimateVis(Animate):
-    def __init__(self, vis, *args, **kwargs):
-        Animate.__init__(self, *args, **kwargs)
-        self.vis = vis
+        Note
+        ----
+        the priority will be set to
+        the priority of the tail component of the queue, if any
+        or 0 if queue is empty
+        '''
+        self._checknotinqueue(q)
+        priority = q._tail.predecessor.priority
+        Qmember().insert_in_front_of(q._tail, self, q, priority)
+        return self
 
-    def x(self, t):
-        return _call(self.vis.x, t, self.vis.arg)
+    def enter_at_head(self, q):
+        '''
+        enters a queue at the head
 
-    def y(self, t):
-        return _call(self.vis.y, t, self.vis.arg)
+        Parameters
+        ----------
+        q : Queue
+            queue to enter
 
-    def offsetx(self, t):
-        return _call(self.vis.offsetx, t, self.vis.arg)
+        Note
+        ----
+        the priority will be set to
+        the priority of the head component of the queue, if any
+        or 0 if queue is empty
+        '''
 
-    def offsety(self, t):
-        return _call(self.vis.offsety, t, self.vis.arg)
+        self._checknotinqueue(q)
+        priority = q._head.successor.priority
+        Qmember().insert_in_front_of(q._head.successor, self, q, priority)
+        return self
 
-    def text_offsetx(self, t):
-        return _call(self.vis.text_offsetx, t, self.vis.arg)
+    def enter_in_front_of(self, q, poscomponent):
+        '''
+        enters a queue in front of a component
 
-    def text_offsety(self, t):
-        return _call(self.vis.text_offsety, t, self.vis.arg)
+        Parameters
+        ----------
+        q : Queue
+            queue to enter
 
-    def rectangle(self, t):
-        return _call(self.vis.spec, t, self.vis.arg)
+        poscomponent : Component
+            component to be entered in front of
 
-    def line(self, t):
-        return _call(self.vis.spec, t, self.vis.arg)
+        Note
+        ----
+        the priority will be set to the priority of poscomponent
+        '''
 
-    def polygon(self, t):
-        return _call(self.vis.spec, t, self.vis.arg)
+        self._checknotinqueue(q)
+        m2 = poscomponent._checkinqueue(q)
+        priority = m2.priority
+        Qmember().insert_in_front_of(m2, self, q, priority)
+        return self
 
-    def circle(self, t):
-        return (
-            _call(self.vis.radius, t, self.vis.arg),
-            _call(self.vis.radius1, t, self.vis.arg),
-            _call(self.vis.arc_angle0, t, self.vis.arg),
-            _call(self.vis.arc_angle1, t, self.vis.arg),
-            _call(self.vis.draw_arc, t, self.vis.arg))
+    def enter_behind(self, q, poscomponent):
+        '''
+        enters a queue behind a component
 
-    def image(self, t):
-        return _call(self.vis.spec, t, self.vis.arg)
+        Parameters
+        ----------
+        q : Queue
+            queue to enter
 
-    def fillcolor(self, t):
-        return _call(self.vis.fillcolor, t, self.vis.arg)
+        poscomponent : Component
+            component to be entered behind
 
-    def linecolor(self, t):
-        return _call(self.vis.linecolor, t, self.vis.arg)
+        Note
+        ----
+        the priority will be set to the priority of poscomponent
+        '''
 
-    def linewidth(self, t):
-        return _call(self.vis.linewidth, t, self.vis.arg)
+        self._checknotinqueue(q)
+        m1 = poscomponent._checkinqueue(q)
+        priority = m1.priority
+        Qmember().insert_in_front_of(m1.successor, self, q, priority)
+        return self
 
-    def text(self, t):
-        return _call(self.vis.text, t, self.vis.arg)
+    def enter_sorted(self, q, priority):
+        '''
+        enters a queue, according to the priority
 
-    def max_lines(self, t):
-        return _call(self.vis.max_lines, t, self.vis.arg)
+        Parameters
+        ----------
+        q : Queue
+            queue to enter
 
-    def textcolor(self, t):
-        return _call(self.vis.textcolor, t, self.vis.arg)
+        priority: type that can be compared with other priorities in the queue
+            priority in the queue
 
-    def text_anchor(self, t):
-        return _call(self.vis.text_anchor, t, self.vis.arg)
+        Note
+        ----
+        The component is placed just before the first component with a priority > given priority
+        '''
 
-    def angle(self, t):
-        return _call(self.vis.angle, t, self.vis.arg)
+        self._checknotinqueue(q)
+        m2 = q._insertion_point(priority)
+        Qmember().insert_in_front_of(m2, self, q, priority)
+        return self
 
-    def width(self, t):
-        return _call(self.vis.width, t, self.vis.arg)
+    def leave(self, q=None):
+        '''
+        leave queue
 
-    def anchor(self, t):
-        return _call(self.vis.anchor, t, self.vis.arg)
+        Parameters
+        ----------
+        q : Queue
+            queue to leave
 
-    def font(self, t):
-        return _call(self.vis.font, t, self.vis.arg)
+        Note
+        ----
+        statistics are updated accordingly
+        '''
+        if q is None:
+            return self.leave_all()
 
-    def fontsize(self, t):
-        return _call(self.vis.fontsize, t, self.vis.arg)
+        mx = self._checkinqueue(q)
+        if q._index is not None:
+            q._index.remove(mx)
+        if q._name_index is not None:
+            q._name_index_remove(mx)
+        m1 = mx.predecessor
+        m2 = mx.successor
+        m1.successor = m2
+        m2.predecessor = m1
+        mx.component = None
+        # signal for components method that member is not in the queue
+        q._length -= 1
+        if q._length == 0 and q._order is None:
+            q._index = None  # will be rebuilt when required
+        del self._qmembers[q]
+        if self.env._trace:
+            if not q._isinternal:
+                self.env._trace_event(_tr_leave, self, q)
+        length_of_stay = self.env._now - mx.enter_time
+        q.length_of_stay.tally(length_of_stay)
+        q.length.tally(q._length)
+        return self
 
-    def visible(self, t):
-        return _call(self.vis.visible, t, self.vis.arg)
+    def leave_all(self):
+        '''
+        leave all queues the component is in
 
-    def xy_anchor(self, t):
-        return _call(self.vis.xy_anchor, t, self.vis.arg)
+        Note
+        ----
+        This is equivalent to leave() without a queue. |n|
+        statistics are updated accordingly
+        '''
+        for q in list(self._qmembers):
+            if not q._isinternal:
+                self.leave(q)
+        return self
 
-    def layer(self, t):
-        return _call(self.vis.layer, t, self.vis.arg)
+    def priority(self, q, priority=None):
+        '''
+        gets/sets the priority of a component in a queue
 
+        Parameters
+        ----------
+        q : Queue
+            queue where the component belongs to
 
-class _AosObject(object):  # for Monitor.animate and MonitorTimestamp.animate
-    def __init__(self):
-        self.aos = []
+        priority : type that can be compared with other priorities in the queue
+            priority in queue |n|
+            if omitted, no change
 
-    def remove(self):
-        for ao in self.aos:
-            ao.remove()
-        self.aos = []
+        Returns
+        -------
+        the priority of the component in the queue : float
 
+        Note
+        ----
+        if you change the priority, the order of the queue may change
+        '''
 
-class _Animate_index_x_Line(Animate):
-    def __init__(self, monitor, xll, yll, width, height, value_offsety, value_scale, index_scale,
-        linewidth, *args, **kwargs):
-        self.monitor = monitor
-        self.xll = xll
-        self.yll = yll
-        self.width = width
-        self.height = height
-        self.value_offsety = value_offsety
-        self.value_scale = value_scale
-        self.index_scale = index_scale
-        self._linewidth = linewidth
-        self.index_width = int(self.width / self.index_scale)
-        Animate.__init__(self, *args, **kwargs)
+        mx = self._checkinqueue(q)
+        if priority is not None:
+            if priority != mx.priority:
+                # leave.sort is not possible, because statistics will be affected
+                if q._index is not None:
+                    q._index.remove(mx)
+                mx.predecessor.successor = mx.successor
+                mx.successor.predecessor = mx.predecessor
 
-    def index_to_x(self, index):
-        if len(self.monitor._x) > self.index_width:
-            index = index + self.index_width - len(self.monitor._x)
-            if index < 0:
-                self.done = True
-        x = (index + 0.5) * self.index_scale
-        return self.xll + max(self._linewidth / 2, min(self.width - self._linewidth / 2, x))
+                m2 = q._insertion_point(priority)
 
-    def value_to_y(self, value):
-        try:
-            value = float(value)
-        except ValueError:
-            value = 0
-        return self.yll + max(
-            self._linewidth / 2, min(self.height - self._linewidth / 2, value * self.value_scale + self.value_offsety))
+                m1 = m2.predecessor
+                m1.successor = mx
+                m2.predecessor = mx
+                mx.predecessor = m1
+                mx.successor = m2
+                mx.priority = priority
+                if q._index is not None:
+                    q._index.insert(mx)
+        return mx.priority
 
-    def line(self, t):
-        p = []
-        self.done = False
+    def successor(self, q):
+        '''
+        Parameters
+        ----------
+        q : Queue
+            queue where the component belongs to
 
-        for index, value in zip(reversed(range(len(self.monitor._x))), reversed(self.monitor._x)):
-            x = self.index_to_x(index)
-            if self.done:
-                break
-            y = self.value_to_y(value)
+        Returns
+        -------
+        the successor of the component in the queue: Component
+            if component is not at the tail. |n|
+            returns None if component is at the tail.
+        '''
 
-            p.append(x)
-            p.append(y)
-        return p
+        mx = self._checkinqueue(q)
+        return mx.successor.component
 
+    def predecessor(self, q):
+        '''
+        Parameters
+        ----------
+        q : Queue
+            queue where the component belongs to
 
-class _Animate_t_x_Line(Animate):
-    def __init__(self, monitor, width, height, value_offsety, value_scale, t_scale, linewidth,
-        as_level, *args, **kwargs):
-        self.monitor = monitor
-        self.width = width
-        self.height = height
-        self.value_offsety = value_offsety
-        self.value_scale = value_scale
-        self.t_scale = t_scale
-        self._linewidth = linewidth
-        self.as_level = as_level
-        self.t_width = self.width / self.t_scale
-        Animate.__init__(self, *args, **kwargs)
+        Returns : Component
+            predecessor of the component in the queue
+            if component is not at the head. |n|
+            returns None if component is at the head.
+        '''
 
-    def t_to_x(self, t):
-        t = t - self.t0
-        if self.tnow - self.t0 > self.t_width:
-            t = t + self.t_width - (self.tnow - self.t0)
-            if t < 0:
-                t = 0
-                self.done = True
-        x = t * self.t_scale
-        return max(self._linewidth / 2, min(self.width - self._linewidth / 2, x))
+        mx = self._checkinqueue(q)
+        return mx.predecessor.component
 
-    def value_to_y(self, value):
-        if value == self.monitor.off:
-            value = 0
-        else:
-            try:
-                value = float(value)
-            except ValueError:
-                value = 0
-        return max(
-          self._linewidth / 2, min(self.height - self._linewidth / 2, value * self.value_scale + self.value_offsety))
+    def enter_time(self, q):
+        '''
+        Parameters
+        ----------
+        q : Queue
+            queue where component belongs to
 
-    def line(self, t):
-        self.tnow = t
-        self.t0 = self.monitor._t[0]
-        l = []
-        value = self.monitor._xw[-1]
-        lastt = t
-        if self.as_level:
-            l.append(self.t_to_x(lastt))
-            l.append(self.value_to_y(value))
-        self.done = False
-        for value, t in zip(reversed(self.monitor._xw), reversed(self.monitor._t)):
-            if self.as_level:
-                l.append(self.t_to_x(lastt))
-                l.append(self.value_to_y(value))
-            l.append(self.t_to_x(t))
-            l.append(self.value_to_y(value))
-            if self.done:
-                break
-            lastt = t
-        return l
+        Returns
+        -------
+        time the component entered the queue : float
+        '''
+        mx = self._checkinqueue(q)
+        return mx.enter_time - self.env._offset
 
+    def _member(self, q):
+        return self._qmembers.get(q, None)
 
-class _Animate_t_Line(Animate):
-    def __init__(self, monitor, width, height, t_scale, *args, **kwargs):
-        self.monitor = monitor
-        self.t_scale = t_scale
-        self.width = width
-        self.height = height
-        self.t_width = self.width / self.t_scale
-        Animate.__init__(self, *args, **kwargs)
+    def _checknotinqueue(self, q):
+        mx = self._member(q)
+        if mx is None:
+            pass
+        else:
+            raise SalabimError(
+                self.name() + ' is already member of ' + q.name())
 
-    def line(self, t):
-        t = t - self.monitor._t[0]
-        if t > self.t_width:
-            t = self.t_width
-        x = t * self.t_scale
-        return x, 0, x, self.height
+    def _checkinqueue(self, q):
+        mx = self._member(q)
+        if mx is None:
+            raise SalabimError(self.name() + ' is not member of ' + q.name())
+        else:
+            return mx
 
 
-class Component(object):
+class Component(Entity):
     '''Component object
 
     A salabim component is used as component (primarily for queueing)
@@ -9103,17 +11896,18 @@ class Component(object):
       process=None, suppress_trace=False, suppress_pause_at_step=False, mode=None,
       env=None, **kwargs):
         if env is None:
-            self.env = g.default_env
+            self.env = default_env()
         else:
             self.env = env
         _set_name(name, self.env._nameserializeComponent, self)
-        self._qmembers = {}
+        self._qmembers = _empty_mapping  # _qmembers, _requests, _claims and _waits are created when required
         self._process = None
         self._status = data
-        self._requests = collections.defaultdict(int)
-        self._claims = collections.defaultdict(int)
-        self._waits = []
+        self._requests = _empty_mapping
+        self._claims = _empty_mapping
+        self._waits = ()
         self._on_event_list = False
+        self._event_seq = None
         self._scheduled_time = inf
         self._failed = False
         self._creation_time = self.env._now
@@ -9121,7 +11915,7 @@ class Component(object):
         self._suppress_pause_at_step = suppress_pause_at_step
         self._mode = mode
         self._mode_time = self.env._now
-        self._aos = {}
+        self._aos = _empty_mapping
 
         if mode is not None:
             self._mode = mode
@@ -9155,8 +11949,9 @@ class Component(object):
                     self.env.print_trace('', '', self.name() +
                        ' create data component', _modetxt(self._mode))
         else:
-            self.env.print_trace('', '', self.name() +
-                ' create', _modetxt(self._mode))
+            if self.env._trace:
+                self.env.print_trace('', '', self.name() +
+                    ' create', _modetxt(self._mode))
             if not inspect.isgeneratorfunction(p):
                 raise SalabimError(process, 'has no yield statement')
 
@@ -9186,34 +11981,6 @@ class Component(object):
             self._reschedule(scheduled_time, urgent, 'activate', extra=extra)
         self.setup(**kwargs)
 
-    def animation_objects(self, id):
-        '''
-        defines how to display a component in AnimateQueue
-
-        Parameters
-        ----------
-        id : any
-            id as given by AnimateQueue. Note that by default this the reference to the AnimateQueue object.
-
-        Returns
-        -------
-        List or tuple containg |n|
-            size_x : how much to displace the next component in x-direction, if applicable |n|
-            size_y : how much to displace the next component in y-direction, if applicable |n|
-            animation objects : instances of Animate class |n|
-            default behaviour: |n|
-            square of size 40 (displacements 50), with the sequence number centered.
-
-        Note
-        ----
-        If you override this method, be sure to use the same header, either with or without the id parameter. |n|
-        '''
-        size_x = 50
-        size_y = 50
-        ao0 = AnimateRectangle(text=str(self.sequence_number()), textcolor='bg', spec=(-20, -20, 20, 20),
-            linewidth=0, fillcolor='fg')
-        return (size_x, size_y, ao0)
-
     def _remove_from_aos(self, q):
         if q in self._aos:
             for ao in self._aos[q][2:]:
@@ -9242,9 +12009,6 @@ class Component(object):
         '''
         pass
 
-    def __repr__(self):
-        return objectclass_to_str(self) + ' (' + self.name() + ')'
-
     def register(self, registry):
         '''
         registers the component in the registry
@@ -9363,18 +12127,18 @@ class Component(object):
         else:
             seq = self.env._seq
         self._on_event_list = True
-        heapq.heappush(self.env._event_list, (t, seq, self))
+        self._event_seq = seq
+        self.env._event_list.push(t, seq, self)
 
     def _remove(self):
         if self._on_event_list:
-            for i in range(len(self.env._event_list)):
-                if self.env._event_list[i][2] == self:
-                    self.env._event_list[i] = self.env._event_list[0]
-                    self.env._event_list.pop(0)
-                    heapq.heapify(self.env._event_list)
-                    self._on_event_list = False
-                    return
-            raise SalabimError('remove error', self.name())
+            # the entry stays on the event list as a tombstone, which will be skipped by step and peek
+            self._on_event_list = False
+            env = self.env
+            env._event_list_tombstones += 1
+            if env._event_list_tombstones > 1000 and env._event_list_tombstones * 2 > len(env._event_list):
+                env._purge_event_list()
+            return
         if self.status == standby:
             if self in self.env._standby_list:
                 self.env._standby_list(self)
@@ -9387,18 +12151,17 @@ class Component(object):
                 self.env.print_trace('', '', self.name(), 'request failed')
             for r in list(self._requests):
                 self.leave(r._requesters)
-                if r._requesters._length == 0:
-                    r._minq = inf
-            self._requests = collections.defaultdict(int)
+            self._requests = _empty_mapping
             self._failed = True
 
         if self._waits:
             if self.env._trace:
                 self.env.print_trace('', '', self.name(), 'wait failed')
-            for state, _, _ in self._waits:
+            for state, value, valuetype in self._waits:
                 if self in state._waiters:  # there might be more values for this state
                     self.leave(state._waiters)
-            self._waits = []
+                state._unindex_wait(self, value, valuetype)
+            self._waits = ()
             self._failed = True
 
     def _reschedule(self, scheduled_time, urgent, caller, extra='', s0=None):
@@ -9411,14 +12174,9 @@ class Component(object):
             self._push(scheduled_time, urgent)
         self._status = scheduled
         if self.env._trace:
-            self.env.print_trace(
-                '', '', self.name() + ' ' + caller,
-                merge_blanks(
-                    'scheduled for {:10.3f}'.format(scheduled_time - self.env._offset) +
-                    _urgenttxt(urgent) + '@' + self.lineno_txt(),
-                    _modetxt(self._mode),
-                    extra),
-                s0=s0)
+            self.env._trace_event(
+                _tr_schedule, self, value=scheduled_time - self.env._offset,
+                info=(caller, urgent, self._location(), self._mode, extra), s0=s0)
 
     def activate(self, at=None, delay=0, urgent=False, process=None,
       keep_request=False, keep_wait=False, mode=None, **kwargs):
@@ -9612,7 +12370,7 @@ class Component(object):
             self._mode = mode
             self._mode_time = self.env._now
         if self.env._trace:
-            self.env.print_trace('', '', self.name() + ' passivate', merge_blanks(_modetxt(self._mode)))
+            self.env._trace_event(_tr_passivate, self, info=self._mode)
         self._status = passive
 
     def interrupt(self, mode=None):
@@ -9649,7 +12407,8 @@ class Component(object):
                 self._interrupt_level = 1
                 self._status = interrupted
                 extra = ''
-            self.env.print_trace('', '', self.name() + ' interrupt' + extra, merge_blanks(_modetxt(self._mode)))
+            if self.env._trace:
+                self.env.print_trace('', '', self.name() + ' interrupt' + extra, merge_blanks(_modetxt(self._mode)))
 
     def resume(self, all=False, mode=None, urgent=False):
         '''
@@ -9687,19 +12446,23 @@ class Component(object):
                 self._mode_time = self.env._now
             self._interrupt_level -= 1
             if self._interrupt_level and (not all):
-                self.env.print_trace(
-                    '', '', self.name() + ' resume (interrupted.' + str(self._interrupt_level) + ')',
-                    merge_blanks(_modetxt(self._mode)))
+                if self.env._trace:
+                    self.env.print_trace(
+                        '', '', self.name() + ' resume (interrupted.' + str(self._interrupt_level) + ')',
+                        merge_blanks(_modetxt(self._mode)))
             else:
                 self._status = self._interrupted_status
-                self.env.print_trace(
-                    '', '', self.name() + ' resume (' + self.status()() + ')', merge_blanks(_modetxt(self._mode)))
+                if self.env._trace:
+                    self.env.print_trace(
+                        '', '', self.name() + ' resume (' + self.status()() + ')', merge_blanks(_modetxt(self._mode)))
                 if self._status == passive:
-                    self.env.print_trace('', '', self.name() + ' passivate', merge_blanks(_modetxt(self._mode)))
+                    if self.env._trace:
+                        self.env.print_trace('', '', self.name() + ' passivate', merge_blanks(_modetxt(self._mode)))
                 elif self._status == standby:
                     self._scheduled_time = self.env._now
                     self.env._standbylist.append(self)
-                    self.env.print_trace('', '', self.name() + ' standby', merge_blanks(_modetxt(self._mode)))
+                    if self.env._trace:
+                        self.env.print_trace('', '', self.name() + ' standby', merge_blanks(_modetxt(self._mode)))
                 elif self._status == scheduled:
                     if self._waits:
                         if self._trywait():
@@ -9743,8 +12506,7 @@ class Component(object):
             self._mode = mode
             self._mode_time = self.env._now
         if self.env._trace:
-            self.env.print_trace('', '', 'cancel ' +
-                self.name() + ' ' + _modetxt(self._mode))
+            self.env._trace_event(_tr_cancel, self, info=self._mode)
         self._status = data
         for ao in self.env.an_objects[:]:
             if ao.parent == self:
@@ -9785,9 +12547,11 @@ class Component(object):
             self._mode_time = self.env._now
         if self.env._trace:
             if self.env._buffered_trace:
+                if self.env._event_log is not None:
+                    self.env._event_log._drop_last()
                 self.env._buffered_trace = False
             else:
-                self.env.print_trace('', '', 'standby', _modetxt(self._mode))
+                self.env._trace_event(_tr_standby, self, info=self._mode)
         self._status = standby
 
     def request(self, *args, **kwargs):
@@ -9895,22 +12659,20 @@ class Component(object):
 
             if q <= 0:
                 raise SalabimError('quantity ' + str(q) + ' <=0')
+            if not self._requests:
+                self._requests = collections.defaultdict(int)
             self._requests[r] += q  # is same resource is specified several times, just add them up
             addstring = ''
-            if priority is None:
+            mx = self._member(r._requesters)
+            if mx is not None:  # same resource specified more than once
+                r._requesters._index.update(mx)
+            elif priority is None:
                 self.enter(r._requesters)
             else:
                 addstring = addstring + ' priority=' + str(priority)
                 self.enter_sorted(r._requesters, priority)
             if self.env._trace:
-                self.env.print_trace(
-                    '', '', self.name(),
-                    'request for ' + str(q) + ' from ' + r.name() + addstring +
-                    ' ' + _modetxt(self._mode))
-
-        for r, q in self._requests.items():
-            if q < r._minq:
-                r._minq = q
+                self.env._trace_event(_tr_request, self, r, info=(q, addstring, self._mode))
 
         self._tryrequest()
 
@@ -9931,16 +12693,14 @@ class Component(object):
 
                 self.leave(r._requesters)
                 if not r._anonymous:
+                    if not self._claims:
+                        self._claims = collections.defaultdict(int)
                     self._claims[r] += self._requests[r]
                     mx = self._member(r._claimers)
                     if mx is None:
                         self.enter(r._claimers)
-                if r._requesters._length == 0:
-                    r._minq = inf
                 r.claimed_quantity.tally(r._claimed_quantity)
-                r.occupancy.tally(0 if r._capacity <= 0 else r._claimed_quantity / r._capacity)
-                r.available_quantity.tally(r._capacity - r._claimed_quantity)
-            self._requests = collections.defaultdict(int)
+            self._requests = _empty_mapping
             self._remove()
             self._reschedule(self.env._now, False, 'request honor', s0=self.env.last_s0)
         return honored
@@ -9961,11 +12721,8 @@ class Component(object):
                 r._claimed_quantity = 0  # to avoid rounding problems
             del self._claims[r]
         r.claimed_quantity.tally(r._claimed_quantity)
-        r.occupancy.tally(0 if r._capacity <= 0 else r._claimed_quantity / r._capacity)
-        r.available_quantity.tally(r._capacity - r._claimed_quantity)
         if self.env._trace:
-            self.env.print_trace('', '', self.name(),
-                'release ' + str(q) + ' from ' + r.name(), s0=s0)
+            self.env._trace_event(_tr_release, self, r, info=q, s0=s0)
         r._tryrequest()
 
     def release(self, *args):
@@ -10156,12 +12913,17 @@ class Component(object):
                     self.enter(state._waiters)
                 else:
                     self.enter_sorted(state._waiters, priority)
+            if not self._waits:
+                self._waits = []
             if inspect.isfunction(value):
-                self._waits.append((state, value, 2))
+                valuetype = 2
             elif '$' in str(value):
-                self._waits.append((state, value, 1))
+                valuetype = 1
+                _wait_expression(value)  # compile now, so errors are reported at the wait
             else:
-                self._waits.append((state, value, 0))
+                valuetype = 0
+            self._waits.append((state, value, valuetype))
+            state._index_wait(self, value, valuetype)
 
         if not self._waits:
             raise SalabimError('no states specified')
@@ -10181,7 +12943,7 @@ class Component(object):
                         honored = False
                         break
                 elif valuetype == 1:
-                    if eval(value.replace('$', 'state._value')):
+                    if not _wait_expression(value)(state, self):
                         honored = False
                         break
                 elif valuetype == 2:
@@ -10197,7 +12959,7 @@ class Component(object):
                         honored = True
                         break
                 elif valuetype == 1:
-                    if eval(value.replace('$', str(state._value))):
+                    if _wait_expression(value)(state, self):
                         honored = True
                         break
                 elif valuetype == 2:
@@ -10206,10 +12968,11 @@ class Component(object):
                         break
 
         if honored:
-            for s, _, _ in self._waits:
+            for s, value, valuetype in self._waits:
                 if self in s._waiters:  # there might be more values for this state
                     self.leave(s._waiters)
-            self._waits = []
+                s._unindex_wait(self, value, valuetype)
+            self._waits = ()
             self._remove()
             self._reschedule(self.env._now, False, 'wait honor', s0=self.env.last_s0)
 
@@ -10285,6 +13048,8 @@ class Component(object):
         base_name and sequence_number are not affected if the name is changed
         '''
         if value is not None:
+            for q in self._qmembers:
+                q._name_index = None  # will be rebuilt when required
             self._name = value
         return self._name
 
@@ -10330,436 +13095,146 @@ class Component(object):
 
         Returns
         -------
-        suppress_trace : bool
-            components with the suppress_status of True, will be ignored in the trace
-        '''
-        if value is not None:
-            self._suppress_trace = value
-        return self._suppress_trace
-
-    def suppress_pause_at_step(self, value=None):
-        '''
-        Parameters
-        ----------
-        value: bool
-            new suppress_trace value |n|
-            if omitted, no change
-
-        Returns
-        -------
-        suppress_pause_at_step : bool
-            components with the suppress_pause_at_step of True, will be ignored in a step
-        '''
-        if value is not None:
-            self._suppress_pause_at_step = value
-        return self._suppress_pause_at_step
-
-    def mode(self, value=None):
-        '''
-        Parameters
-        ----------
-        value: any, str recommended
-            new mode |n|
-            if omitted, no change |n|
-            mode_time will be set if a new mode is specified
-
-        Returns
-        -------
-        mode of the component : any, usually str
-            the mode is useful for tracing and animations. |n|
-            Usually the mode will be set in a call to passivate, hold, activate, request or standby.
-        '''
-        if value is not None:
-            self._mode_time = self.env._now
-            self._mode = value
-
-        return self._mode
-
-    def ispassive(self):
-        '''
-        Returns
-        -------
-        True if status is passive, False otherwise : bool
-
-        Note
-        ----
-        Be sure to always include the parentheses, otherwise the result will be always True!
-        '''
-        return self._status == passive
-
-    def iscurrent(self):
-        '''
-        Returns
-        -------
-        True if status is current, False otherwise : bool
-
-        Note
-        ----
-        Be sure to always include the parentheses, otherwise the result will be always True!
-        '''
-        return self._status == current
-
-    def isrequesting(self):
-        '''
-        Returns
-        -------
-        True if status is requesting, False otherwise : bool
-
-        Note
-        ----
-        Be sure to always include the parentheses, otherwise the result will be always True!
-        '''
-        return bool(self._requests)
-
-    def iswaiting(self):
-        '''
-        Returns
-        -------
-        True if status is waiting, False otherwise : bool
-
-        Note
-        ----
-        Be sure to always include the parentheses, otherwise the result will be always True!
-        '''
-        return bool(self._waits)
-
-    def isscheduled(self):
-        '''
-        Returns
-        -------
-        True if status is scheduled, False otherwise : bool
-
-        Note
-        ----
-        Be sure to always include the parentheses, otherwise the result will be always True!
-        '''
-        return (self._status == scheduled) and (not self._requests) and (not self._waits)
-
-    def isstandby(self):
-        '''
-        Returns
-        -------
-        True if status is standby, False otherwise : bool
-
-        Note
-        ----
-        Be sure to always include the parentheses, otherwise the result will be always True
-        '''
-        return self._status == standby
-
-    def isinterrupted(self):
-        '''
-        Returns
-        -------
-        True if status is interrupted, False otherwise : bool
-
-        Note
-        ----
-        Be sure to always include the parentheses, otherwise the result will be always True
-        '''
-        return self._status == interrupted
-
-    def isdata(self):
-        '''
-        Returns
-        -------
-        True if status is data, False otherwise : bool
-
-        Note
-        ----
-        Be sure to always include the parentheses, otherwise the result will be always True!
-        '''
-        return self._status == data
-
-    def queues(self):
-        '''
-        Returns
-        -------
-        set of queues where the component belongs to : set
-        '''
-        return set(self._qmembers)
-
-    def count(self, q=None):
-        '''
-        queue count
-
-        Parameters
-        ----------
-        q : Queue
-            queue to check or |n|
-            if omitted, the number of queues where the component is in
-
-        Returns
-        -------
-        1 if component is in q, 0 otherwise : int
-            |n|
-            if q is omitted, the number of queues where the component is in
-        '''
-        if q is None:
-            return len(self._qmembers)
-        else:
-            return 1 if self in q else 0
-
-    def index(self, q):
-        '''
-        Parameters
-        ----------
-        q : Queue
-            queue to be queried
-
-        Returns
-        -------
-        index of component in q : int
-            if component belongs to q |n|
-            -1 if component does not belong to q
-        '''
-        m1 = self._member(q)
-        if m1 is None:
-            return -1
-        else:
-            mx = q._head.successor
-            index = 0
-            while mx != m1:
-                mx = mx.successor
-                index += 1
-            return index
-
-    def enter(self, q):
-        '''
-        enters a queue at the tail
-
-        Parameters
-        ----------
-        q : Queue
-            queue to enter
-
-        Note
-        ----
-        the priority will be set to
-        the priority of the tail component of the queue, if any
-        or 0 if queue is empty
-        '''
-        self._checknotinqueue(q)
-        priority = q._tail.predecessor.priority
-        Qmember().insert_in_front_of(q._tail, self, q, priority)
-        return self
-
-    def enter_at_head(self, q):
+        suppress_trace : bool
+            components with the suppress_status of True, will be ignored in the trace
         '''
-        enters a queue at the head
+        if value is not None:
+            self._suppress_trace = value
+        return self._suppress_trace
 
+    def suppress_pause_at_step(self, value=None):
+        '''
         Parameters
         ----------
-        q : Queue
-            queue to enter
+        value: bool
+            new suppress_trace value |n|
+            if omitted, no change
 
-        Note
-        ----
-        the priority will be set to
-        the priority of the head component of the queue, if any
-        or 0 if queue is empty
+        Returns
+        -------
+        suppress_pause_at_step : bool
+            components with the suppress_pause_at_step of True, will be ignored in a step
         '''
+        if value is not None:
+            self._suppress_pause_at_step = value
+        return self._suppress_pause_at_step
 
-        self._checknotinqueue(q)
-        priority = q._head.successor.priority
-        Qmember().insert_in_front_of(q._head.successor, self, q, priority)
-        return self
-
-    def enter_in_front_of(self, q, poscomponent):
+    def mode(self, value=None):
         '''
-        enters a queue in front of a component
-
         Parameters
         ----------
-        q : Queue
-            queue to enter
-
-        poscomponent : Component
-            component to be entered in front of
+        value: any, str recommended
+            new mode |n|
+            if omitted, no change |n|
+            mode_time will be set if a new mode is specified
 
-        Note
-        ----
-        the priority will be set to the priority of poscomponent
+        Returns
+        -------
+        mode of the component : any, usually str
+            the mode is useful for tracing and animations. |n|
+            Usually the mode will be set in a call to passivate, hold, activate, request or standby.
         '''
+        if value is not None:
+            self._mode_time = self.env._now
+            self._mode = value
 
-        self._checknotinqueue(q)
-        m2 = poscomponent._checkinqueue(q)
-        priority = m2.priority
-        Qmember().insert_in_front_of(m2, self, q, priority)
-        return self
+        return self._mode
 
-    def enter_behind(self, q, poscomponent):
+    def ispassive(self):
         '''
-        enters a queue behind a component
-
-        Parameters
-        ----------
-        q : Queue
-            queue to enter
-
-        poscomponent : Component
-            component to be entered behind
+        Returns
+        -------
+        True if status is passive, False otherwise : bool
 
         Note
         ----
-        the priority will be set to the priority of poscomponent
+        Be sure to always include the parentheses, otherwise the result will be always True!
         '''
+        return self._status == passive
 
-        self._checknotinqueue(q)
-        m1 = poscomponent._checkinqueue(q)
-        priority = m1.priority
-        Qmember().insert_in_front_of(m1.successor, self, q, priority)
-        return self
-
-    def enter_sorted(self, q, priority):
+    def iscurrent(self):
         '''
-        enters a queue, according to the priority
-
-        Parameters
-        ----------
-        q : Queue
-            queue to enter
-
-        priority: type that can be compared with other priorities in the queue
-            priority in the queue
+        Returns
+        -------
+        True if status is current, False otherwise : bool
 
         Note
         ----
-        The component is placed just before the first component with a priority > given priority
+        Be sure to always include the parentheses, otherwise the result will be always True!
         '''
+        return self._status == current
 
-        self._checknotinqueue(q)
-        m2 = q._head.successor
-        while (m2 != q._tail) and (m2.priority <= priority):
-            m2 = m2.successor
-        Qmember().insert_in_front_of(m2, self, q, priority)
-        return self
-
-    def leave(self, q=None):
+    def isrequesting(self):
         '''
-        leave queue
-
-        Parameters
-        ----------
-        q : Queue
-            queue to leave
+        Returns
+        -------
+        True if status is requesting, False otherwise : bool
 
         Note
         ----
-        statistics are updated accordingly
+        Be sure to always include the parentheses, otherwise the result will be always True!
         '''
-        if q is None:
-            for q in list(self._qmembers):
-                if not q._isinternal:
-                    self.leave(q)
-            return self
-
-        mx = self._checkinqueue(q)
-        m1 = mx.predecessor
-        m2 = mx.successor
-        m1.successor = m2
-        m2.predecessor = m1
-        mx.component = None
-        # signal for components method that member is not in the queue
-        q._length -= 1
-        del self._qmembers[q]
-        if self.env._trace:
-            if not q._isinternal:
-                self.env.print_trace('', '', self.name(), 'leave ' + q.name())
-        length_of_stay = self.env._now - mx.enter_time
-        q.length_of_stay.tally(length_of_stay)
-        q.length.tally(q._length)
-        return self
+        return bool(self._requests)
 
-    def priority(self, q, priority=None):
+    def iswaiting(self):
         '''
-        gets/sets the priority of a component in a queue
-
-        Parameters
-        ----------
-        q : Queue
-            queue where the component belongs to
-
-        priority : type that can be compared with other priorities in the queue
-            priority in queue |n|
-            if omitted, no change
-
         Returns
         -------
-        the priority of the component in the queue : float
+        True if status is waiting, False otherwise : bool
 
         Note
         ----
-        if you change the priority, the order of the queue may change
+        Be sure to always include the parentheses, otherwise the result will be always True!
         '''
+        return bool(self._waits)
 
-        mx = self._checkinqueue(q)
-        if priority is not None:
-            if priority != mx.priority:
-                # leave.sort is not possible, because statistics will be affected
-                mx.predecessor.successor = mx.successor
-                mx.successor.predecessor = mx.predecessor
-
-                m2 = q._head.successor
-                while (m2 != q._tail) and (m2.priority <= priority):
-                    m2 = m2.successor
-
-                m1 = m2.predecessor
-                m1.successor = mx
-                m2.predecessor = mx
-                mx.predecessor = m1
-                mx.successor = m2
-                mx.priority = priority
-                for iter in q._iter_touched:
-                    q._iter_touched[iter] = True
-        return mx.priority
-
-    def successor(self, q):
+    def isscheduled(self):
         '''
-        Parameters
-        ----------
-        q : Queue
-            queue where the component belongs to
-
         Returns
         -------
-        the successor of the component in the queue: Component
-            if component is not at the tail. |n|
-            returns None if component is at the tail.
-        '''
+        True if status is scheduled, False otherwise : bool
 
-        mx = self._checkinqueue(q)
-        return mx.successor.component
+        Note
+        ----
+        Be sure to always include the parentheses, otherwise the result will be always True!
+        '''
+        return (self._status == scheduled) and (not self._requests) and (not self._waits)
 
-    def predecessor(self, q):
+    def isstandby(self):
         '''
-        Parameters
-        ----------
-        q : Queue
-            queue where the component belongs to
+        Returns
+        -------
+        True if status is standby, False otherwise : bool
 
-        Returns : Component
-            predecessor of the component in the queue
-            if component is not at the head. |n|
-            returns None if component is at the head.
+        Note
+        ----
+        Be sure to always include the parentheses, otherwise the result will be always True
         '''
+        return self._status == standby
 
-        mx = self._checkinqueue(q)
-        return mx.predecessor.component
+    def isinterrupted(self):
+        '''
+        Returns
+        -------
+        True if status is interrupted, False otherwise : bool
 
-    def enter_time(self, q):
+        Note
+        ----
+        Be sure to always include the parentheses, otherwise the result will be always True
         '''
-        Parameters
-        ----------
-        q : Queue
-            queue where component belongs to
+        return self._status == interrupted
 
+    def isdata(self):
+        '''
         Returns
         -------
-        time the component entered the queue : float
+        True if status is data, False otherwise : bool
+
+        Note
+        ----
+        Be sure to always include the parentheses, otherwise the result will be always True!
         '''
-        mx = self._checkinqueue(q)
-        return mx.enter_time - self.env._offset
+        return self._status == data
 
     def creation_time(self):
         '''
@@ -10879,37 +13354,19 @@ class Component(object):
             raise SalabimError(self.name() + 'not interrupted')
         if len(self._requests) > 0:
             return requesting
-        if len(self._waits) > 0:
-            return waiting
-        return self._interrupted_status
-
-    def interrupt_level(self):
-        '''
-        returns interrupt level of an interrupted component |n|
-        non interrupted components return 0
-        '''
-        if self._status == interrupted:
-            return self._interrupt_level
-        else:
-            return 0
-
-    def _member(self, q):
-        return self._qmembers.get(q, None)
-
-    def _checknotinqueue(self, q):
-        mx = self._member(q)
-        if mx is None:
-            pass
-        else:
-            raise SalabimError(
-                self.name() + ' is already member of ' + q.name())
+        if len(self._waits) > 0:
+            return waiting
+        return self._interrupted_status
 
-    def _checkinqueue(self, q):
-        mx = self._member(q)
-        if mx is None:
-            raise SalabimError(self.name() + ' is not member of ' + q.name())
+    def interrupt_level(self):
+        '''
+        returns interrupt level of an interrupted component |n|
+        non interrupted components return 0
+        '''
+        if self._status == interrupted:
+            return self._interrupt_level
         else:
-            return mx
+            return 0
 
     def _checkisnotdata(self):
         if self._status == data:
@@ -10920,6 +13377,9 @@ class Component(object):
             raise SalabimError(self.name() + ' main component not allowed')
 
     def lineno_txt(self):
+        return _location_to_str(self._location())
+
+    def _location(self):
         plus = '+'
         if self == self.env._main:
             frame = self.frame
@@ -10928,7 +13388,7 @@ class Component(object):
             if frame.f_lasti == -1:  # checks whether generator is created
                 plus = ' '
 
-        return self.env._frame_to_lineno(frame) + plus
+        return self.env._frame_to_location(frame, plus)
 
 
 class Random(random.Random):
@@ -11030,7 +13490,7 @@ class Exponential(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
 
@@ -11056,7 +13516,7 @@ class Exponential(_Distribution):
                 raise SalabimError('both mean and rate are specified')
 
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11135,7 +13595,7 @@ class Normal(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
     '''
@@ -11159,7 +13619,7 @@ class Normal(_Distribution):
         if self._standard_deviation < 0:
             raise SalabimError('standard_deviation < 0')
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11234,7 +13694,7 @@ class IntUniform(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
 
@@ -11265,7 +13725,7 @@ class IntUniform(_Distribution):
             raise SalabimError('upperbound not integer')
 
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11332,7 +13792,7 @@ class Uniform(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
     '''
@@ -11346,7 +13806,7 @@ class Uniform(_Distribution):
         if self._lowerbound > self._upperbound:
             raise SalabimError('lowerbound>upperbound')
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11418,7 +13878,7 @@ class Triangular(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
     '''
@@ -11440,7 +13900,7 @@ class Triangular(_Distribution):
         if self._high < self._mode:
             raise SalabimError('high<mode')
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11503,7 +13963,7 @@ class Constant(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed |n|
         Note that this is only for compatibility with other distributions
@@ -11513,7 +13973,7 @@ class Constant(_Distribution):
     def __init__(self, value, randomstream=None):
         self._value = value
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11574,7 +14034,7 @@ class Poisson(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
 
@@ -11591,7 +14051,7 @@ class Poisson(_Distribution):
         self._mean = mean
 
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11667,7 +14127,7 @@ class Weibull(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
     '''
@@ -11679,7 +14139,7 @@ class Weibull(_Distribution):
 
         self._shape = shape
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11751,7 +14211,7 @@ class Gamma(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
 
@@ -11780,7 +14240,7 @@ class Gamma(_Distribution):
                 raise SalabimError('both scale and rate specified')
 
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11849,7 +14309,7 @@ class Beta(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
     '''
@@ -11863,7 +14323,7 @@ class Beta(_Distribution):
         self._beta = beta
 
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -11937,7 +14397,7 @@ class Erlang(_Distribution):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
 
@@ -11968,7 +14428,7 @@ class Erlang(_Distribution):
                 raise SalabimError('both rate and scale specified')
 
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -12040,7 +14500,7 @@ class Cdf(_Distribution):
             so no need to set cn to 1 or 100.
 
     randomstream: randomstream
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it defines a new stream with the specified seed
 
@@ -12050,7 +14510,7 @@ class Cdf(_Distribution):
         self._x = []
         self._cum = []
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -12156,7 +14616,7 @@ class Pdf(_Distribution):
         have equal probability. The value is not important.
 
     randomstream : randomstream
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
 
@@ -12174,7 +14634,7 @@ class Pdf(_Distribution):
         self._x = [0]  # just a place holder
         self._cum = [0]
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -12305,7 +14765,7 @@ class CumPdf(_Distribution):
         x-values from spec. |n|
 
     randomstream : randomstream
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed
 
@@ -12323,7 +14783,7 @@ class CumPdf(_Distribution):
         self._x = [0]  # just a place holder
         self._cum = [0]
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -12457,7 +14917,7 @@ class Distribution(_Distribution):
           resulting in a Triangular(c1,c2,c3)
 
     randomstream : randomstream
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment will be used |n|
         if used as random.Random(12299)
         it assigns a new stream with the specified seed |n|
 
@@ -12521,7 +14981,7 @@ class Distribution(_Distribution):
         d = eval(spec)
 
         if randomstream is None:
-            self.randomstream = random
+            self.randomstream = _default_randomstream()
         else:
             _checkrandomstream(randomstream)
             self.randomstream = randomstream
@@ -12630,7 +15090,7 @@ class State(object):
     def __init__(self, name=None, value=False, type='any',
       monitor=True, animation_objects=None, env=None, *args, **kwargs):
         if env is None:
-            self.env = g.default_env
+            self.env = default_env()
         else:
             self.env = env
         _set_name(name, self.env._nameserializeState, self)
@@ -12640,9 +15100,11 @@ class State(object):
         self.env._trace = False
         self._waiters = Queue(
             name='waiters of ' + self.name(),
-            monitor=monitor, env=self.env)
+            monitor=monitor, env=self.env, order='priority')
         self._waiters._isinternal = True
         self.env._trace = savetrace
+        self._waiters_by_value = {}  # per awaited value, the components waiting for that value (in a dict)
+        self._waiters_general = {}  # components with an expression or function wait (in a dict)
         self.value = MonitorTimestamp(
             name='Value of ' + self.name(),
             initial_tally=value, monitor=monitor, type=type, env=self.env)
@@ -12881,15 +15343,54 @@ class State(object):
         self._trywait()
 
     def _trywait(self, max=inf):
-        mx = self._waiters._head.successor
-        while mx != self._waiters._tail:
-            c = mx.component
-            mx = mx.successor
+        # only the waiters that wait for the current value and the waiters with an expression or function wait
+        # can be honored, so only these are tried (in the order of the waiters queue)
+        waiters_for_value = self._waiters_for_value(self._value)
+        if self._waiters_general:
+            candidates = list(waiters_for_value)
+            candidates.extend(c for c in self._waiters_general if c not in waiters_for_value)
+        elif waiters_for_value:
+            candidates = list(waiters_for_value)
+        else:
+            return
+        if len(candidates) > 1:
+            index = self._waiters._indexed()
+            candidates.sort(key=lambda c: index.rank(c._qmembers[self._waiters]))
+        for c in candidates:
             if c._trywait():
                 max -= 1
                 if max == 0:
                     return
 
+    def _waiters_for_value(self, value):
+        try:
+            return self._waiters_by_value.get(value, _empty_mapping)
+        except TypeError:  # unhashable value, so these waits are in _waiters_general
+            return _empty_mapping
+
+    def _index_wait(self, c, value, valuetype):
+        if valuetype == 0:
+            try:
+                self._waiters_by_value.setdefault(value, {})[c] = None
+                return
+            except TypeError:  # unhashable value
+                pass
+        self._waiters_general[c] = None
+
+    def _unindex_wait(self, c, value, valuetype):
+        if valuetype == 0:
+            try:
+                waiters = self._waiters_by_value.get(value)
+            except TypeError:  # unhashable value
+                pass
+            else:
+                if waiters is not None:
+                    waiters.pop(c, None)
+                    if not waiters:
+                        del self._waiters_by_value[value]
+                return
+        self._waiters_general.pop(c, None)
+
     def monitor(self, value=None):
         '''
         enables/disables the state monitors and timestamped monitors
@@ -13043,42 +15544,48 @@ class Resource(object):
     env : Environment
         environment to be used |n|
         if omitted, default_env is used
+
+    store : bool
+        if True (default), all values of the monitors are stored |n|
+        if False, the monitors only maintain running statistics (see Monitor)
     '''
 
     def __init__(self, name=None, capacity=1,
-                 anonymous=False, monitor=True, env=None, *args, **kwargs):
+                 anonymous=False, monitor=True, env=None, store=True, *args, **kwargs):
         if env is None:
-            self.env = g.default_env
+            self.env = default_env()
         else:
             self.env = env
         self._capacity = capacity
         _set_name(name, self.env._nameserializeResource, self)
         savetrace = self.env._trace
         self.env._trace = False
-        self._requesters = Queue(
-            name='requesters of ' + self.name(),
-            monitor=monitor, env=self.env)
+        self._requesters = _Requesters(
+            self, name='requesters of ' + self.name(),
+            monitor=monitor, env=self.env, order='priority', store=store)
         self._requesters._isinternal = True
         self._claimers = Queue(
             name='claimers of ' + self.name(),
-            monitor=monitor, env=self.env)
+            monitor=monitor, env=self.env, store=store)
         self._claimers._isinternal = True
         self.env._trace = savetrace
         self._claimed_quantity = 0
         self._anonymous = anonymous
-        self._minq = inf
         self.capacity = MonitorTimestamp(
             'Capacity of ' + self.name(),
-            initial_tally=capacity, monitor=monitor, type='float', env=self.env)
+            initial_tally=capacity, monitor=monitor, type='float', env=self.env, store=store)
         self.claimed_quantity = MonitorTimestamp(
             'Claimed quantity of ' + self.name(),
-            initial_tally=0, monitor=monitor, type='float', env=self.env)
-        self.available_quantity = MonitorTimestamp(
+            initial_tally=0, monitor=monitor, type='float', env=self.env, store=store)
+        self.available_quantity = _DerivedMonitorTimestamp(
             'Available quantity of ' + self.name(),
-            initial_tally=capacity, monitor=monitor, type='float', env=self.env)
-        self.occupancy = MonitorTimestamp(
+            sources=(self.claimed_quantity, self.capacity), function=_available_quantity, env=self.env, store=store)
+        self.occupancy = _DerivedMonitorTimestamp(
             'Occupancy of ' + self.name(),
-            initial_tally=0, monitor=monitor, type='float', env=self.env)
+            sources=(self.claimed_quantity, self.capacity), function=_occupancy, env=self.env, store=store)
+        if not monitor:
+            self.available_quantity.monitor(False)
+            self.occupancy.monitor(False)
         if self.env._trace:
             self.env.print_trace(
                 '', '', self.name() + ' create',
@@ -13307,13 +15814,17 @@ class Resource(object):
         return return_or_print(result, as_str, file)
 
     def _tryrequest(self):
-        mx = self._requesters._head.successor
-        while mx != self._requesters._tail:
-            if self._minq > (self._capacity - self._claimed_quantity + 1e-8):
-                break  # inpossible to honor any more requests
-            c = mx.component
-            mx = mx.successor
-            c._tryrequest()
+        # tries to honor the requesters, in queue order |n|
+        # the index finds the next requester that doesn't request more than available in O(log n),
+        # so requesters that request more are not visited
+        index = self._requesters._index
+        start = 0
+        while index._root is not None:
+            mx = index.first_fit(self._capacity - self._claimed_quantity + 1e-8, start)
+            if mx is None:
+                return
+            if not mx.component._tryrequest():  # blocked by another resource (or interrupted)
+                start = index.rank(mx) + 1
 
     def release(self, quantity=None):
         '''
@@ -13342,8 +15853,6 @@ class Resource(object):
             if self._claimed_quantity < 1e-8:
                 self._claimed_quantity = 0
             self.claimed_quantity.tally(self._claimed_quantity)
-            self.occupancy.tally(0 if self._capacity <= 0 else self._claimed_quantity / self._capacity)
-            self.available_quantity.tally(self._capacity - self._claimed_quantity)
             self._tryrequest()
 
         else:
@@ -13352,7 +15861,7 @@ class Resource(object):
                     'no quantity allowed for non-anonymous resource')
 
             mx = self._claimers._head.successor
-            while mx != self._tail:
+            while mx != self._claimers._tail:
                 c = mx.component
                 mx = mx.successor
                 c.release(self)
@@ -13385,8 +15894,6 @@ class Resource(object):
         '''
         self._capacity = cap
         self.capacity.tally(self._capacity)
-        self.available_quantity.tally(self._capacity - self._claimed_quantity)
-        self.occupancy.tally(0 if self._capacity <= 0 else self._claimed_quantity / self._capacity)
         self._tryrequest()
 
     def name(self, value=None):
@@ -13438,6 +15945,494 @@ class Resource(object):
         return self._sequence_number
 
 
+class Replications(object):
+    '''
+    Replications object, to run a number of independent replications of a model
+
+    Parameters
+    ----------
+    model : function
+        function that builds the model. It will be called as model(env) for each replication,
+        where env is a fresh environment with its own random seed. |n|
+        The function should return a dict with the key performance indicators (KPIs) to be collected.
+        The values of that dict may be a Monitor, a MonitorTimestamp, a function without arguments
+        (which will be called at the end of the run) or any other (picklable) value. |n|
+        When running in parallel, the function should be defined at module level (so it can be pickled)
+
+    number_of_replications : int
+        number of replications (default 10)
+
+    duration : float
+        duration of each run |n|
+        if duration and till are both omitted, the model function should run the simulation itself
+
+    till : float
+        end time of each run
+
+    random_seed : hashable object, usually int
+        seed for the generation of the (independent) random seeds of the replications |n|
+        if None (the default), 1234567 will be used
+
+    processes : int
+        number of processes to be used |n|
+        if None (the default), the number of CPUs will be used |n|
+        if 1, all replications run sequentially in this process
+
+    Note
+    ----
+    The replications are run with run() |n|
+    For a Monitor or MonitorTimestamp, a summary (a dict with mean, std, minimum, maximum, median,
+    number_of_entries and weight or duration) is collected. For monitors with a sketch, the summary
+    also contains the t-digest (sketch), so percentiles over all replications can be estimated. |n|
+    Parallel runs require concurrent.futures (standard from Python 3.2). If that is not available,
+    all replications will run sequentially.
+    '''
+
+    def __init__(self, model, number_of_replications=10, duration=None, till=None,
+      random_seed=None, processes=None):
+        self.model = model
+        self.number_of_replications = number_of_replications
+        self.duration = duration
+        self.till = till
+        self.processes = processes
+        if random_seed is None:
+            random_seed = 1234567
+        self._seed_stream = random.Random(random_seed)
+        self._seeds = []
+        self._results = []
+
+    def seed(self, replication):
+        '''
+        Parameters
+        ----------
+        replication : int
+            replication number (starting at 0)
+
+        Returns
+        -------
+        random seed used for replication : int
+        '''
+        while len(self._seeds) <= replication:
+            self._seeds.append(self._seed_stream.randrange(2 ** 31))
+        return self._seeds[replication]
+
+    def run(self, number_of_replications=None):
+        '''
+        runs the replications
+
+        Parameters
+        ----------
+        number_of_replications : int
+            number of (additional) replications to run |n|
+            if omitted, the number_of_replications as specified at initialization
+            minus the number of replications already run (if any)
+
+        Returns
+        -------
+        self (to allow chaining) : Replications
+        '''
+        if number_of_replications is None:
+            number_of_replications = self.number_of_replications - len(self._results)
+        seeds = [self.seed(replication) for replication in
+            range(len(self._results), len(self._results) + number_of_replications)]
+        self._results.extend(_run_replications(self.model, seeds, self.duration, self.till, self.processes))
+        return self
+
+    def __len__(self):
+        return len(self._results)
+
+    def results(self):
+        '''
+        Returns
+        -------
+        results of all replications run so far : list |n|
+        each element is a dict with the collected KPIs
+        '''
+        return self._results
+
+    def values(self, kpi, statistic='mean'):
+        '''
+        Parameters
+        ----------
+        kpi : str
+            name of the KPI, as returned by the model function
+
+        statistic : str
+            statistic to be used if the KPI is a monitor (default 'mean') |n|
+            ignored for other KPIs
+
+        Returns
+        -------
+        values of the KPI for all replications run so far : list
+        '''
+        result = []
+        for kpis in self._results:
+            value = kpis[kpi]
+            if isinstance(value, dict):
+                value = value[statistic]
+            result.append(value)
+        return result
+
+    def mean(self, kpi, statistic='mean'):
+        '''
+        Parameters
+        ----------
+        kpi : str
+            name of the KPI, as returned by the model function
+
+        statistic : str
+            statistic to be used if the KPI is a monitor (default 'mean')
+
+        Returns
+        -------
+        mean of the KPI over all replications run so far : float
+        '''
+        values = self.values(kpi, statistic)
+        if values:
+            return sum(values) / len(values)
+        return nan
+
+    def std(self, kpi, statistic='mean'):
+        '''
+        Parameters
+        ----------
+        kpi : str
+            name of the KPI, as returned by the model function
+
+        statistic : str
+            statistic to be used if the KPI is a monitor (default 'mean')
+
+        Returns
+        -------
+        sample standard deviation of the KPI over all replications run so far : float
+        '''
+        values = self.values(kpi, statistic)
+        if len(values) < 2:
+            return nan
+        mean = sum(values) / len(values)
+        return math.sqrt(sum((value - mean) ** 2 for value in values) / (len(values) - 1))
+
+    def percentile(self, kpi, q):
+        '''
+        Parameters
+        ----------
+        kpi : str
+            name of the KPI, which should be a monitor with a sketch
+
+        q : float
+            percentage of the distribution
+
+        Returns
+        -------
+        estimated q-th percentile of the tallied values of all replications run so far : float
+
+        Note
+        ----
+        The t-digests of all replications are merged, so this is the percentile of the pooled values,
+        rather than a statistic of the percentiles of the individual replications.
+        '''
+        sketch = None
+        for kpis in self._results:
+            value = kpis[kpi]
+            if not isinstance(value, dict) or 'sketch' not in value:
+                raise SalabimError(kpi + ' is not a monitor with a sketch')
+            if sketch is None:
+                sketch = value['sketch'].copy()
+            else:
+                sketch.merge(value['sketch'])
+        if sketch is None:
+            return nan
+        return sketch.percentile(q)
+
+    def half_width(self, kpi, statistic='mean', confidence=0.95):
+        '''
+        Parameters
+        ----------
+        kpi : str
+            name of the KPI, as returned by the model function
+
+        statistic : str
+            statistic to be used if the KPI is a monitor (default 'mean')
+
+        confidence : float
+            confidence level (default 0.95)
+
+        Returns
+        -------
+        half width of the confidence interval of the mean of the KPI over all replications run so far : float |n|
+        nan if less than 2 replications have been run
+
+        Note
+        ----
+        The confidence interval is mean() +/- half_width(), based on Student's t distribution.
+        '''
+        return _half_width(self.values(kpi, statistic), confidence)
+
+    def run_until(self, precision=0.05, kpis=None, statistic='mean', confidence=0.95,
+      batch_size=None, max_replications=1000):
+        '''
+        runs replications in batches, until the required precision is reached
+
+        Parameters
+        ----------
+        precision : float
+            required relative precision, i.e. the maximum ratio of the half width of the confidence interval
+            and the (absolute value of the) mean (default 0.05)
+
+        kpis : str or iterable of str
+            KPI(s) that should reach the required precision |n|
+            if omitted, all numeric KPIs
+
+        statistic : str
+            statistic to be used for KPIs that are monitors (default 'mean')
+
+        confidence : float
+            confidence level (default 0.95)
+
+        batch_size : int
+            number of replications to be run between subsequent checks |n|
+            if omitted, the number_of_replications as specified at initialization |n|
+            the replications of a batch run in parallel
+
+        max_replications : int
+            maximum total number of replications (default 1000)
+
+        Returns
+        -------
+        self (to allow chaining) : Replications
+
+        Note
+        ----
+        Whether the required precision has been reached can be checked with precision_reached().
+        '''
+        if batch_size is None:
+            batch_size = self.number_of_replications
+        batch_size = max(batch_size, 2)
+        while not self.precision_reached(precision, kpis, statistic, confidence):
+            number_of_replications = min(batch_size, max_replications - len(self._results))
+            if number_of_replications <= 0:
+                break
+            self.run(number_of_replications)
+        return self
+
+    def precision_reached(self, precision=0.05, kpis=None, statistic='mean', confidence=0.95):
+        '''
+        Parameters
+        ----------
+        precision : float
+            required relative precision (default 0.05)
+
+        kpis : str or iterable of str
+            KPI(s) to be checked |n|
+            if omitted, all numeric KPIs
+
+        statistic : str
+            statistic to be used for KPIs that are monitors (default 'mean')
+
+        confidence : float
+            confidence level (default 0.95)
+
+        Returns
+        -------
+        True if for all given KPIs the half width of the confidence interval is at most precision times
+        the absolute value of the mean, False otherwise : bool
+        '''
+        if len(self._results) < 2:
+            return False
+        if kpis is None:
+            kpis = self._numeric_kpis(statistic)
+        elif isinstance(kpis, str):
+            kpis = (kpis,)
+        for kpi in kpis:
+            half_width = self.half_width(kpi, statistic, confidence)
+            if not half_width <= precision * abs(self.mean(kpi, statistic)):  # also catches nan
+                return False
+        return True
+
+    def _numeric_kpis(self, statistic):
+        result = []
+        if self._results:
+            for kpi in sorted(self._results[0]):
+                try:
+                    values = self.values(kpi, statistic)
+                    float(values[0])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                result.append(kpi)
+        return result
+
+    def print_statistics(self, statistic='mean', as_str=False, file=None):
+        '''
+        prints a summary of all numeric KPIs over the replications
+
+        Parameters
+        ----------
+        statistic : str
+            statistic to be used for KPIs that are monitors (default 'mean')
+
+        as_str: bool
+            if False (default), print the statistics
+            if True, return a string containing the statistics
+
+        file: file
+            if None(default), all output is directed to stdout |n|
+            otherwise, the output is directed to the file
+
+        Returns
+        -------
+        statistics (if as_str is True) : str
+        '''
+        result = []
+        result.append('Replications: {}'.format(len(self._results)))
+        result.append('{:30s} {:>13s} {:>13s} {:>13s} {:>13s}'.format('kpi', 'mean', 'std.deviation', 'minimum', 'maximum'))
+        result.append('{} {} {} {} {}'.format(30 * '-', 13 * '-', 13 * '-', 13 * '-', 13 * '-'))
+        for kpi in self._numeric_kpis(statistic):
+            values = self.values(kpi, statistic)
+            result.append('{:30s} {} {} {} {}'.format(pad(kpi, 30),
+                fn(self.mean(kpi, statistic), 13, 3), fn(self.std(kpi, statistic), 13, 3),
+                fn(min(values), 13, 3), fn(max(values), 13, 3)))
+        return return_or_print(result, as_str, file)
+
+
+def _betacf(a, b, x):
+    # continued fraction for the incomplete beta function (modified Lentz)
+    tiny = 1e-300
+    qab = a + b
+    qap = a + 1
+    qam = a - 1
+    c = 1
+    d = 1 - qab * x / qap
+    if abs(d) < tiny:
+        d = tiny
+    d = 1 / d
+    h = d
+    for m in range(1, 301):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1 + aa * d
+        if abs(d) < tiny:
+            d = tiny
+        c = 1 + aa / c
+        if abs(c) < tiny:
+            c = tiny
+        d = 1 / d
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1 + aa * d
+        if abs(d) < tiny:
+            d = tiny
+        c = 1 + aa / c
+        if abs(c) < tiny:
+            c = tiny
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return h
+
+
+def _betai(a, b, x):
+    # regularized incomplete beta function I_x(a, b)
+    if x <= 0:
+        return 0.
+    if x >= 1:
+        return 1.
+    bt = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return bt * _betacf(a, b, x) / a
+    return 1 - bt * _betacf(b, a, 1 - x) / b
+
+
+def _t_cdf(t, df):
+    # cumulative distribution function of Student's t distribution
+    p = 0.5 * _betai(0.5 * df, 0.5, df / (df + t * t))
+    if t > 0:
+        return 1 - p
+    return p
+
+
+def _t_quantile(p, df):
+    # quantile of Student's t distribution, for p >= 0.5, by bisection
+    lo = 0.
+    hi = 1.
+    while _t_cdf(hi, df) < p:
+        lo = hi
+        hi *= 2
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        if _t_cdf(mid, df) < p:
+            lo = mid
+        else:
+            hi = mid
+        if hi - lo < 1e-12 * hi:
+            break
+    return (lo + hi) / 2
+
+
+def _half_width(values, confidence):
+    # half width of the confidence interval of the mean of (independent) values
+    n = len(values)
+    if n < 2:
+        return nan
+    mean = sum(values) / n
+    std = math.sqrt(sum((value - mean) ** 2 for value in values) / (n - 1))
+    return _t_quantile(0.5 + confidence / 2, n - 1) * std / math.sqrt(n)
+
+
+def _run_replications(model, seeds, duration, till, processes):
+    if processes != 1:
+        try:
+            import concurrent.futures
+        except ImportError:
+            processes = 1
+    if processes == 1:
+        save_default_env = g.default_env
+        save_context_env = _get_context_env()
+        try:
+            return [_run_replication(model, seed, duration, till) for seed in seeds]
+        finally:
+            g.default_env = save_default_env
+            _set_context_env(save_context_env)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(
+            _run_replication, [model] * len(seeds), seeds, [duration] * len(seeds), [till] * len(seeds)))
+
+
+def _run_replication(model, seed, duration, till):
+    env = Environment(random_seed=seed)
+    kpis = model(env)
+    if duration is not None or till is not None:
+        env.run(duration=duration, till=till)
+    return dict((kpi, _kpi_value(value)) for kpi, value in kpis.items())
+
+
+def _kpi_value(value):
+    # returns a picklable representation of a KPI
+    if isinstance(value, Monitor):
+        return _monitor_summary(value)
+    if callable(value):
+        return value()
+    return value
+
+
+def _monitor_summary(monitor):
+    summary = dict(
+        mean=monitor.mean(),
+        std=monitor.std(),
+        minimum=monitor.minimum(),
+        maximum=monitor.maximum(),
+        median=monitor.median(),
+        number_of_entries=monitor.number_of_entries())
+    if monitor._timestamp:
+        summary['duration'] = monitor.duration()
+    else:
+        summary['weight'] = monitor.weight()
+    if monitor._sketches is not None:
+        summary['sketch'] = monitor.sketch()
+    return summary
+
+
 def colornames():
     '''
     available colornames
@@ -13576,6 +16571,19 @@ def interpolate(t, t0, t1, v0, v1):
         return _i(p, v0, v1)
 
 
+_wait_expressions = {}  # compiled $-expressions of waits, per expression text (shared by all components)
+
+
+def _wait_expression(text):
+    # returns the $-expression of a wait, compiled into a function of the state and the component (self)
+    try:
+        return _wait_expressions[text]
+    except KeyError:
+        function = eval('lambda state, self: ' + text.replace('$', 'state._value'))
+        _wait_expressions[text] = function
+        return function
+
+
 def _set_name(name, _nameserialize, object):
     if name is None:
         name = objectclass_to_str(object).lower() + '.'
@@ -13671,6 +16679,63 @@ def type_to_typecode_off(type):
     return lookup[type]
 
 
+def numpy_backend(value=None):
+    '''
+    numpy backend for the statistics and histograms of monitors
+
+    Parameters
+    ----------
+    value : bool
+        if True, numpy is used (numpy is required) |n|
+        if False, pure Python is used |n|
+        if omitted, no change
+
+    Returns
+    -------
+    True if numpy is used, False otherwise : bool
+
+    Note
+    ----
+    By default, numpy is used if it is installed. The tallied values are viewed with numpy.frombuffer,
+    without copying, and the statistics and histograms are calculated in vectorized passes.
+    '''
+    global _numpy_module
+    if value is not None:
+        _numpy_module = None if value else False
+        if value and _numpy() is None:
+            raise SalabimError('numpy required for the numpy backend. Install with pip install numpy')
+    return _numpy() is not None
+
+
+_numpy_module = None  # None: not yet imported, False: not available or not to be used
+
+
+def _numpy():
+    # the numpy module, if the numpy backend is used (imported when first required), None otherwise
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy_module = numpy
+    return _numpy_module or None
+
+
+def _numpy_view(np, a):
+    # numpy array sharing the memory of array.array a
+    if not len(a):
+        return np.zeros(0, dtype=a.typecode)
+    return np.frombuffer(a, dtype=a.typecode)
+
+
+def _numeric(x):
+    try:
+        return float(x)
+    except:
+        return 0
+
+
 def list_to_array(l):
     float_result = array.array('d')
     for v in l:
@@ -13725,6 +16790,60 @@ def time_to_string(t):
     return rpad(s, 10)
 
 
+# trace actions, used by Environment._trace_event and EventLog
+_trace_actions = ('text', 'legend', 'current', 'current (standby)', 'ended', 'enter', 'leave',
+    'schedule', 'request', 'release', 'passivate', 'cancel', 'standby')
+(_tr_text, _tr_legend, _tr_current, _tr_current_standby, _tr_ended, _tr_enter, _tr_leave,
+    _tr_schedule, _tr_request, _tr_release, _tr_passivate, _tr_cancel, _tr_standby) = range(len(_trace_actions))
+
+
+def _trace_columns(action, t, component, target, value, info):
+    # returns the four columns of the trace line of a trace event
+    if action <= _tr_legend:
+        return info
+    if action == _tr_current:
+        return '{:10.3f}'.format(t), component, 'current', ''
+    if action == _tr_current_standby:
+        return '{:10.3f}'.format(t), component, 'current (standby)', ''
+    if action == _tr_ended:
+        return '', '', component + ' ended', ''
+    if action == _tr_enter:
+        return '', '', component, 'enter ' + target
+    if action == _tr_leave:
+        return '', '', component, 'leave ' + target
+    if action == _tr_schedule:
+        caller, urgent, lineno, mode, extra = info
+        return '', '', component + ' ' + caller, merge_blanks(
+            'scheduled for {:10.3f}'.format(value) + _urgenttxt(urgent) + '@' + _location_to_str(lineno),
+            _modetxt(mode), extra)
+    if action == _tr_request:
+        quantity, addstring, mode = info
+        return '', '', component, 'request for ' + str(quantity) + ' from ' + target + addstring + ' ' + _modetxt(mode)
+    if action == _tr_release:
+        return '', '', component, 'release ' + str(info) + ' from ' + target
+    if action == _tr_passivate:
+        return '', '', component + ' passivate', merge_blanks(_modetxt(info))
+    if action == _tr_cancel:
+        return '', '', 'cancel ' + component + ' ' + _modetxt(info), ''
+    if action == _tr_standby:
+        return '', '', 'standby', _modetxt(info)
+    raise SalabimError('unknown trace action ' + str(action))
+
+
+def _location_to_str(s0):
+    # s0 is either a str or a tuple (file reference, line number, suffix), as recorded by _trace_event
+    if s0.__class__ is not tuple:
+        return s0
+    ref, lineno, plus = s0
+    if ref == 0:
+        return rpad(str(lineno), 5) + plus
+    return rpad(chr(ref + ord('A') - 1) + str(lineno), 5) + plus
+
+
+def _trace_line(s0, s1, s2, s3, s4):
+    return pad(s0, 7) + pad(s1, 10) + ' ' + pad(s2, 20) + ' ' + pad(s3, max(len(s3), 36)) + ' ' + s4.strip()
+
+
 def _urgenttxt(urgent):
     if urgent:
         return '!'
@@ -13744,12 +16863,10 @@ def objectclass_to_str(object):
 
 
 def _get_caller_frame():
-    stack = inspect.stack()
-    filename0 = inspect.getframeinfo(stack[0][0]).filename
-    for i in range(len(inspect.stack())):
-        frame = stack[i][0]
-        if filename0 != inspect.getframeinfo(frame).filename:
-            break
+    frame = sys._getframe(0)
+    filename0 = frame.f_code.co_filename
+    while frame.f_back is not None and frame.f_code.co_filename == filename0:
+        frame = frame.f_back
     return frame
 
 
@@ -13837,12 +16954,14 @@ def random_seed(seed, randomstream=None):
 
     randomstream: randomstream
         randomstream to be used |n|
-        if omitted, random will be used |n|
+        if omitted, the random stream of the default environment and random will be used |n|
     '''
-    if randomstream is None:
-        randomstream = random
     if seed == '*':
         seed = None
+    if randomstream is None:
+        randomstream = _default_randomstream()
+        if randomstream is not random:
+            random.seed(seed)
     randomstream.seed(seed)
 
 
@@ -14128,13 +17247,53 @@ def can_video(try_only=True):
     return True
 
 
+if contextvars is None:
+    _context = threading.local()
+
+    def _get_context_env():
+        return getattr(_context, 'env', None)
+
+    def _set_context_env(env):
+        _context.env = env
+else:
+    _context_env = contextvars.ContextVar('salabim_env', default=None)
+
+    def _get_context_env():
+        return _context_env.get()
+
+    def _set_context_env(env):
+        _context_env.set(env)
+
+
+def _set_default_env(env):
+    g.default_env = env
+    _set_context_env(env)
+
+
 def default_env():
     '''
     Returns
     -------
     default environment : Environment
+
+    Note
+    ----
+    The default environment is context local: if an environment is made default in a thread
+    (or asyncio task), or is used as a context manager (with env: ...), that environment will be returned
+    in that context, regardless of environments created in other threads. |n|
+    If no environment is set in the current context, the most recently created default environment is returned.
     '''
-    return g.default_env
+    env = _get_context_env()
+    if env is None:
+        return g.default_env
+    return env
+
+
+def _default_randomstream():
+    env = default_env()
+    if env is None:
+        return random
+    return env._randomstream
 
 
 def reset():
@@ -14146,11 +17305,11 @@ def reset():
     might be useful for REPLs or for Pythonista
     '''
     try:
-        g.default_env.video_close()
+        default_env().video_close()
     except:
         pass
 
-    g.default_env = None
+    _set_default_env(None)
     g.animation_env = None
     g.animation_scene = None
     g.in_draw = False
@@ -5,14 +5,997 @@ import string
 import time
 import logging
 import inspect
+import os
+import tempfile
+import io
+import contextlib
+import re
 
 import platform
 Pythonista=(platform.system()=='Darwin')
 
 
 def test():
-    test87()
-    
+    test112()
+
+def test112():
+    env = sim.Environment(trace=False)
+    m1 = sim.Monitor('m1')
+    m2 = sim.Monitor('m2')
+    for i in range(1, 101):
+        m1.tally(i)
+        m2.tally(-i)
+    assert m1.percentile(50) == 51
+    assert m1._cached(m1._sorted, False) is m1._cached(m1._sorted, False)  # sorted only once
+    assert m2.percentile(50) == -50
+    assert m1.x() is m1.x()  # not evicted by m2
+    m1.tally(1000)
+    assert m1.maximum() == 1000 and m1.percentile(100) == 1000  # invalidated by tally
+    assert m1.bin_number_of_entries(90, 1000) == 11
+    m1.reset()
+    assert m1.number_of_entries() == 0
+
+    level = sim.MonitorTimestamp('level', initial_tally=1)
+    env.run(10)
+    level.tally(3)
+    env.run(10)
+    assert level.mean() == 2
+    env.run(20)
+    assert level.mean() == 2.5  # durations follow the time, also without animation
+    x, duration = level.xduration()
+    assert list(x) == [1, 3] and list(duration) == [10, 30]
+
+    w = sim.Monitor('w', weighted=True)
+    for i in range(2000):
+        w.tally(sim.Normal(10, 3).sample(), sim.Uniform(0.1, 3.3).sample())
+    x, weight = w.xweight()
+    assert w.bin_weight(5, 9.1) == sum(vweight for vx, vweight in zip(x, weight) if 5 < vx <= 9.1)
+    upperbounds = [i for i in range(21)] + [sim.inf]
+    totals = [0] * len(upperbounds)
+    for vx, vweight in zip(x, weight):
+        totals[min(i for i, upperbound in enumerate(upperbounds) if vx <= upperbound)] += vweight
+    assert w._bin_totals(upperbounds) == totals  # summed per bin, in tally order
+    w.print_histogram(number_of_bins=20)
+
+def test111():
+    env = sim.Environment(trace=False, random_seed=111)
+    m = sim.Monitor('m', type='float', weighted=True)
+    level = sim.MonitorTimestamp('level', type='uint32')
+    for i in range(1000):
+        m.tally(sim.Uniform(0, 10).sample() if i % 5 else 0, sim.Uniform(0, 2).sample())
+        level.tally(i % 7)
+        env.run(sim.Uniform(0, 1).sample())
+
+    def statistics():
+        result = []
+        for monitor in (m, level):
+            for ex0 in (False, True):
+                result.extend([monitor.mean(ex0=ex0), monitor.std(ex0=ex0), monitor.minimum(ex0=ex0),
+                    monitor.maximum(ex0=ex0), monitor.percentile(90, ex0=ex0), monitor.number_of_entries(ex0=ex0),
+                    monitor.weight(ex0=ex0), monitor.bin_number_of_entries(2, 4, ex0=ex0)])
+            result.append(monitor.bin_weight(2, 4))
+            result.append(monitor.print_histogram(number_of_bins=5, lowerbound=0, bin_width=2, as_str=True))
+        return result
+
+    with_numpy = sim.numpy_backend()
+    sim.numpy_backend(False)
+    python_statistics = statistics()
+    if with_numpy:
+        sim.numpy_backend(True)
+        for python_value, numpy_value in zip(python_statistics, statistics()):
+            if isinstance(python_value, str):
+                assert python_value == numpy_value
+            else:
+                assert abs(python_value - numpy_value) < 1e-9
+    print('numpy backend', sim.numpy_backend())
+    m.print_histogram()
+
+def sketch_model(env):
+    class Customer(sim.Component):
+        def process(self):
+            self.enter(waitingline)
+            yield self.request(clerk)
+            self.leave(waitingline)
+            yield self.hold(sim.Exponential(1).sample())
+
+    class CustomerGenerator(sim.Component):
+        def process(self):
+            while True:
+                Customer()
+                yield self.hold(sim.Exponential(1.25).sample())
+
+    waitingline = sim.Queue('waitingline', store=False, sketch=True)
+    clerk = sim.Resource('clerk')
+    CustomerGenerator()
+    return dict(length_of_stay=waitingline.length_of_stay, length=waitingline.length)
+
+def test110():
+    env = sim.Environment(trace=False, random_seed=110)
+    exact = sim.Monitor('exact', type='float')
+    sketched = sim.Monitor('sketched', type='float', store=False, sketch=True)
+    for _ in range(20000):
+        x = sim.Exponential(1).sample()
+        exact.tally(x)
+        sketched.tally(x)
+    for q in (50, 95, 99):
+        assert abs(sketched.percentile(q) - exact.percentile(q)) < 0.02 * exact.percentile(q)
+    assert sketched.minimum() == exact.minimum() and sketched.maximum() == exact.maximum()
+
+    low = sim.Monitor('low', sketch=True)
+    high = sim.Monitor('high', sketch=True)
+    for i in range(1000):
+        low.tally(i)
+        high.tally(i + 1000)
+    merged = sim.Monitor('merged', merge=(low, high), store=False, sketch=True)
+    assert abs(merged.median() - 1000) < 10
+    merged = sim.Monitor('merged', merge=(low, high), sketch=True)
+    assert merged.number_of_entries() == 2000 and abs(merged.median() - 1000) < 10
+    low_weighted = sim.Monitor('low_weighted', weighted=True, sketch=True)
+    high_weighted = sim.Monitor('high_weighted', weighted=True, sketch=True)
+    for i in range(1000):
+        low_weighted.tally(i, 3)
+        high_weighted.tally(i + 1000, 1)
+    merged = sim.Monitor('merged', merge=(low_weighted, high_weighted), weighted=True, sketch=True)
+    assert merged.weight() == 4000 and abs(merged.median() - 667) < 10
+
+    class Visitor(sim.Component):
+        def process(self):
+            self.enter(sim.Pdf(queues, 1).sample())
+            yield self.hold(sim.Uniform(0, 10).sample())
+            self.leave()
+
+    class VisitorGenerator(sim.Component):
+        def process(self):
+            while True:
+                Visitor()
+                yield self.hold(sim.Exponential(1).sample())
+
+    env = sim.Environment(trace=False, random_seed=110)
+    queues = [sim.Queue('queue', sketch=True) for _ in range(2)]
+    VisitorGenerator()
+    env.run(500)
+    merged = sim.MonitorTimestamp('merged', merge=[queue.length for queue in queues], sketch=True)
+    exact = sim.MonitorTimestamp('exact', merge=[queue.length for queue in queues])
+    assert abs(merged.sketch().weight() - exact.weight()) < 1e-6
+    assert abs(merged.percentile(90) - exact.percentile(90)) <= 1
+
+    reps = sim.Replications(sketch_model, number_of_replications=4, duration=500, processes=1).run()
+    medians = reps.values('length_of_stay', 'median')
+    assert min(medians) < reps.percentile('length_of_stay', 50) < max(medians)
+    p95 = reps.percentile('length_of_stay', 95)
+    assert reps.percentile('length_of_stay', 50) < p95 < max(reps.values('length_of_stay', 'maximum'))
+    print('p95 of length of stay', p95, 'p50 of length', reps.percentile('length', 50))
+
+def test109():
+    class Customer(sim.Component):
+        def process(self):
+            self.enter(waitingline)
+            yield self.request(clerk)
+            self.leave(waitingline)
+            yield self.hold(sim.Uniform(1, 3).sample())
+
+    class CustomerGenerator(sim.Component):
+        def process(self):
+            for _ in range(50):
+                Customer()
+                yield self.hold(sim.Uniform(0, 2).sample())
+
+    for store in (True, False):
+        env = sim.Environment(trace=False, random_seed=109)
+        waitingline = sim.Queue('waitingline', store=store)
+        clerk = sim.Resource('clerk', store=store)
+        m = sim.Monitor('m', weighted=True, store=store)
+        for x, weight in ((0, 1), (2, 3), ('a', 1), (5, 0.5)):
+            m.tally(x, weight)
+        CustomerGenerator()
+        env.run(50)
+        waitingline.length.monitor(False)
+        env.run(60)
+        waitingline.length.monitor(True)
+        env.run(100)
+        if store:
+            stored = [monitor for monitor in (waitingline.length, waitingline.length_of_stay,
+                clerk.occupancy, clerk.available_quantity, clerk.requesters().length, m)]
+        else:
+            for monitor, stored_monitor in zip((waitingline.length, waitingline.length_of_stay,
+              clerk.occupancy, clerk.available_quantity, clerk.requesters().length, m), stored):
+                for ex0 in (False, True):
+                    for method in ('mean', 'std', 'minimum', 'maximum', 'number_of_entries', 'weight'):
+                        value = getattr(monitor, method)(ex0=ex0)
+                        stored_value = getattr(stored_monitor, method)(ex0=ex0)
+                        assert abs(value - stored_value) < 1e-9 or (math.isnan(value) and math.isnan(stored_value))
+            assert math.isnan(m.median())
+            m.print_statistics()
+            try:
+                m.x()
+                assert False
+            except sim.SalabimError:
+                pass
+            merged = sim.Monitor(name='merged', merge=(m, stored[-1]), store=False)
+            assert merged.number_of_entries() == 8
+            assert abs(merged.mean() - m.mean()) < 1e-9
+
+def test108():
+    class Driver(sim.Component):
+        def process(self):
+            yield self.wait((light, '$ in ("green", "orange")'))
+            passed.append(self)
+
+    class Truck(sim.Component):
+        def process(self):
+            yield self.wait((light, '$ == "green"'), (level, '$ >= self.minimum'), all=True)
+            passed.append(self)
+
+    env = sim.Environment(trace=False)
+    light = sim.State('light', value='red')
+    level = sim.State('level', value=0)
+    passed = []
+    drivers = [Driver() for _ in range(3)]
+    truck = Truck()
+    truck.minimum = 10
+    env.run(1)
+    assert sim._wait_expressions['$ in ("green", "orange")'] is not None  # compiled once for all drivers
+    light.set('orange')
+    env.run(2)
+    assert passed == drivers
+    light.set('green')
+    env.run(3)
+    assert passed == drivers  # level too low
+    level.set(10)
+    env.run(4)
+    assert passed == drivers + [truck]
+
+def test107():
+    class Waiter(sim.Component):
+        def setup(self, value):
+            self.value = value
+
+        def process(self):
+            yield self.wait((light, self.value))
+            honored.append(self)
+
+    env = sim.Environment(trace=False)
+    light = sim.State('light', value='red')
+    honored = []
+    greens = [Waiter(value='green') for _ in range(3)]
+    oranges = [Waiter(value='orange') for _ in range(2)]
+    function_waiter = Waiter(value=lambda value, component, state: value != 'red')
+    list_waiter = Waiter(value=['green'])  # unhashable values are also supported
+    env.run(1)
+    assert sorted(light._waiters_by_value) == ['green', 'orange']
+    assert len(light._waiters_by_value['green']) == 3
+    light.trigger('green', max=2)
+    env.run(2)
+    assert honored == greens[:2]  # in the order of the waiters queue
+    light.set('orange')
+    env.run(3)
+    assert honored == greens[:2] + oranges + [function_waiter]
+    assert list(light._waiters_by_value) == ['green']
+    light.set(['green'])
+    env.run(4)
+    assert honored[-1] is list_waiter
+    light.set('green')
+    env.run(5)
+    assert honored[-1] is greens[2]
+    assert not light._waiters_by_value and not light._waiters_general
+    print('honored', honored)
+
+def test106():
+    class Client(sim.Component):
+        def process(self):
+            yield self.request((r, 2))
+            yield self.hold(10)
+
+    env = sim.Environment(trace=False)
+    r = sim.Resource('r', capacity=4)
+    for _ in range(3):
+        Client()
+    env.run(5)
+    assert r.occupancy() == 1
+    assert r.available_quantity() == 0
+    r.set_capacity(8)
+    env.run(till=35)
+    assert r.occupancy() == 0
+    assert r.available_quantity() == 8
+    # claimed quantity: 4, 6, 2, 0 and capacity: 4, 8, 8, 8 during 5, 5, 5 and 20
+    assert abs(r.occupancy.mean() - (1 * 5 + 0.75 * 5 + 0.25 * 5) / 35) < 1e-9
+    assert abs(r.available_quantity.mean() - (0 * 5 + 2 * 5 + 6 * 5 + 8 * 20) / 35) < 1e-9
+    derived_t = r.occupancy._t
+    assert r.occupancy._t is derived_t  # derived once, until the resource changes
+    r.occupancy.mean()
+    assert r.occupancy._t is derived_t
+    r.set_capacity(6)
+    assert r.occupancy._t is not derived_t  # derived again after a change of the capacity
+    assert r.occupancy._xw[-1] == 0
+    derived_t = r.occupancy._t
+    r.set_capacity(8)
+    assert r.occupancy._t is not derived_t
+    r.occupancy.print_histogram()
+    try:
+        r.occupancy.tally(0.5)
+        assert False
+    except sim.SalabimError:
+        pass
+    r.claimed_quantity.monitor(False)
+    env.run(till=40)
+    r.claimed_quantity.monitor(True)
+    env.run(till=50)
+    assert r.occupancy.duration() == 45  # off while claimed_quantity was not monitored
+    r.reset_monitors()
+    env.run(till=60)
+    assert r.available_quantity.duration() == 10
+    assert r.available_quantity.mean() == 8
+
+def test105():
+    class Requester(sim.Component):
+        def setup(self, quantity, resources=None):
+            self.quantity = quantity
+            self.resources = resources
+
+        def process(self):
+            yield self.request(*[(r, self.quantity) for r in self.resources])
+            honored.append(self)
+            yield self.passivate()
+
+    env = sim.Environment(trace=False)
+    r1 = sim.Resource('r1', capacity=10)
+    r2 = sim.Resource('r2', capacity=2)
+    honored = []
+    blocker = Requester(quantity=10, resources=[r1])
+    env.run(1)
+    big = [Requester(quantity=q, resources=[r1]) for q in (8, 9, 7)]
+    both = Requester(quantity=3, resources=[r1, r2])  # can't be honored as long as r2 doesn't have 3
+    small = [Requester(quantity=q, resources=[r1]) for q in (2, 1, 3)]
+    env.run(2)
+    assert honored == [blocker]
+    blocker.release()
+    env.run(3)
+    assert honored == [blocker, big[0], small[0]]  # in queue order, skipping requesters that request too much
+    assert r1.requesters().as_list() == [big[1], big[2], both, small[1], small[2]]
+    r2.set_capacity(3)
+    big[0].release()
+    env.run(4)
+    assert honored == [blocker, big[0], small[0], big[2], small[1]]
+    assert r1.requesters().as_list() == [big[1], both, small[2]]
+    print('requesters', r1.requesters().as_list())
+
+    c = Requester(quantity=1, resources=[r2, r2])  # quantities of the same resource are summed
+    env.run(5)
+    assert honored[-1] is c
+    assert c._claims[r2] == 2
+    r2.release()  # releases all claims of a non-anonymous resource
+    assert len(r2.claimers()) == 0
+
+def test104():
+    env = sim.Environment(trace=False)
+    q1 = sim.Queue('q1')
+    q2 = sim.Queue('q2')
+    components = [sim.Component(name='c.') for _ in range(6)]
+    for c in components[:4]:
+        c.enter(q1)
+    for c in components[2:]:
+        c.enter_sorted(q2, priority=1)
+    components[0].priority(q1, -1)
+
+    assert list(q1 | q2) == components
+    assert list(q1 & q2) == components[2:4]
+    assert list(q1 ^ q2) == components[:2] + components[4:]
+    q3 = q1 - q2
+    assert list(q3) == components[:2]
+    assert components[0].priority(q3) == -1
+    assert not q3.length.monitor()  # set operations don't monitor the result by default
+    assert not q1.copy().length.monitor()
+
+    assert q1.component_with_name('c.2') is components[2]
+    components[2].name('renamed')
+    assert q1.component_with_name('c.2') is None
+    assert q1.component_with_name('renamed') is components[2]
+    components[2].leave(q1)
+    assert q1.component_with_name('renamed') is None
+
+    view = q1.view(lambda c: c.sequence_number() % 2 == 1) | q2
+    print(view, view.as_list())
+    assert list(view) == [components[1], components[3], components[2], components[4], components[5]]
+    assert len(view) == 5
+    assert components[0] not in view
+    components[0].leave(q1)
+    components[0].enter(q2)
+    assert components[0] in view and len(view) == 6  # views reflect the current contents
+    assert view[-1] is components[0]
+    q4 = view.as_queue('q4')
+    assert q4.as_list() == view.as_list()
+
+def test103():
+    env = sim.Environment(trace=False)
+    q1 = sim.Queue('q1')
+    q2 = sim.Queue('q2')
+    components = [sim.Component(name='c') for _ in range(10)]
+    env.run(1)
+    q1.extend_from(components)
+    assert list(q1) == components
+    assert q1.length.number_of_entries() == 2  # initial value and one tally
+    env.run(6)
+    popped = q1.pop_many(3)
+    assert popped == components[:3]
+    assert q1.length() == 7
+    assert q1.length_of_stay.number_of_entries() == 3
+    assert q1.length_of_stay.mean() == 6
+    q2.add(components[0])
+    components[0].priority(q2, 2)
+    env.run(1)
+    moved = q1.move_all(q2)
+    assert moved == components[3:]
+    assert len(q1) == 0 and len(q2) == 8
+    assert all(c.priority(q2) == 2 for c in moved)
+    assert q2.length.number_of_entries() == 3  # initial value, add and move_all
+    try:
+        q2.extend_from([components[1], components[1]])
+        assert False
+    except sim.SalabimError:
+        pass
+    q1.extend(q2)
+    assert list(q1) == list(q2)
+    components[5].leave_all()
+    assert components[5].count() == 0
+    q1.clear()
+    assert len(q1) == 0 and len(q2) == 7
+    print('q1.length', q1.length.xt())
+
+def test102():
+    class Part(sim.Entity):
+        __slots__ = ('weight',)
+
+        def __init__(self, weight, *args, **kwargs):
+            sim.Entity.__init__(self, *args, **kwargs)
+            self.weight = weight
+
+    env = sim.Environment()
+    storage = sim.Queue('storage')
+    parts = [Part(weight=i) for i in range(10)]
+    for part in parts:
+        part.enter(storage)
+    parts[9].leave(storage).enter_at_head(storage)
+    assert storage[0] is parts[9]
+    assert parts[3].index(storage) == 4
+    assert parts[5].successor(storage) is parts[6]
+    assert storage.pop() is parts[9]
+    assert parts[5].name() == 'part.0'  # names are assigned when required
+    print([part.name() for part in storage])
+    assert parts[0].name() == 'part.1'
+    assert not hasattr(parts[0], '__dict__')
+
+    c = sim.Component(name='component')
+    c.enter(storage)
+    assert isinstance(c, sim.Entity)
+    assert storage.tail() is c
+
+def test101():
+    env = sim.Environment()
+    c = sim.Component(name='data')
+    assert not c._requests and not c._claims and not c._waits and not c._qmembers
+    c.x = 1  # components still accept any attribute
+    q = sim.Queue('q')
+    c.enter(q)
+    assert c.queues() == {q}
+    c.leave(q)
+    assert c.count() == 0
+
+    class Client(sim.Component):
+        def process(self):
+            yield self.request(r1, (r2, 2))
+            assert self.claimed_quantity(r2) == 2
+            yield self.hold(1)
+            self.release(r1)
+            assert self.claimed_resources() == [r2]
+            self.release()
+            yield self.wait(state)
+            print(env.now(), self.name(), 'done')
+
+    class Opener(sim.Component):
+        def process(self):
+            yield self.hold(10)
+            state.set()
+
+    r1 = sim.Resource('r1')
+    r2 = sim.Resource('r2', capacity=2)
+    state = sim.State('state')
+    clients = [Client() for _ in range(3)]
+    Opener()
+    env.run()
+    assert env.now() == 10
+    assert all(not client._requests and not client._claims and not client._waits for client in clients)
+
+def test100():
+    env = sim.Environment()
+    q = sim.Queue('q')
+    components = [sim.Component(name='c.') for _ in range(10)]
+    for c in components[:6]:
+        c.enter(q)
+    result = []
+    for c in q:
+        result.append(c.name())
+        if c is components[1]:
+            components[2].leave(q)  # not yet reached, so skipped
+            components[6].enter(q)  # entered during iteration, so included at the end
+            components[7].enter_at_head(q)  # idem
+    print(result)
+    assert result == ['c.0', 'c.1', 'c.3', 'c.4', 'c.5', 'c.6', 'c.7']
+    result = [c.name() for c in reversed(q)]
+    print(result)
+    assert result == ['c.6', 'c.5', 'c.4', 'c.3', 'c.1', 'c.0', 'c.7']
+    iter1 = iter(q)
+    next(iter1)
+    for c in q:
+        pass
+    components[8].enter(q)
+    assert q._iter_log is not None
+    assert [c.name() for c in iter1][-1] == 'c.8'
+    assert q._iter_log is None
+
+    iter1 = iter(q)
+    next(iter1)
+    iter2 = iter(q)
+    next(iter2)
+    visitor = sim.Component(name='visitor')
+    for i in range(10000):
+        visitor.enter(q)
+        visitor.leave(q)
+        if i == 5000:
+            components[9].enter(q)
+    assert len(q._iter_log) < 100  # qmembers that left are removed from the log
+    assert [c.name() for c in iter1][-1] == 'c.9'
+    assert [c.name() for c in iter2][-1] == 'c.9'
+
+def test99():
+    env = sim.Environment()
+    q0 = sim.Queue('q0')
+    q1 = sim.Queue('q1', order='priority')
+    for i in range(200):
+        priority = i * 37 % 11
+        c = sim.Component(name='c.')
+        c.enter_sorted(q0, priority)
+        c.enter_sorted(q1, priority)
+    assert list(q0) == list(q1)
+    for c in list(q0)[::3]:
+        c.priority(q0, -c.priority(q0))
+        c.priority(q1, -c.priority(q1))
+    assert list(q0) == list(q1)
+    assert [c.priority(q1) for c in q1] == sorted(c.priority(q1) for c in q1)
+    while q0:
+        assert q0.pop() is q1.pop()
+    print('test99 ok')
+
+    class Client(sim.Component):
+        def process(self, priority):
+            yield self.request((server, 1, priority))
+            served.append(self.sequence_number())
+            yield self.hold(1)
+            self.release()
+
+    served = []
+    server = sim.Resource('server')
+    for i in range(20):
+        Client(priority=i % 4)
+    env.run()
+    print(served)
+    assert served == [0, 4, 8, 12, 16, 1, 5, 9, 13, 17, 2, 6, 10, 14, 18, 3, 7, 11, 15, 19]
+
+def test98():
+    env = sim.Environment()
+    q = sim.Queue('q')
+    ref = []
+    components = [sim.Component(name='c.') for _ in range(500)]
+    for c in components[:200]:
+        c.enter(q)
+        ref.append(c)
+    for i, c in enumerate(components[200:400]):
+        index = i * 37 % (len(ref) + 1)
+        q.insert(index, c)
+        ref.insert(index, c)
+    assert list(q) == ref
+    assert q._index is not None  # positional access in a long queue builds the index
+    for k in (0, 1, 50, 199, 250, 399, -1, -100):
+        assert q[k] is ref[k]
+    assert q[100:300:7] == ref[100:300:7]
+    assert q[300:100:-3] == ref[300:100:-3]
+    for k in (0, 100, 250, 399):
+        assert ref[k].index(q) == k
+    for k in (300, 150, 10, 40):
+        c = q.pop(k)
+        assert c is ref.pop(k)
+    ref[100].priority(q, 1)  # moves to the tail
+    ref.append(ref.pop(100))
+    assert list(q) == ref
+    assert ref[-1].index(q) == len(ref) - 1
+    components[450].enter_behind(q, ref[200])
+    ref.insert(201, components[450])
+    assert [c.index(q) for c in ref] == list(range(len(ref)))
+    q.clear()
+    assert q._index is None
+    print('test98 ok', len(ref))
+
+def test97():
+    import os
+    env = sim.Environment(random_seed=1)
+
+    class CustomerGenerator(sim.Component):
+        def process(self):
+            while True:
+                Customer()
+                yield self.hold(sim.Exponential(iat[0]).sample())
+
+    class Customer(sim.Component):
+        def process(self):
+            self.enter(waitingline)
+            yield self.request(clerks)
+            self.leave(waitingline)
+            yield self.hold(sim.Uniform(5, 15).sample())
+
+    def scenario(env, i):
+        clerks.set_capacity(i + 1)
+        iat[0] = 5
+        return dict(length_of_stay=waitingline.length_of_stay, length=lambda: waitingline.length(), capacity=i + 1)
+
+    iat = [20]
+    waitingline = sim.Queue('waitingline')
+    clerks = sim.Resource('clerks')
+    CustomerGenerator()
+    env.run(1000)  # warmup
+    if not hasattr(os, 'fork'):
+        print('fork not supported on this platform')
+        return
+    results = env.fork(3, scenario, duration=1000)
+    for result in results:
+        print(result['capacity'], result['length_of_stay']['mean'], result['length'])
+    assert [result['capacity'] for result in results] == [1, 2, 3]
+    assert env.now() == 1000
+    assert clerks.capacity() == 1
+    assert env.fork(4, lambda env, i: i * i, processes=2) == [0, 1, 4, 9]
+
+def test96():
+    reps = sim.Replications(test94_model, number_of_replications=4, duration=2000, processes=1)
+    reps.run_until(precision=0.25, kpis='length_of_stay', batch_size=4, max_replications=100)
+    print('replications', len(reps), 'mean', reps.mean('length_of_stay'), 'half width', reps.half_width('length_of_stay'))
+    assert reps.precision_reached(precision=0.25, kpis='length_of_stay')
+    assert reps.half_width('length_of_stay') <= 0.25 * reps.mean('length_of_stay')
+
+    env = sim.Environment(random_seed=1)
+    m = sim.Monitor('m')
+    for i in range(100):
+        m.tally(i % 7)
+    print(m.batch_means(5), m.mean(), m.half_width(number_of_batches=5))
+    assert abs(sum(m.batch_means(5)) / 5 - m.mean()) < 1e-9
+
+    mt = sim.MonitorTimestamp('mt')
+
+    class X(sim.Component):
+        def process(self):
+            for i in range(10):
+                mt.tally(i % 3)
+                yield self.hold(1.5)
+
+    X()
+    env.run(15)
+    print(mt.batch_means(4), mt.mean(), mt.half_width(number_of_batches=5))
+
+def test95_scenario(seed, results):
+    env = sim.Environment(random_seed=seed, trace=False)
+
+    class Customer(sim.Component):
+        def process(self):
+            self.enter(waitingline)
+            yield self.request(clerk)
+            self.leave(waitingline)
+            yield self.hold(sim.Uniform(5, 15).sample())
+
+    class CustomerGenerator(sim.Component):
+        def process(self):
+            while True:
+                Customer()
+                yield self.hold(iat.sample())
+
+    iat = sim.Exponential(10)
+    assert iat.randomstream is env.randomstream()
+    CustomerGenerator()
+    waitingline = sim.Queue('waitingline')
+    clerk = sim.Resource('clerk')
+    env.run(2000)
+    assert sim.default_env() is env
+    results[seed] = (waitingline.length_of_stay.mean(), waitingline.length.mean())
+
+def test95():
+    import threading
+    seeds = (1, 2, 3, 4)
+    sequential = {}
+    for seed in seeds:
+        test95_scenario(seed, sequential)
+
+    threaded = {}
+    threads = [threading.Thread(target=test95_scenario, args=(seed, threaded)) for seed in seeds]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for seed in seeds:
+        print(seed, sequential[seed], threaded[seed])
+        assert sequential[seed] == threaded[seed]
+
+    env0 = sim.Environment()
+    env1 = sim.Environment(isdefault_env=False, name='env1')
+    with env1:
+        q = sim.Queue('q')
+        assert sim.default_env() is env1
+    assert sim.default_env() is env0
+    assert q.env is env1
+
+    env0 = sim.Environment(random_seed=123)
+    x0 = [sim.Uniform(0, 1).sample() for _ in range(3)]
+    sim.random_seed(123)
+    x1 = [sim.Uniform(0, 1).sample() for _ in range(3)]
+    assert x0 == x1
+    print(x0)
+
+def test94_model(env):
+    class Customer(sim.Component):
+        def process(self):
+            self.enter(waitingline)
+            yield self.request(clerk)
+            self.leave(waitingline)
+            yield self.hold(sim.Exponential(9)())
+
+    class CustomerGenerator(sim.Component):
+        def process(self):
+            while True:
+                Customer()
+                yield self.hold(sim.Exponential(10)())
+
+    waitingline = sim.Queue('waitingline')
+    clerk = sim.Resource('clerk')
+    CustomerGenerator()
+    return dict(length_of_stay=waitingline.length_of_stay, length=waitingline.length,
+        served=lambda: waitingline.length_of_stay.number_of_entries())
+
+def test94():
+    reps = sim.Replications(test94_model, number_of_replications=8, duration=5000, processes=1).run()
+    reps.print_statistics()
+    print('mean length_of_stay', reps.mean('length_of_stay'), 'std', reps.std('length_of_stay'))
+    print('maximum length', reps.values('length', statistic='maximum'))
+    reps_parallel = sim.Replications(test94_model, number_of_replications=8, duration=5000, processes=2).run()
+    assert reps_parallel.results() == reps.results()
+
+def test93():
+    class X(sim.Component):
+        def process(self):
+            yield self.hold(1)
+            self.enter(q)
+            yield self.hold(1)
+            if self.sequence_number() == 7:
+                self.enter(q)  # this will raise a SalabimError
+            self.leave(q)
+
+    records = {}
+    for trace in (sim.EventLog(), 'ring'):
+        printed = io.StringIO()
+        env = sim.Environment(trace=trace, trace_size=12)
+        q = sim.Queue('q')
+        for i in range(10):
+            X()
+        try:
+            with contextlib.redirect_stdout(printed):
+                env.run()
+            assert False
+        except sim.SalabimError as e:
+            print('error:', e)
+        # the value is left out, as it may be nan
+        records[trace == 'ring'] = [record[:4] + record[5:] for record in env.event_log().records()]
+    print(printed.getvalue())
+    assert len(env.event_log()) == 12
+    assert len(records[False]) > 12 and records[True] == records[False][-12:]  # the last 12 events
+    assert records[True][-1][1:3] == ('current', 'x.7')  # the failing enter itself is not traced
+    assert 'trace (last 12 records) before error' in printed.getvalue()
+    assert env.event_log().print_trace(as_str=True) in printed.getvalue()  # run printed the flight recorder
+    print('trace of x.6 in the flight recorder')
+    env.event_log().print_trace(component='x.6')
+
+def test92():
+    class X(sim.Component):
+        def process(self):
+            for i in range(3):
+                yield self.hold(1, mode='a')
+                self.enter(q)
+                yield self.request((r, 1, 3))
+                yield self.hold(0.5)
+                self.release()
+                self.leave(q)
+                yield self.standby()
+
+    printed = io.StringIO()
+    for trace in (True, sim.EventLog()):
+        with contextlib.redirect_stdout(printed if trace is True else io.StringIO()):
+            env = sim.Environment(trace=trace)
+            q = sim.Queue('q')
+            r = sim.Resource('r')
+            X()
+            X()
+            env.run(10)
+    log = trace
+    print('number of records', len(log))
+    assert log.print_trace(as_str=True) == printed.getvalue().rstrip('\n')  # same text as a printed trace
+    assert all(isinstance(log._get(i)[6], (str, tuple)) for i in range(len(log)))
+    assert any(isinstance(log._get(i)[6], tuple) for i in range(len(log)))  # line numbers are not formatted
+    assert all(isinstance(record[6], str) for record in log.records())
+    log.print_trace()
+    log.print_trace(component='x.1')
+    log.print_trace(queue=r)
+    for record in log.records(queue=q):
+        print(record)
+    with tempfile.NamedTemporaryFile(suffix='.log', delete=False) as f:
+        filename = f.name
+    try:
+        log.save(filename)
+        log1 = sim.EventLog.load(filename)
+    finally:
+        os.remove(filename)
+    assert log1.print_trace(as_str=True) == log.print_trace(as_str=True)
+
+def test91():
+    class X(sim.Component):
+        def process(self):
+            yield self.hold(10)
+
+    class Interrupter(sim.Component):
+        def process(self):
+            for x in xs:
+                x.interrupt()
+            yield self.hold(1)
+            for x in xs:
+                x.resume()
+
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        env = sim.Environment(trace=False)
+        xs = [X() for i in range(10000)]
+        Interrupter()
+        t0 = time.time()
+        env.run()
+    assert printed.getvalue() == ''  # nothing is printed (or formatted) without trace
+    print('create, interrupt and resume without trace: {:.3f}'.format(time.time() - t0))
+
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        env = sim.Environment(trace=True)
+        xs = [X() for i in range(2)]
+        Interrupter()
+        env.run()
+    # the trace is the same as before the formatting was deferred (line numbers are left out)
+    lines = [re.sub('@ *[0-9]+', '@', line[7:]).rstrip() for line in printed.getvalue().splitlines()[3:]]
+    assert lines == [
+        '                                default environment initialize',
+        '                                main create',
+        '     0.000 main                 current',
+        '                                x.0 create',
+        '                                x.0 activate                         scheduled for      0.000 @+ process=process',
+        '                                x.1 create',
+        '                                x.1 activate                         scheduled for      0.000 @+ process=process',
+        '                                interrupter.0 create',
+        '                                interrupter.0 activate               scheduled for      0.000 @+ process=process',
+        '                                main run                             scheduled for        inf @+',
+        '     0.000 x.0                  current',
+        '                                x.0 hold                             scheduled for     10.000 @+',
+        '     0.000 x.1                  current',
+        '                                x.1 hold                             scheduled for     10.000 @+',
+        '     0.000 interrupter.0        current',
+        '                                x.0 interrupt',
+        '                                x.1 interrupt',
+        '                                interrupter.0 hold                   scheduled for      1.000 @+',
+        '     1.000 interrupter.0        current',
+        '                                x.0 resume (scheduled)',
+        '                                x.0 hold                             scheduled for     11.000 @+',
+        '                                x.1 resume (scheduled)',
+        '                                x.1 hold                             scheduled for     11.000 @+',
+        '                                interrupter.0 ended',
+        '    11.000 x.0                  current',
+        '                                x.0 ended',
+        '    11.000 x.1                  current',
+        '                                x.1 ended',
+        '                                run ended                            no more events',
+        '    11.000 main                 current']
+
+def test90():
+    class X(sim.Component):
+        def process(self):
+            while True:
+                yield self.hold(1)
+                yield self.standby()
+                result.append(env.now())
+
+    class Tracer(sim.Component):
+        def process(self):
+            while True:
+                yield self.hold(0.75)
+                env.trace(env.now() > 5 and env.now() < 6)
+
+    env = sim.Environment(trace=False)
+    result = []
+    X()
+    Tracer()
+    env.run(10)
+    print(result)
+    assert result == [1.5, 3.0, 4.5, 6.0, 7.5, 9.0]
+
+def test89():
+    class X(sim.Component):
+        def process(self):
+            while True:
+                yield self.hold(random.choice([0, 1, sim.Exponential(5)(), sim.Uniform(0, 100)()]),
+                    urgent=random.random() < 0.3)
+                result.append((env.now(), self.name()))
+                other = random.choice(xs)
+                if other.isscheduled() and random.random() < 0.1:
+                    other.activate(delay=random.choice([0, 10]))
+
+    results = {}
+    for event_list in ('heap', 'calendar', 'ladder', sim.LadderQueue(threshold=4, max_rungs=2)):
+        env = sim.Environment(trace=False, random_seed=1234, event_list=event_list)
+        random.seed(1234)
+        result = []
+        xs = [X() for i in range(1000)]
+        t0 = time.time()
+        env.run(500)
+        print('event_list={} events={} duration={:.3f}'.format(
+            env._event_list.__class__.__name__, len(result), time.time() - t0))
+        results[event_list] = result
+    for event_list in results:
+        assert results[event_list] == results['heap']
+
+    heap = sim.EventList()
+    calendar = sim.CalendarQueue()
+    r = random.Random(89)
+    seq = 0
+    widths = []
+    for scale in (0.001, 1000, 1):  # the bucket width follows the separation of the scheduled times
+        for i in range(5000):
+            seq += 1
+            t = (heap.first()[0] if len(heap) else 0) + r.expovariate(1 / scale)
+            heap.push(t, seq, None)
+            calendar.push(t, seq, None)
+            if i % 3:
+                assert heap.pop() == calendar.pop()
+        widths.append(calendar._width)
+    assert widths[1] > 1000 * widths[0] and widths[2] < widths[1] / 100
+    while len(heap):
+        assert heap.pop() == calendar.pop()
+
+def test88():
+    class X(sim.Component):
+        def process(self):
+            yield self.hold(sim.Uniform(0, 10)())
+            result.append((env.now(), self.name()))
+
+    class Canceller(sim.Component):
+        def process(self):
+            for x in xs:
+                yield self.hold(0.001)
+                if x.ispassive() or x.isdata():
+                    continue
+                if x.index_in_list % 3 == 0:
+                    x.cancel()
+                elif x.index_in_list % 3 == 1:
+                    x.activate(delay=sim.Uniform(0, 10)())
+
+    for urgent in (False, True):
+        env = sim.Environment(trace=False, random_seed=1234)
+        result = []
+        xs = [X() for i in range(10000)]
+        for i, x in enumerate(xs):
+            x.index_in_list = i
+        Canceller(urgent=urgent)
+        t0 = time.time()
+        env.run()
+        print('urgent={} events={} tombstones left={} duration={:.3f}'.format(
+            urgent, len(result), env._event_list_tombstones, time.time() - t0))
+        assert result == sorted(result, key=lambda r: r[0])
+
 def test87():
     def dump_an_objects():
         print('dump')